@@ -0,0 +1,75 @@
+"""
+Бенчмарк хранилищ FSM: MemoryStorage против SQLiteStorage.
+
+Для каждого хранилища выполняет set_data и get_state по набору ключей
+и печатает число операций в секунду. Для SQLiteStorage дополнительно
+измеряется чтение после перезапуска, когда ключи подгружаются из базы.
+
+    python benchmarks/bench_fsm_storage.py --keys 5000 --ops 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def make_key(i: int):
+    from aiogram.fsm.storage.base import StorageKey
+    return StorageKey(bot_id=1, chat_id=i, user_id=i)
+
+
+async def measure(storage, keys, args) -> dict:
+    started = time.perf_counter()
+    for i in range(args.ops):
+        key = keys[i % len(keys)]
+        await storage.set_data(key, {"amount": i, "recipient_address": "UQ" + "x" * 46})
+    set_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(args.ops):
+        await storage.get_state(keys[i % len(keys)])
+    get_time = time.perf_counter() - started
+
+    return {"set_data/s": args.ops / set_time, "get_state/s": args.ops / get_time}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=50000)
+    args = parser.parse_args()
+
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from src.utils.fsm_storage import SQLiteStorage
+
+    keys = [make_key(i) for i in range(args.keys)]
+    print(f"{'storage':<22}{'set_data/s':>14}{'get_state/s':>14}")
+
+    row = await measure(MemoryStorage(), keys, args)
+    print(f"{'MemoryStorage':<22}{row['set_data/s']:>14.0f}{row['get_state/s']:>14.0f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fsm.db")
+        storage = SQLiteStorage(path)
+        row = await measure(storage, keys, args)
+        await storage.close()
+        print(f"{'SQLiteStorage':<22}{row['set_data/s']:>14.0f}{row['get_state/s']:>14.0f}")
+
+        # Холодный старт: каждый ключ читается из базы один раз
+        storage = SQLiteStorage(path)
+        started = time.perf_counter()
+        for key in keys:
+            await storage.get_state(key)
+        cold_time = time.perf_counter() - started
+        await storage.close()
+        print(f"{'SQLiteStorage (cold)':<22}{'-':>14}{len(keys) / cold_time:>14.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Бенчмарк профилей хранилища SQLite.
+
+Для каждого профиля из STORAGE_PROFILES создает чистую базу, выполняет
+конкурентные записи и чтения через UserDatabase (без кеша пользователей)
+и печатает пропускную способность.
+
+    python benchmarks/bench_sqlite_profiles.py --users 2000 --writes 20000 --reads 50000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# src.config читает эти переменные при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMINS_LIST", "0")
+os.environ.setdefault("ADMIN_GROUPS", "0")
+
+
+async def run_profile(name: str, profile, workdir: Path, args) -> dict:
+    from src.database import UserDatabase
+
+    # Кеш пользователей отключен: чтения должны идти в SQLite с PRAGMA профиля
+    db = UserDatabase(str(workdir / f"{name}.db"), profile=profile, cache_size=0)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    await asyncio.gather(*(
+        bounded(db.register_new_user(user_id, f"user{user_id}", f"User {user_id}"))
+        for user_id in range(args.users)
+    ))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        bounded(db.update_user_balance(i % args.users, 1))
+        for i in range(args.writes)
+    ))
+    write_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        bounded(db.get_user_data(i % args.users))
+        for i in range(args.reads)
+    ))
+    read_time = time.perf_counter() - started
+
+    stats = db.writer_stats
+    await db.close()
+    return {
+        "profile": name,
+        "writes/s": args.writes / write_time,
+        "reads/s": args.reads / read_time,
+        "avg batch": stats.avg_batch_size,
+        "avg commit ms": stats.avg_commit_time * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--writes", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--profiles", nargs="*", help="Профили для сравнения (по умолчанию все)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # UserDatabase() в src.database создает users.db в текущем каталоге
+        os.chdir(tmp)
+        from src.utils.sqlite_pool import STORAGE_PROFILES
+
+        names = args.profiles or list(STORAGE_PROFILES)
+        print(f"{'profile':<12}{'writes/s':>12}{'reads/s':>12}{'avg batch':>12}{'avg commit ms':>16}")
+        for name in names:
+            row = await run_profile(name, STORAGE_PROFILES[name], Path(tmp), args)
+            print(f"{row['profile']:<12}{row['writes/s']:>12.0f}{row['reads/s']:>12.0f}"
+                  f"{row['avg batch']:>12.1f}{row['avg commit ms']:>16.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Микро-бенчмарк рендера переводов и статических клавиатур.
+
+Сравнивает прежний путь (три поиска по словарям и str.format на каждый вызов,
+сборка InlineKeyboardBuilder на каждое открытие меню) с предкомпилированными
+шаблонами Translator и закешированными клавиатурами. Печатает время одного
+рендера в микросекундах.
+
+    python benchmarks/bench_translations.py --repeat 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from string import Formatter
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Клавиатуры берутся из реестра экранов, который импортирует src.config
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMINS_LIST", "0")
+os.environ.setdefault("ADMIN_GROUPS", "0")
+
+# Значения подстановок для всех шаблонов локалей
+KWARGS = {
+    "amount": 150.5, "currency": "TON", "user_id": 123456789, "username": "@user",
+    "error": "timeout", "recipient_address": "UQ" + "x" * 46, "value": 1, "currency_pair": "TON/USDT",
+    "sender_id": 1, "text": "hello", "duration": 5, "chat_id": -100, "full_name": "User",
+    "nickname": "nick", "price": 3.2, "limit": 10, "action": "buy", "balance": 10.0,
+    "ton_wallet": "UQ", "card_number": "0000", "deals_count": 3, "referral_link": "https://t.me/bot",
+    "ton_wallet_address": "UQ", "recipient_type": "user", "current_balance": 1.0,
+    "sender_username": "@s", "date": "2024-01-01", "deal_id": 7, "group_id": -100,
+    "language": "ru", "new_balance": 2.0,
+}
+
+
+def timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100000)
+    parser.add_argument("--lang", default="ru")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # src.database и src.config создают users.db и fsm.db в текущем каталоге
+        os.chdir(tmp)
+        run(args)
+
+
+def run(args):
+    from aiogram.utils.keyboard import InlineKeyboardBuilder
+    from src.locales import translator
+    from src.utils.keyboards import get_main_menu_keyboard
+
+    locales = translator.locales
+    keys = list(locales[args.lang]["messages"])
+    lang = args.lang
+
+    # Каждому шаблону - только его аргументы, как при реальных вызовах
+    calls = []
+    for key in keys:
+        fields = {name for _, name, _, _ in Formatter().parse(locales[lang]["messages"][key]) if name}
+        calls.append((key, {name: KWARGS[name] for name in fields}))
+
+    def old_get_message(lang: str, key: str, **kwargs) -> str:
+        # Прежняя реализация Translator.get_message
+        message = locales.get(lang, {}).get('messages', {}).get(key, key)
+        return message.format(**kwargs)
+
+    def old_messages():
+        for key, kwargs in calls:
+            old_get_message(lang, key, **kwargs)
+
+    def new_messages():
+        for key, kwargs in calls:
+            translator.get_message(lang, key, **kwargs)
+
+    def old_keyboard():
+        # Прежняя реализация get_main_menu_keyboard без кеша
+        builder = InlineKeyboardBuilder()
+        for button, data in (("profile", "profile"), ("create_deal", "create_deal"), ("p2p", "p2p"),
+                             ("support", "support"), ("about_us", "about_us"),
+                             ("change_language", "change_language")):
+            builder.button(text=translator.get_button(lang, button), callback_data=data)
+        builder.adjust(1)
+        return builder.as_markup()
+
+    def new_keyboard():
+        return get_main_menu_keyboard(lang)
+
+    message_repeat = max(1, args.repeat // len(keys))
+    print(f"{'render':<26}{'before, us':>12}{'after, us':>12}{'speedup':>10}")
+    for name, old, new, repeat in (
+        (f"message (x{len(keys)} keys)", old_messages, new_messages, message_repeat),
+        ("main menu keyboard", old_keyboard, new_keyboard, max(1, args.repeat // 10)),
+    ):
+        before = timed(old, repeat)
+        after = timed(new, repeat)
+        print(f"{name:<26}{before:>12.2f}{after:>12.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Нагрузочный стенд режима вебхука без сети.
+
+Поднимает то же aiohttp-приложение, что и src.bot в режиме webhook, на
+локальном порту, подменяет сессию бота заглушкой (ответы Telegram API
+с настраиваемой задержкой) и отправляет синтетические апдейты POST-запросами.
+Печатает скорость подтверждения запросов, задержку ответа и скорость
+полной обработки апдейтов. Лимиты Telegram по умолчанию сняты, чтобы
+измерять сам бот; их можно вернуть переменными RATE_LIMIT_*.
+
+    python benchmarks/bench_webhook.py --users 500 --updates-per-user 4 --concurrency 100
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# src.config читает эти переменные при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMINS_LIST", "0")
+os.environ.setdefault("ADMIN_GROUPS", "0")
+os.environ.setdefault("RATE_LIMIT_GLOBAL", "1000000")
+os.environ.setdefault("RATE_LIMIT_CHAT", "1000000")
+os.environ.setdefault("RATE_LIMIT_GROUP", "1000000")
+
+SECRET = "bench-secret"
+
+
+def make_session(latency: float):
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Message, User
+
+    message_ids = itertools.count(1)
+
+    class FakeSession(BaseSession):
+        """Сессия, которая отвечает на запросы API без обращения к сети."""
+        calls = 0
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def make_request(self, bot, method, timeout=None):
+            FakeSession.calls += 1
+            if latency:
+                await asyncio.sleep(latency)
+            returning = method.__returning__
+            if returning is User:
+                return User(id=1, is_bot=True, first_name="bench")
+            if returning is Message or "Message" in str(returning):
+                data = {
+                    "message_id": next(message_ids),
+                    "date": 0,
+                    "chat": {"id": getattr(method, "chat_id", None) or 1, "type": "private"},
+                    "photo": [{"file_id": "bench", "file_unique_id": "bench", "width": 1, "height": 1}],
+                }
+                return Message.model_validate(data, context={"bot": bot})
+            return True
+
+    return FakeSession()
+
+
+def make_updates(users: int, per_user: int):
+    """Синтетические апдейты: /start и нажатия кнопок главного меню."""
+    update_ids = itertools.count(1)
+    texts = ["/start", "/balance"]
+    updates = []
+    for step in range(per_user):
+        for user_id in range(1, users + 1):
+            sender = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"}
+            if step % 3 == 2:
+                updates.append({
+                    "update_id": next(update_ids),
+                    "callback_query": {
+                        "id": str(next(update_ids)),
+                        "from": sender,
+                        "chat_instance": "bench",
+                        "data": "profile",
+                        "message": {
+                            "message_id": 1, "date": 0,
+                            "chat": {"id": user_id, "type": "private"},
+                            "photo": [{"file_id": "bench", "file_unique_id": "bench", "width": 1, "height": 1}],
+                        },
+                    },
+                })
+            else:
+                updates.append({
+                    "update_id": next(update_ids),
+                    "message": {
+                        "message_id": next(update_ids), "date": 0,
+                        "chat": {"id": user_id, "type": "private"},
+                        "from": sender,
+                        "text": texts[step % 3],
+                    },
+                })
+    return updates
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates-per-user", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременных POST-запросов")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Задержка ответа Telegram API, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # UserDatabase() в src.database создает users.db в текущем каталоге,
+        # а хэндлеры читают картинки по относительному пути
+        os.chdir(tmp)
+        os.symlink(ROOT / "pics", Path(tmp) / "pics")
+
+        from aiohttp import ClientSession, web
+        from aiogram import Bot
+        from src.bot import create_webhook_app, setup_dispatcher
+        from src.config import dp, WEBHOOK_PATH
+        from src.database import db
+        from src.middlewares import update_scheduler
+
+        session = make_session(args.api_latency)
+        bot = Bot("123456:bench", session=session)
+        setup_dispatcher(bot)
+
+        # Считаем полностью обработанные апдейты
+        processed = 0
+        done = asyncio.Event()
+        total = args.users * args.updates_per_user
+
+        @dp.update.outer_middleware()
+        async def count_processed(handler, event, data):
+            nonlocal processed
+            try:
+                return await handler(event, data)
+            finally:
+                processed += 1
+                if processed == total:
+                    done.set()
+
+        # Пользователи зарегистрированы, чтобы хэндлеры шли по основному пути
+        for user_id in range(1, args.users + 1):
+            await db.register_new_user(user_id, f"user{user_id}", f"User {user_id}")
+
+        runner = web.AppRunner(create_webhook_app(bot, SECRET))
+        await runner.setup()
+        site = web.TCPSite(runner, host="127.0.0.1", port=0)
+        await site.start()
+        port = runner.addresses[0][1]
+        url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+
+        updates = make_updates(args.users, args.updates_per_user)
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async with ClientSession() as client:
+            async with client.post(url, json=updates[0], headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) as response:
+                print(f"wrong secret -> HTTP {response.status}")
+
+            async def post(update):
+                async with semaphore:
+                    started = time.perf_counter()
+                    async with client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as response:
+                        await response.read()
+                        assert response.status == 200, response.status
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(post(update) for update in updates))
+            ack_time = time.perf_counter() - started
+            await asyncio.wait_for(done.wait(), timeout=300)
+            total_time = time.perf_counter() - started
+
+        latencies.sort()
+        print(f"updates:          {total}")
+        print(f"ack rate:         {total / ack_time:.0f} req/s")
+        print(f"ack latency p50:  {latencies[len(latencies) // 2] * 1000:.2f} ms")
+        print(f"ack latency p99:  {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+        print(f"processed rate:   {total / total_time:.0f} updates/s")
+        print(f"api calls:        {session.calls}")
+        stats = update_scheduler.stats
+        print(f"lane wait avg:    {stats.avg_wait * 1000:.2f} ms (max {stats.max_wait * 1000:.2f} ms)")
+        print(f"max pending:      {stats.max_pending}, max lane depth: {stats.max_lane_depth}, "
+              f"backpressure waits: {stats.backpressure_waits}")
+
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
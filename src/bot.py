@@ -1,20 +1,157 @@
-from src.handlers import routers
-from src.config import bot, dp
+import asyncio
+import secrets
+
+from aiohttp import web
+from aiogram import Bot
 from aiogram.methods import DeleteWebhook
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from src.handlers import routers
+from src.config import (
+    bot, dp, events_isolation, LEDGER_CHECKPOINT_INTERVAL, LOCALES_RELOAD_INTERVAL,
+    BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT
+)
+from src.database import db
+from src.locales import translator
+from src.middlewares import (
+    DbUserMiddleware, UpdateLaneMiddleware, album_collector, rate_limiter, render_cache, update_scheduler
+)
+from src.utils.fanout import admin_fanout
+from src.utils.ledger import ledger_auditor
+from src.utils.outbox import outbox
 
 # Импортируем функцию установки команд
 from src.bot_commands import set_bot_commands
 
-async def start_bot() -> None:
-    # Удаление вебхука и ожидающих обновлений
-    await bot(DeleteWebhook(drop_pending_updates=True))
-    
+
+async def on_startup(bot: Bot) -> None:
+    # Установка команд
+    await set_bot_commands(bot)
+
+    # Отправка накопленных и новых уведомлений из outbox
+    outbox.start(bot)
+
+    # Подхватываем изменения переводов без перезапуска
+    if LOCALES_RELOAD_INTERVAL > 0:
+        translator.watch(LOCALES_RELOAD_INTERVAL)
+
+    # Сверка балансов с журналом операций
+    if LEDGER_CHECKPOINT_INTERVAL > 0:
+        ledger_auditor.start(LEDGER_CHECKPOINT_INTERVAL)
+
+
+# Диспетчер закрывает хранилище FSM в первом обработчике остановки (dp.fsm.close),
+# раньше, чем on_shutdown дообработает очереди апдейтов. setup_dispatcher подменяет
+# его close, а настоящее закрытие выполняется в конце on_shutdown
+close_storage = dp.storage.close
+
+
+async def deferred_storage_close() -> None:
+    pass
+
+
+async def on_shutdown() -> None:
+    await translator.close()
+    # Передаем в очереди недособранные альбомы
+    await album_collector.close()
+    # Дообрабатываем апдейты, уже поставленные в очереди
+    await update_scheduler.wait_closed()
+    # Дожидаемся незавершенных рассылок администраторам
+    await admin_fanout.wait_closed()
+    await outbox.close()
+    await ledger_auditor.close()
+    # Записываем состояния FSM и закрываем соединения с базами данных
+    if events_isolation is not None:
+        await events_isolation.close()
+    await close_storage()
+    await db.close()
+
+
+def setup_dispatcher(bot: Bot) -> None:
+    """Регистрирует middleware, роутеры и обработчики запуска/остановки."""
+    # Повторные редактирования тем же содержимым не отправляются; регистрируется
+    # раньше ограничителя, чтобы пропущенные запросы не тратили его токены
+    bot.session.middleware(render_cache)
+    # Ограничение исходящих запросов к Telegram
+    bot.session.middleware(rate_limiter)
+
+    # Части альбома собираются в один апдейт до постановки в очередь пользователя
+    dp.update.outer_middleware(album_collector)
+
+    # Апдейты одного пользователя обрабатываются по порядку, разных - параллельно.
+    # Регистрируется раньше DbUserMiddleware, чтобы пользователь читался уже в очереди
+    dp.update.outer_middleware(UpdateLaneMiddleware(update_scheduler, isolation=events_isolation))
+
+    # Альбом ждет сборки уже в очереди пользователя, занимая в ней место первой части
+    dp.update.outer_middleware(album_collector.wait_ready)
+
+    # Загрузка пользователя из БД один раз на каждый апдейт
+    dp.update.outer_middleware(DbUserMiddleware())
+
     # Регистрация всех роутеров
     for router in routers:
         dp.include_router(router)
-    
-    # Установка команд
-    await set_bot_commands(bot)
-        
-    # Запуск бота
-    await dp.start_polling(bot)
+
+    # Хранилище FSM закрывается в on_shutdown, после очередей апдейтов
+    dp.storage.close = deferred_storage_close
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+
+def create_webhook_app(bot: Bot, secret: str) -> web.Application:
+    """
+    Создает aiohttp-приложение, принимающее обновления на WEBHOOK_PATH.
+    Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются,
+    на остальные отвечаем 200 сразу после постановки апдейта в очередь
+    UpdateLaneMiddleware; если очереди переполнены, ответ задерживается.
+    """
+    app = web.Application()
+    # Запуск/остановка диспетчера регистрируются раньше обработчика вебхука,
+    # чтобы при остановке сессия бота закрывалась после on_shutdown
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret,
+        # Апдейт обрабатывается в фоне очередью UpdateLaneMiddleware
+        handle_in_background=False,
+    ).register(app, path=WEBHOOK_PATH)
+    return app
+
+
+async def run_polling() -> None:
+    # Удаление вебхука и ожидающих обновлений
+    await bot(DeleteWebhook(drop_pending_updates=True))
+
+    # Запуск бота. Апдейты передаются диспетчеру по одному, параллельность
+    # и порядок обеспечивает UpdateLaneMiddleware
+    await dp.start_polling(bot, handle_as_tasks=False)
+
+
+async def run_webhook() -> None:
+    # Без заданного секрета генерируем случайный на время работы процесса
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    await bot.set_webhook(
+        url=WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+
+    runner = web.AppRunner(create_webhook_app(bot, secret))
+    await runner.setup()
+    await web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT).start()
+    try:
+        # Работаем до отмены (Ctrl+C)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def start_bot() -> None:
+    setup_dispatcher(bot)
+
+    if BOT_MODE == "webhook":
+        await run_webhook()
+    else:
+        await run_polling()
@@ -5,6 +5,9 @@ from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from src.utils.fsm_storage import SQLiteStorage
+from src.utils.sqlite_pool import STORAGE_PROFILES
+
 load_dotenv(override=True)
 BOT_TOKEN = getenv("BOT_TOKEN")
 ADMINS_LIST = list(map(int, getenv("ADMINS_LIST").split(",")))
@@ -12,7 +15,69 @@ ADMIN_GROUPS = list(map(int, getenv("ADMIN_GROUPS").split(",")))
 CAN_EDIT_USERS = False
 PHOTO_PATH = "pics/photo_1.jpg"
 
-storage = MemoryStorage()
+# Профиль хранилища SQLite (см. src/utils/sqlite_pool.py: STORAGE_PROFILES)
+SQLITE_PROFILE = getenv("SQLITE_PROFILE", "wal")
+
+# Кеш строк пользователей: максимальное число записей и время жизни в секундах
+USER_CACHE_SIZE = int(getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(getenv("USER_CACHE_TTL", "300"))
+
+# Лимиты исходящих запросов к Telegram (см. src/middlewares/outbound.py):
+# общий - запросов в секунду, на чат - в секунду, на группу - в минуту
+RATE_LIMIT_GLOBAL = float(getenv("RATE_LIMIT_GLOBAL", "30"))
+RATE_LIMIT_CHAT = float(getenv("RATE_LIMIT_CHAT", "1"))
+RATE_LIMIT_GROUP = float(getenv("RATE_LIMIT_GROUP", "20"))
+
+# Обработка апдейтов: сколько выполняется одновременно (по разным пользователям)
+# и сколько может ждать в очередях, прежде чем прием новых апдейтов замедлится
+UPDATE_CONCURRENCY = int(getenv("UPDATE_CONCURRENCY", "64"))
+UPDATE_QUEUE_LIMIT = int(getenv("UPDATE_QUEUE_LIMIT", "1000"))
+
+# Как часто (в секундах) проверять изменения файлов src/locales/*.json;
+# 0 - переводы загружаются только при запуске
+LOCALES_RELOAD_INTERVAL = float(getenv("LOCALES_RELOAD_INTERVAL", "5"))
+
+# Как часто (в секундах) сверять балансы с журналом операций и сохранять
+# контрольную точку; 0 - сверка отключена
+LEDGER_CHECKPOINT_INTERVAL = float(getenv("LEDGER_CHECKPOINT_INTERVAL", "3600"))
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = getenv("BOT_MODE", "polling")
+# Вебхук: публичный адрес (https://example.com), путь, секретный токен
+# (если не задан, генерируется при запуске) и адрес локального сервера
+WEBHOOK_BASE_URL = getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(getenv("WEBHOOK_PORT", "8080"))
+
+# Хранилище состояний FSM: memory, sqlite или redis
+FSM_STORAGE = getenv("FSM_STORAGE", "sqlite")
+# Файл базы для sqlite, адрес сервера для redis
+FSM_DB_PATH = getenv("FSM_DB_PATH", "fsm.db")
+REDIS_URL = getenv("REDIS_URL", "redis://localhost:6379/0")
+# Время жизни неизменяемого состояния в секундах
+FSM_STATE_TTL = float(getenv("FSM_STATE_TTL", str(7 * 24 * 3600)))
+
+# Сколько последних редактирований сообщений помнить, чтобы не отправлять
+# повторно то же содержимое (см. src/middlewares/render_cache.py). Кеш видит
+# только свой процесс, поэтому при FSM_STORAGE=redis по умолчанию выключен (0)
+EDIT_CACHE_SIZE = int(getenv("EDIT_CACHE_SIZE", "0" if FSM_STORAGE == "redis" else "10000"))
+
+# Блокировка апдейтов одного пользователя между процессами (нужна только для redis,
+# внутри процесса порядок обеспечивает UpdateLaneMiddleware)
+events_isolation = None
+if FSM_STORAGE == "redis":
+    # redis - необязательная зависимость, импортируем только в этом режиме
+    from aiogram.fsm.storage.redis import RedisEventIsolation
+    from src.utils.redis_storage import RedisFSMStorage
+
+    storage = RedisFSMStorage.from_url(REDIS_URL, ttl=int(FSM_STATE_TTL))
+    events_isolation = RedisEventIsolation(storage.redis, key_builder=storage.key_builder)
+elif FSM_STORAGE == "memory":
+    storage = MemoryStorage()
+else:
+    storage = SQLiteStorage(FSM_DB_PATH, ttl=FSM_STATE_TTL, profile=STORAGE_PROFILES[SQLITE_PROFILE])
 
 dp = Dispatcher(storage=storage)
 bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
\ No newline at end of file
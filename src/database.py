@@ -1,360 +1,689 @@
-from typing import Dict, Optional, List
+from dataclasses import dataclass, fields
+from typing import Callable, Dict, Optional, List, Sequence, Tuple, TypeVar
 import sqlite3
 import time
 from pathlib import Path
 
+from src.config import SQLITE_PROFILE, USER_CACHE_SIZE, USER_CACHE_TTL
+from src.migrations import migrate
+from src.utils.lru_cache import TTLCache, MISSING
+from src.utils.money import check_minor
+from src.utils.sqlite_pool import ConnectionPool, StorageProfile, STORAGE_PROFILES
+from src.utils.sqlite_writer import SQLiteWriter, WriterStats
+
+T = TypeVar("T")
+
+@dataclass
+class User:
+    """
+    Строка таблицы users.
+    """
+    user_id: int
+    username: Optional[str] = None
+    full_name: Optional[str] = None
+    ton_wallet: Optional[str] = None
+    card_number: Optional[str] = None
+    language: str = 'ru'
+    # Суммы - целые минимальные единицы (см. src/utils/money.py)
+    balance: int = 0
+    deals_count: int = 0
+    ref_count: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "User":
+        """Создает объект из словаря, игнорируя неизвестные колонки."""
+        names = {field.name for field in fields(cls)}
+        user = cls(**{key: value for key, value in data.items() if key in names})
+        # Язык может быть очищен через админку
+        user.language = user.language or 'ru'
+        return user
+
+@dataclass
+class OutboxMessage:
+    """
+    Уведомление, которое нужно отправить через outbox.
+    """
+    chat_id: int
+    text: str
+    parse_mode: Optional[str] = None
+
+@dataclass
+class DealDebit:
+    """
+    Результат create_deal_with_debit. deal_id равен None, если средств
+    не хватило и ничего не изменилось; balance - баланс после операции.
+    """
+    deal_id: Optional[int]
+    balance: int
+
+    @property
+    def ok(self) -> bool:
+        return self.deal_id is not None
+
+@dataclass
+class DealDecision:
+    """
+    Итог решения по сделке (см. decide_deal): сделка с новым статусом,
+    строка отправителя и найденный по адресу получатель после проводки.
+    """
+    deal: Dict
+    sender: Optional[Dict]
+    recipient: Optional[Dict]
+
+    @property
+    def sender_balance(self) -> int:
+        return self.sender['balance'] if self.sender else 0
+
+@dataclass
+class TopUpDecision:
+    """
+    Итог решения по заявке на пополнение (см. decide_top_up): заявка
+    с новым статусом и баланс пользователя после операции.
+    """
+    request: Dict
+    balance: int
+
+@dataclass
+class LedgerCheckpoint:
+    """
+    Итог сверки журнала баланса (см. checkpoint_ledger): последняя учтенная
+    запись, число просмотренных записей и расхождения
+    user_id -> (баланс по журналу, баланс в users).
+    """
+    ledger_id: int
+    entries: int
+    mismatches: Dict[int, Tuple[int, int]]
+
 class UserDatabase:
     """
     Класс для управления базой данных пользователей и P2P-обменника.
+    Все публичные методы асинхронные: чтения выполняются в пуле
+    долгоживущих соединений, а все изменения проходят через единственного
+    писателя с групповым коммитом. Строки users кешируются в памяти
+    и инвалидируются каждым изменяющим методом.
+    Денежные суммы принимаются и возвращаются целыми минимальными
+    единицами (src/utils/money.py) и хранятся как INTEGER, поэтому
+    арифметика в SQL точная. Каждое изменение users.balance записывается
+    в журнал balance_ledger той же транзакцией (см. _apply_balance).
     """
-    def __init__(self, db_path: str = "users.db"):
+    def __init__(self, db_path: str = "users.db", pool_size: int = 4,
+                 write_batch_size: int = 64, write_delay: float = 0.005,
+                 profile: StorageProfile = StorageProfile(),
+                 cache_size: int = 10000, cache_ttl: float = 300.0):
         self.db_path = db_path
-        self._init_db()
-        self._init_p2p_tables() # Инициализируем таблицы для P2P
-        self._init_permissions_table() # Инициализируем новую таблицу для разрешений
-        self._init_deals_table()
-
-    def _init_db(self):
-        """Создает таблицу users, если она не существует."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    full_name TEXT,
-                    ton_wallet TEXT,
-                    card_number TEXT,
-                    language TEXT DEFAULT 'ru',
-                    balance REAL DEFAULT 0,
-                    deals_count INTEGER DEFAULT 0,
-                    ref_count INTEGER DEFAULT 0
-                )
-            """)
-            conn.commit()
-
-    def _init_p2p_tables(self):
-        """Создает таблицы для P2P-обменника, если они не существуют."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Таблица для валютных пар
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS p2p_pairs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL
-                )
-            """)
-            # Таблица для листингов (предложений)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS p2p_listings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pair_id INTEGER NOT NULL,
-                    nickname TEXT NOT NULL,
-                    price TEXT NOT NULL,
-                    "limit" TEXT NOT NULL,
-                    action TEXT NOT NULL,
-                    FOREIGN KEY (pair_id) REFERENCES p2p_pairs (id) ON DELETE CASCADE
-                )
-            """)
-            conn.commit()
-            
-    def _init_permissions_table(self):
-        """Создает таблицу для разрешений на пополнение баланса."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS balance_permissions (
-                    user_id INTEGER PRIMARY KEY,
-                    end_time REAL NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-                )
-            """)
-            conn.commit()
-    
-    def _init_deals_table(self):
-        """ # --- НОВОЕ ---
-        Создает таблицу для хранения информации о P2P сделках.
-        """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS p2p_deals (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender_id INTEGER NOT NULL,
-                    recipient_address TEXT NOT NULL,
-                    recipient_type TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    currency TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending', -- pending, confirmed, declined
-                    created_at REAL DEFAULT (strftime('%s', 'now')),
-                    FOREIGN KEY (sender_id) REFERENCES users (user_id)
-                )
-            """)
-            conn.commit()
-            
+        self.user_cache: TTLCache[Optional[Dict]] = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._pool = ConnectionPool(db_path, size=pool_size, profile=profile)
+        self._writer = SQLiteWriter(self._pool.connect, max_batch=write_batch_size, max_delay=write_delay)
+        # Создаем и обновляем схему до актуальной версии
+        self._pool.run_sync(migrate)
+
+    # --- Низкоуровневые помощники ---
+
+    async def _execute(self, query: str, params: tuple = ()) -> int:
+        """Выполняет изменяющий запрос через писателя и возвращает lastrowid."""
+        def execute(conn: sqlite3.Connection) -> int:
+            return conn.execute(query, params).lastrowid
+        return await self._writer.submit(execute)
+
+    async def _submit_for_user(self, user_id: int, func: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Выполняет изменение строки пользователя через писателя и сбрасывает
+        ее из кеша. Сброс до записи не дает закешировать строку, прочитанную
+        во время записи, а сброс после удаляет то, что успели положить в промежутке.
+        """
+        self.user_cache.invalidate(user_id)
+        try:
+            return await self._writer.submit(func)
+        finally:
+            self.user_cache.invalidate(user_id)
+
+    async def _execute_for_user(self, user_id: int, query: str, params: tuple = ()) -> int:
+        """Выполняет изменяющий запрос для строки пользователя и возвращает lastrowid."""
+        def execute(conn: sqlite3.Connection) -> int:
+            return conn.execute(query, params).lastrowid
+        return await self._submit_for_user(user_id, execute)
+
+    @staticmethod
+    def _read_balance(conn: sqlite3.Connection, user_id: int) -> int:
+        row = conn.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _record_entry(self, conn: sqlite3.Connection, user_id: int, amount: int,
+                      reason: str, ref_id: Optional[int] = None) -> int:
+        """
+        Записывает в журнал уже выполненное изменение баланса и возвращает
+        баланс после него. Вызывается в той же транзакции, что и UPDATE users.
+        """
+        balance = self._read_balance(conn, user_id)
+        conn.execute("""
+            INSERT INTO balance_ledger (user_id, amount, balance_after, reason, ref_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, (user_id, amount, balance, reason, ref_id))
+        return balance
+
+    def _apply_balance(self, conn: sqlite3.Connection, user_id: int, amount: int,
+                       reason: str, ref_id: Optional[int] = None) -> Optional[int]:
+        """
+        Изменяет баланс на amount и записывает операцию в журнал.
+        Списание выполняется условием balance + amount >= 0; возвращает
+        новый баланс или None, если пользователя нет или средств не хватило.
+        """
+        check_minor(amount)
+        updated = conn.execute(
+            "UPDATE users SET balance = balance + ? WHERE user_id = ? AND (? >= 0 OR balance + ? >= 0)",
+            (amount, user_id, amount, amount)
+        ).rowcount
+        if not updated:
+            return None
+        return self._record_entry(conn, user_id, amount, reason, ref_id)
+
+    async def _fetchone(self, query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        """Выполняет запрос и возвращает первую строку результата."""
+        def fetchone(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(query, params).fetchone()
+        return await self._pool.run(fetchone)
+
+    async def _fetchall(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Выполняет запрос и возвращает все строки результата."""
+        def fetchall(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(query, params).fetchall()
+        return await self._pool.run(fetchall)
+
+    @property
+    def writer_stats(self) -> WriterStats:
+        """Метрики группового коммита: размер пачек и время фиксации."""
+        return self._writer.stats
+
+    async def close(self):
+        """Дописывает очередь изменений и закрывает все соединения."""
+        await self._writer.close()
+        self._pool.close()
+
     # --- Методы для P2P ---
 
-    def create_deal(self, sender_id: int, recipient_address: str, recipient_type: str, amount: float, currency: str) -> int:
+    async def create_deal_with_debit(self, sender_id: int, recipient_address: str, recipient_type: str,
+                                     amount: int, currency: str) -> DealDebit:
         """
-        Создает новую запись о сделке в БД и возвращает ее ID.
+        Списывает amount (в минимальных единицах) с баланса отправителя
+        и создает сделку в одной транзакции.
+        Списание выполняется условием balance >= amount, поэтому повторное
+        или параллельное подтверждение не уведет баланс в минус.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+        if check_minor(amount) <= 0:
+            raise ValueError(f"Deal amount must be positive, got {amount}")
+
+        def debit(conn: sqlite3.Connection) -> DealDebit:
+            debited = conn.execute(
+                "UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+                (amount, sender_id, amount)
+            ).rowcount
+            balance = self._read_balance(conn, sender_id)
+            if not debited:
+                return DealDebit(None, balance)
+            deal_id = conn.execute("""
                 INSERT INTO p2p_deals (sender_id, recipient_address, recipient_type, amount, currency)
                 VALUES (?, ?, ?, ?, ?)
-            """, (sender_id, recipient_address, recipient_type, amount, currency))
-            conn.commit()
-            return cursor.lastrowid
+            """, (sender_id, recipient_address, recipient_type, amount, currency)).lastrowid
+            self._record_entry(conn, sender_id, -amount, 'deal_debit', deal_id)
+            return DealDebit(deal_id, balance)
+        return await self._submit_for_user(sender_id, debit)
 
-    def get_deal_by_id(self, deal_id: int) -> Optional[Dict]:
+    async def get_deal_by_id(self, deal_id: int) -> Optional[Dict]:
         """
         Возвращает информацию о сделке по ее ID.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM p2p_deals WHERE id = ?", (deal_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        row = await self._fetchone("SELECT * FROM p2p_deals WHERE id = ?", (deal_id,))
+        return dict(row) if row else None
 
-    def update_deal_status(self, deal_id: int, status: str):
+    async def decide_deal(self, deal_id: int, status: str,
+                          notifications_for: Callable[[DealDecision], Sequence[OutboxMessage]] = lambda decision: ()
+                          ) -> Optional[DealDecision]:
         """
-        Обновляет статус сделки (pending, confirmed, declined).
+        Переводит сделку из 'pending' в status и проводит деньги в той же транзакции:
+        - 'confirmed': сумма зачисляется получателю, если он есть в БД,
+          у отправителя увеличивается счетчик сделок;
+        - 'declined': сумма возвращается отправителю.
+        Переход выполняется условием status = 'pending', поэтому из нескольких
+        одновременных решений проходит только одно; остальные получают None
+        (как и для несуществующей сделки).
+        notifications_for строит уведомления по итогу решения, они ставятся
+        в outbox той же транзакцией. Функция вызывается в потоке писателя
+        и не должна обращаться к сети или циклу событий.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE p2p_deals SET status = ? WHERE id = ?", (status, deal_id))
-            conn.commit()
+        if status not in ('confirmed', 'declined'):
+            raise ValueError(f"Unknown deal decision: {status}")
+
+        def decide(conn: sqlite3.Connection) -> Optional[DealDecision]:
+            won = conn.execute(
+                "UPDATE p2p_deals SET status = ? WHERE id = ? AND status = 'pending'", (status, deal_id)
+            ).rowcount
+            if not won:
+                return None
+            deal = dict(conn.execute("SELECT * FROM p2p_deals WHERE id = ?", (deal_id,)).fetchone())
+            recipient = None
+            if status == 'confirmed':
+                conn.execute("UPDATE users SET deals_count = deals_count + 1 WHERE user_id = ?", (deal['sender_id'],))
+                recipient = self._find_user_by_address(conn, deal['recipient_address'])
+                if recipient:
+                    self._apply_balance(conn, recipient['user_id'], deal['amount'], 'deal_credit', deal_id)
+            else:
+                self._apply_balance(conn, deal['sender_id'], deal['amount'], 'deal_refund', deal_id)
+            sender = conn.execute("SELECT * FROM users WHERE user_id = ?", (deal['sender_id'],)).fetchone()
+            decision = DealDecision(deal, dict(sender) if sender else None, recipient)
+            self._enqueue_outbox(conn, notifications_for(decision))
+            return decision
+
+        decision = await self._writer.submit(decide)
+        if decision is not None:
+            # Строки пользователей изменены: сбрасываем их после фиксации
+            self.user_cache.invalidate(decision.deal['sender_id'])
+            if decision.recipient:
+                self.user_cache.invalidate(decision.recipient['user_id'])
+        return decision
 
-    def find_user_by_wallet_or_card(self, address: str) -> Optional[Dict]:
+    async def find_user_by_wallet_or_card(self, address: str) -> Optional[Dict]:
         """
         Находит пользователя по адресу TON кошелька или номеру карты.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            # Сначала ищем по кошельку
-            cursor.execute("SELECT user_id, username FROM users WHERE ton_wallet = ?", (address,))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-            # Если не нашли, ищем по номеру карты
-            cursor.execute("SELECT user_id, username FROM users WHERE card_number = ?", (address,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-
-    def add_p2p_pair(self, pair_name: str) -> bool:
+        return await self._pool.run(self._find_user_by_address, address)
+
+    @staticmethod
+    def _find_user_by_address(conn: sqlite3.Connection, address: str) -> Optional[Dict]:
+        # Сначала ищем по кошельку
+        row = conn.execute("SELECT user_id, username FROM users WHERE ton_wallet = ?", (address,)).fetchone()
+        if row:
+            return dict(row)
+        # Если не нашли, ищем по номеру карты
+        row = conn.execute("SELECT user_id, username FROM users WHERE card_number = ?", (address,)).fetchone()
+        return dict(row) if row else None
+
+    async def add_p2p_pair(self, pair_name: str) -> bool:
         """Добавляет новую валютную пару."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO p2p_pairs (name) VALUES (?)", (pair_name,))
-                conn.commit()
+            await self._execute("INSERT INTO p2p_pairs (name) VALUES (?)", (pair_name,))
             return True
         except sqlite3.IntegrityError: # Если пара уже существует
             return False
 
-    def remove_p2p_pair(self, pair_name: str):
+    async def remove_p2p_pair(self, pair_name: str):
         """Удаляет валютную пару и все связанные с ней листинги."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Включаем поддержку внешних ключей для каскадного удаления
-            cursor.execute("PRAGMA foreign_keys = ON")
-            cursor.execute("DELETE FROM p2p_pairs WHERE name = ?", (pair_name,))
-            conn.commit()
-
-    def get_all_p2p_pairs(self) -> List[str]:
+        def remove(conn: sqlite3.Connection):
+            # Листинги удаляем явно: каскад работает только в профилях
+            # с включенным foreign_keys
+            conn.execute("""
+                DELETE FROM p2p_listings
+                WHERE pair_id IN (SELECT id FROM p2p_pairs WHERE name = ?)
+            """, (pair_name,))
+            conn.execute("DELETE FROM p2p_pairs WHERE name = ?", (pair_name,))
+        await self._writer.submit(remove)
+
+    async def get_all_p2p_pairs(self) -> List[str]:
         """Возвращает список всех валютных пар."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM p2p_pairs ORDER BY name")
-            return [row[0] for row in cursor.fetchall()]
+        rows = await self._fetchall("SELECT name FROM p2p_pairs ORDER BY name")
+        return [row[0] for row in rows]
 
-    def add_p2p_listing(self, pair_name: str, nickname: str, price: str, limit: str, action: str):
+    async def add_p2p_listing(self, pair_name: str, nickname: str, price: str, limit: str, action: str):
         """Добавляет новый листинг в указанную валютную пару."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM p2p_pairs WHERE name = ?", (pair_name,))
-            pair_id_row = cursor.fetchone()
+        def add(conn: sqlite3.Connection):
+            pair_id_row = conn.execute("SELECT id FROM p2p_pairs WHERE name = ?", (pair_name,)).fetchone()
             if not pair_id_row:
                 return # Пара не найдена
-            
+
             pair_id = pair_id_row[0]
-            cursor.execute("""
+            conn.execute("""
                 INSERT INTO p2p_listings (pair_id, nickname, price, "limit", action)
                 VALUES (?, ?, ?, ?, ?)
             """, (pair_id, nickname, price, limit, action))
-            conn.commit()
+        await self._writer.submit(add)
 
-    def remove_p2p_listing(self, listing_id: int):
+    async def remove_p2p_listing(self, listing_id: int):
         """Удаляет листинг по его ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM p2p_listings WHERE id = ?", (listing_id,))
-            conn.commit()
+        await self._execute("DELETE FROM p2p_listings WHERE id = ?", (listing_id,))
 
-    def get_p2p_listings(self, pair_name: str) -> List[Dict]:
+    async def get_p2p_listings(self, pair_name: str) -> List[Dict]:
         """Возвращает все листинги для указанной валютной пары."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT l.id, l.nickname, l.price, l."limit", l.action
-                FROM p2p_listings l
-                JOIN p2p_pairs p ON l.pair_id = p.id
-                WHERE p.name = ?
-            """, (pair_name,))
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
-            
+        rows = await self._fetchall("""
+            SELECT l.id, l.nickname, l.price, l."limit", l.action
+            FROM p2p_listings l
+            JOIN p2p_pairs p ON l.pair_id = p.id
+            WHERE p.name = ?
+        """, (pair_name,))
+        return [dict(row) for row in rows]
+
     # --- Методы для пользователей ---
-    def register_new_user(self, user_id: int, username: str, full_name: str, language: str = 'ru'):
+    async def register_new_user(self, user_id: int, username: str, full_name: str, language: str = 'ru'):
         """Регистрирует нового пользователя, если он не существует."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR IGNORE INTO users (user_id, username, full_name, language)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, username, full_name, language))
-            conn.commit()
-
-    def get_user_data(self, user_id: int) -> Optional[Dict]:
-        """Возвращает все данные пользователя по ID."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-            
-    def update_user_data(self, user_id: int, data: Dict):
-        """Обновляет данные пользователя на основе переданного словаря."""
+        await self._execute_for_user(user_id, """
+            INSERT OR IGNORE INTO users (user_id, username, full_name, language)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, username, full_name, language))
+
+    async def get_user_data(self, user_id: int) -> Optional[Dict]:
+        """Возвращает все данные пользователя по ID (через кеш)."""
+        data = self.user_cache.get(user_id)
+        if data is MISSING:
+            token = self.user_cache.token()
+            row = await self._fetchone("SELECT * FROM users WHERE user_id = ?", (user_id,))
+            data = dict(row) if row else None
+            self.user_cache.set(user_id, data, token)
+        # Отдаем копию, чтобы вызывающий код не менял закешированную строку
+        return dict(data) if data else None
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        """Возвращает пользователя в виде объекта User."""
+        data = await self.get_user_data(user_id)
+        return User.from_dict(data) if data else None
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        """
+        Обновляет данные пользователя на основе переданного словаря.
+        Новое значение balance в минимальных единицах (None - ноль) записывается в журнал
+        как операция 'admin_set' на разницу со старым.
+        """
         if not data:
             return
-        
-        set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
-        values = list(data.values())
-        values.append(user_id)
-        
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"UPDATE users SET {set_clause} WHERE user_id = ?", tuple(values))
-            conn.commit()
-
-    def update_ton_wallet(self, user_id: int, wallet_address: str):
+
+        data = dict(data)
+        balance = data.pop('balance', MISSING)
+        if balance is not MISSING:
+            # Как и на других путях изменения баланса, дробное значение - ошибка, а не округление
+            balance = check_minor(balance if balance is not None else 0)
+
+        def update(conn: sqlite3.Connection):
+            if data:
+                set_clause = ", ".join([f"{key} = ?" for key in data.keys()])
+                values = list(data.values())
+                values.append(user_id)
+                conn.execute(f"UPDATE users SET {set_clause} WHERE user_id = ?", tuple(values))
+            if balance is not MISSING:
+                delta = balance - (self._read_balance(conn, user_id) or 0)
+                updated = conn.execute("UPDATE users SET balance = ? WHERE user_id = ?",
+                                       (balance, user_id)).rowcount
+                if updated and delta:
+                    self._record_entry(conn, user_id, delta, 'admin_set')
+        await self._submit_for_user(user_id, update)
+
+    async def update_ton_wallet(self, user_id: int, wallet_address: str):
         """Обновляет адрес TON-кошелька пользователя."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET ton_wallet = ? WHERE user_id = ?",
-                            (wallet_address, user_id))
-            conn.commit()
+        await self._execute_for_user(user_id, "UPDATE users SET ton_wallet = ? WHERE user_id = ?",
+                                     (wallet_address, user_id))
 
-    def update_card_number(self, user_id: int, card_number: str):
+    async def update_card_number(self, user_id: int, card_number: str):
         """Обновляет номер банковской карты пользователя."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET card_number = ? WHERE user_id = ?",
-                            (card_number, user_id))
-            conn.commit()
+        await self._execute_for_user(user_id, "UPDATE users SET card_number = ? WHERE user_id = ?",
+                                     (card_number, user_id))
 
-    def update_language(self, user_id: int, language: str):
+    async def update_language(self, user_id: int, language: str):
         """Обновляет язык пользователя."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET language = ? WHERE user_id = ?",
-                            (language, user_id))
-            conn.commit()
+        await self._execute_for_user(user_id, "UPDATE users SET language = ? WHERE user_id = ?",
+                                     (language, user_id))
 
-    def get_user_language(self, user_id: int) -> str:
+    async def get_user_language(self, user_id: int) -> str:
         """Возвращает язык пользователя или 'ru' по умолчанию."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT language FROM users WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else 'ru'
-    
-    def user_exists(self, user_id: int) -> bool:
+        data = await self.get_user_data(user_id)
+        return data['language'] if data else 'ru'
+
+    async def user_exists(self, user_id: int) -> bool:
         """Проверяет, существует ли пользователь в базе данных."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
-            return cursor.fetchone() is not None
+        return await self.get_user_data(user_id) is not None
 
-    def get_p2p_listing_by_id(self, listing_id: int) -> Optional[Dict]:
+    async def get_p2p_listing_by_id(self, listing_id: int) -> Optional[Dict]:
         """Возвращает данные одного листинга по его ID, включая название пары."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT l.id, l.nickname, l.price, l."limit", l.action, p.name as pair_name
-                FROM p2p_listings l
-                JOIN p2p_pairs p ON l.pair_id = p.id
-                WHERE l.id = ?
-            """, (listing_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        row = await self._fetchone("""
+            SELECT l.id, l.nickname, l.price, l."limit", l.action, p.name as pair_name
+            FROM p2p_listings l
+            JOIN p2p_pairs p ON l.pair_id = p.id
+            WHERE l.id = ?
+        """, (listing_id,))
+        return dict(row) if row else None
 
     # --- Методы для разрешений на пополнение баланса ---
-    def grant_balance_permission(self, user_id: int, duration_days: int):
+    async def grant_balance_permission(self, user_id: int, duration_days: int):
         """
         Выдает пользователю разрешение на пополнение баланса на определенное количество дней.
         """
         end_time = time.time() + (duration_days * 24 * 3600)
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO balance_permissions (user_id, end_time)
-                VALUES (?, ?)
-            """, (user_id, end_time))
-            conn.commit()
+        await self._execute("""
+            INSERT OR REPLACE INTO balance_permissions (user_id, end_time)
+            VALUES (?, ?)
+        """, (user_id, end_time))
 
-    def revoke_balance_permission(self, user_id: int):
+    async def revoke_balance_permission(self, user_id: int):
         """
         Забирает у пользователя разрешение на пополнение баланса.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM balance_permissions WHERE user_id = ?", (user_id,))
-            conn.commit()
+        await self._execute("DELETE FROM balance_permissions WHERE user_id = ?", (user_id,))
 
 
-    def check_balance_permission(self, user_id: int) -> bool:
+    async def check_balance_permission(self, user_id: int) -> bool:
         """
         Проверяет, есть ли у пользователя активное разрешение на пополнение.
         Если время истекло, разрешение удаляется.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT end_time FROM balance_permissions WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            
-            if not result:
-                return False
-            
-            end_time = result[0]
-            if time.time() < end_time:
-                return True
-            else:
-                # Если время истекло, удаляем разрешение
-                cursor.execute("DELETE FROM balance_permissions WHERE user_id = ?", (user_id,))
-                conn.commit()
-                return False
-
-    def get_user_balance(self, user_id: int) -> float:
-        """Возвращает текущий баланс пользователя."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else 0.0
-
-    def update_user_balance(self, user_id: int, amount: float):
-        """Обновляет баланс пользователя, добавляя или вычитая сумму."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, user_id))
-            conn.commit()
+        result = await self._fetchone("SELECT end_time FROM balance_permissions WHERE user_id = ?", (user_id,))
+
+        if not result:
+            return False
+
+        end_time = result[0]
+        if time.time() < end_time:
+            return True
+        else:
+            # Если время истекло, удаляем разрешение
+            await self._execute("DELETE FROM balance_permissions WHERE user_id = ? AND end_time = ?",
+                                (user_id, end_time))
+            return False
+
+    async def get_user_balance(self, user_id: int) -> int:
+        """
+        Возвращает текущий баланс пользователя в минимальных единицах.
+        Всегда читает из базы в обход кеша: используется на денежных операциях.
+        """
+        result = await self._fetchone("SELECT balance FROM users WHERE user_id = ?", (user_id,))
+        return result[0] if result else 0
+
+    async def update_user_balance(self, user_id: int, amount: int,
+                                  reason: str = 'adjustment') -> Optional[int]:
+        """
+        Добавляет к балансу amount (отрицательная сумма - списание) и записывает
+        операцию в журнал с причиной reason.
+        Возвращает новый баланс или None, если баланс стал бы отрицательным
+        или пользователя нет; в этом случае баланс не меняется.
+        """
+        def update(conn: sqlite3.Connection) -> Optional[int]:
+            return self._apply_balance(conn, user_id, amount, reason)
+        return await self._submit_for_user(user_id, update)
+
+    # --- Журнал баланса ---
+
+    async def get_ledger_entries(self, user_id: int, limit: int = 20) -> List[Dict]:
+        """Возвращает последние операции с балансом пользователя, новые первыми."""
+        rows = await self._fetchall(
+            "SELECT * FROM balance_ledger WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+        )
+        return [dict(row) for row in rows]
+
+    async def checkpoint_ledger(self) -> LedgerCheckpoint:
+        """
+        Сверяет users.balance с журналом и сохраняет контрольную точку.
+        Просматриваются только записи после предыдущей точки: баланс по журналу -
+        это баланс пользователя в его точке плюс новые записи, поэтому стоимость
+        сверки не растет с длиной истории, а суммы INTEGER сравниваются точно. Пользователи без новых записей
+        не проверяются. В точку сохраняется баланс по журналу даже при
+        расхождении, и оно будет найдено снова при следующей операции.
+        """
+        def checkpoint(conn: sqlite3.Connection) -> LedgerCheckpoint:
+            start = conn.execute("SELECT COALESCE(MAX(ledger_id), 0) FROM ledger_checkpoints").fetchone()[0]
+            rows = conn.execute("""
+                SELECT l.user_id, SUM(l.amount) AS delta, MAX(l.id) AS ledger_id, COUNT(*) AS entries,
+                       COALESCE(c.balance, 0) AS checkpoint_balance, u.balance AS balance
+                FROM balance_ledger l
+                LEFT JOIN balance_checkpoints c ON c.user_id = l.user_id
+                LEFT JOIN users u ON u.user_id = l.user_id
+                WHERE l.id > ?
+                GROUP BY l.user_id
+            """, (start,)).fetchall()
+            if not rows:
+                return LedgerCheckpoint(start, 0, {})
+
+            now = time.time()
+            mismatches = {}
+            for row in rows:
+                expected = row['checkpoint_balance'] + row['delta']
+                actual = row['balance'] or 0
+                if expected != actual:
+                    mismatches[row['user_id']] = (expected, actual)
+            conn.executemany("""
+                INSERT OR REPLACE INTO balance_checkpoints (user_id, balance, ledger_id, checked_at)
+                VALUES (?, ?, ?, ?)
+            """, [(row['user_id'], row['checkpoint_balance'] + row['delta'], row['ledger_id'], now) for row in rows])
+
+            ledger_id = max(row['ledger_id'] for row in rows)
+            entries = sum(row['entries'] for row in rows)
+            conn.execute("""
+                INSERT INTO ledger_checkpoints (ledger_id, entries, mismatches, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (ledger_id, entries, len(mismatches), now))
+            return LedgerCheckpoint(ledger_id, entries, mismatches)
+        return await self._writer.submit(checkpoint)
+
+    # --- Заявки на пополнение ---
+
+    async def create_top_up_request(self, user_id: int, amount: int, idempotency_key: str,
+                                    currency: str = 'TON') -> Tuple[int, bool]:
+        """
+        Создает заявку на пополнение и возвращает (ID заявки, создана ли она сейчас).
+        Повторный вызов с тем же idempotency_key возвращает уже существующую заявку.
+        """
+        check_minor(amount)
+        def create(conn: sqlite3.Connection) -> Tuple[int, bool]:
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO top_up_requests (idempotency_key, user_id, amount, currency)
+                VALUES (?, ?, ?, ?)
+            """, (idempotency_key, user_id, amount, currency))
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            row = conn.execute("SELECT id FROM top_up_requests WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            return row[0], False
+        return await self._writer.submit(create)
+
+    async def decide_top_up(self, request_id: int, status: str) -> Optional[TopUpDecision]:
+        """
+        Переводит заявку из 'pending' в status ('confirmed' или 'declined');
+        при подтверждении сумма зачисляется на баланс в той же транзакции.
+        Возвращает None, если заявка не найдена или уже обработана,
+        поэтому повторное нажатие не может зачислить сумму дважды.
+        """
+        if status not in ('confirmed', 'declined'):
+            raise ValueError(f"Unknown top-up decision: {status}")
+
+        def decide(conn: sqlite3.Connection) -> Optional[TopUpDecision]:
+            won = conn.execute("""
+                UPDATE top_up_requests SET status = ?, decided_at = ?
+                WHERE id = ? AND status = 'pending'
+            """, (status, time.time(), request_id)).rowcount
+            if not won:
+                return None
+            request = dict(conn.execute("SELECT * FROM top_up_requests WHERE id = ?", (request_id,)).fetchone())
+            if status == 'confirmed':
+                self._apply_balance(conn, request['user_id'], request['amount'], 'top_up', request_id)
+            return TopUpDecision(request, self._read_balance(conn, request['user_id']))
+
+        decision = await self._writer.submit(decide)
+        if decision is not None:
+            self.user_cache.invalidate(decision.request['user_id'])
+        return decision
+
+    # --- Методы для медиафайлов ---
+    async def get_media_file_id(self, content_hash: str) -> Optional[str]:
+        """Возвращает сохраненный file_id для файла с указанным хешем содержимого."""
+        row = await self._fetchone("SELECT file_id FROM media_files WHERE content_hash = ?", (content_hash,))
+        return row[0] if row else None
+
+    async def save_media_file_id(self, content_hash: str, file_id: str):
+        """Сохраняет file_id, полученный от Telegram после загрузки файла."""
+        await self._execute("""
+            INSERT OR REPLACE INTO media_files (content_hash, file_id, updated_at)
+            VALUES (?, ?, ?)
+        """, (content_hash, file_id, time.time()))
+
+    async def delete_media_file_id(self, content_hash: str):
+        """Удаляет file_id, который Telegram перестал принимать."""
+        await self._execute("DELETE FROM media_files WHERE content_hash = ?", (content_hash,))
+
+    # --- Заявки в поддержку ---
+
+    async def save_support_messages(self, chat_id: int, message_ids: Sequence[int], user_id: int):
+        """Запоминает, что сообщения в группе администраторов относятся к заявке пользователя."""
+        def save(conn: sqlite3.Connection):
+            conn.executemany(
+                "INSERT OR REPLACE INTO support_messages (chat_id, message_id, user_id) VALUES (?, ?, ?)",
+                [(chat_id, message_id, user_id) for message_id in message_ids]
+            )
+        await self._writer.submit(save)
+
+    async def get_support_user(self, chat_id: int, message_id: int) -> Optional[int]:
+        """Возвращает автора заявки, к которой относится сообщение в группе администраторов."""
+        row = await self._fetchone(
+            "SELECT user_id FROM support_messages WHERE chat_id = ? AND message_id = ?",
+            (chat_id, message_id)
+        )
+        return row[0] if row else None
+
+    # --- Outbox уведомлений ---
+
+    @staticmethod
+    def _enqueue_outbox(conn: sqlite3.Connection, notifications: Sequence[OutboxMessage]):
+        """Добавляет уведомления в outbox внутри текущей транзакции."""
+        conn.executemany(
+            "INSERT INTO outbox (chat_id, text, parse_mode, next_attempt_at) VALUES (?, ?, ?, ?)",
+            [(n.chat_id, n.text, n.parse_mode, time.time()) for n in notifications]
+        )
+
+    async def enqueue_notifications(self, notifications: Sequence[OutboxMessage]):
+        """Ставит уведомления в outbox отдельной транзакцией."""
+        await self._writer.submit(self._enqueue_outbox, notifications)
+
+    async def claim_outbox(self, limit: int, lease: float) -> List[Dict]:
+        """
+        Выбирает уведомления, которые пора отправить, и откладывает их
+        следующую попытку на lease секунд. Если процесс упадет во время
+        отправки, уведомление снова станет доступным после истечения lease
+        и будет отправлено еще раз, даже если первая отправка дошла.
+        """
+        def claim(conn: sqlite3.Connection) -> List[Dict]:
+            now = time.time()
+            rows = conn.execute("""
+                SELECT * FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id LIMIT ?
+            """, (now, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                             [(now + lease, row['id']) for row in rows])
+            return [dict(row) for row in rows]
+        return await self._writer.submit(claim)
+
+    async def mark_outbox_sent(self, message_id: int):
+        """Отмечает уведомление как доставленное."""
+        await self._execute("UPDATE outbox SET status = 'sent', sent_at = ? WHERE id = ?", (time.time(), message_id))
+
+    async def mark_outbox_retry(self, message_id: int, next_attempt_at: float, error: str):
+        """Записывает неудачную попытку и время следующей."""
+        await self._execute("""
+            UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+        """, (next_attempt_at, error, message_id))
+
+    async def mark_outbox_failed(self, message_id: int, error: str):
+        """Отмечает уведомление, которое больше не будет отправляться."""
+        await self._execute("""
+            UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+            WHERE id = ?
+        """, (error, message_id))
 
 # Инициализация базы данных
-db = UserDatabase()
\ No newline at end of file
+db = UserDatabase(
+    profile=STORAGE_PROFILES[SQLITE_PROFILE],
+    cache_size=USER_CACHE_SIZE,
+    cache_ttl=USER_CACHE_TTL,
+)
@@ -9,6 +9,8 @@ from src.locales import translator
 from src.config import ADMINS_LIST, ADMIN_GROUPS, CAN_EDIT_USERS
 from src.database import db # Импортируем наш объект БД
 from src.states import AdminP2PStates, AdminUserManagement # Импортируем оба класса состояний
+from src.utils.formatters import format_money
+from src.utils.money import parse_money
 
 admin_router = Router()
 
@@ -65,7 +67,7 @@ async def user_id_received(message: Message, state: FSMContext):
         return
 
     user_id = int(message.text)
-    user_data = db.get_user_data(user_id)
+    user_data = await db.get_user_data(user_id)
 
     if not user_data:
         await message.answer(f"❗️ Пользователь с ID `{user_id}` не найден. Попробуйте еще раз.")
@@ -77,7 +79,7 @@ async def user_id_received(message: Message, state: FSMContext):
 
 async def show_user_profile(event: Message | CallbackQuery, state: FSMContext, user_id: int):
     """Хелпер для отображения профиля пользователя и кнопок редактирования."""
-    user_data = db.get_user_data(user_id)
+    user_data = await db.get_user_data(user_id)
     if not user_data:
         text_error = f"❗️ Не удалось получить данные для пользователя {user_id}."
         if isinstance(event, Message):
@@ -92,7 +94,7 @@ async def show_user_profile(event: Message | CallbackQuery, state: FSMContext, u
     profile_text += f"▪️ Username: @{escaped_username}\n"
     profile_text += f"▪️ Full Name: {html.quote(user_data.get('full_name', 'N/A'))}\n"
     profile_text += f"▪️ Язык: {user_data.get('language', 'N/A')}\n"
-    profile_text += f"💰 Баланс: `{user_data.get('balance', 0)}`\n"
+    profile_text += f"💰 Баланс: `{format_money(user_data.get('balance') or 0)}`\n"
     profile_text += f"🤝 Сделок: `{user_data.get('deals_count', 0)}`\n"
     profile_text += f"🗣️ Рефералов: `{user_data.get('ref_count', 0)}`\n"
     profile_text += f"💳 Карта: `{user_data.get('card_number') or 'не указана'}`\n"
@@ -179,7 +181,7 @@ async def edit_user_field_process(message: Message, state: FSMContext):
 
     if field in ["balance"] and new_value is not None:
         try:
-            new_value = float(new_value_str)
+            new_value = parse_money(new_value_str)
         except ValueError:
             await message.answer("❗️ Ошибка: Баланс должен быть числом. Попробуйте еще раз.")
             return
@@ -189,7 +191,7 @@ async def edit_user_field_process(message: Message, state: FSMContext):
             return
         new_value = int(new_value_str)
 
-    db.update_user_data(user_id, {field: new_value})
+    await db.update_user_data(user_id, {field: new_value})
     
     await message.answer(f"✅ Поле `{field}` для пользователя `{user_id}` успешно обновлено.")
     
@@ -227,7 +229,7 @@ async def add_pair_start(callback: CallbackQuery, state: FSMContext):
 @admin_router.message(IsAdmin(), AdminP2PStates.waiting_for_pair_to_add)
 async def add_pair_process(message: Message, state: FSMContext):
     pair_name = message.text.upper()
-    if db.add_p2p_pair(pair_name):
+    if await db.add_p2p_pair(pair_name):
         await message.answer(f"✅ Пара {pair_name} успешно добавлена.")
     else:
         await message.answer(f"⚠️ Пара {pair_name} уже существует.")
@@ -242,7 +244,7 @@ async def add_pair_process(message: Message, state: FSMContext):
 
 @admin_router.callback_query(IsAdmin(), F.data == "admin_p2p_remove_pair")
 async def remove_pair_start(callback: CallbackQuery, state: FSMContext):
-    pairs = db.get_all_p2p_pairs()
+    pairs = await db.get_all_p2p_pairs()
     if not pairs:
         await callback.answer("Нет созданных пар для удаления.", show_alert=True)
         return
@@ -257,7 +259,7 @@ async def remove_pair_start(callback: CallbackQuery, state: FSMContext):
 @admin_router.callback_query(IsAdmin(), F.data.startswith("confirm_remove_pair_"))
 async def remove_pair_confirm(callback: CallbackQuery, state: FSMContext):
     pair_name = callback.data.split('_', 3)[-1]
-    db.remove_p2p_pair(pair_name)
+    await db.remove_p2p_pair(pair_name)
     await callback.answer(f"Пара {pair_name} и все ее листинги удалены.", show_alert=True)
     await state.clear()
     await p2p_manage_menu(callback, state)
@@ -267,7 +269,7 @@ async def remove_pair_confirm(callback: CallbackQuery, state: FSMContext):
 
 @admin_router.callback_query(IsAdmin(), F.data == "admin_p2p_manage_listings")
 async def manage_listings_start(callback: CallbackQuery, state: FSMContext):
-    pairs = db.get_all_p2p_pairs()
+    pairs = await db.get_all_p2p_pairs()
     if not pairs:
         await callback.answer("Сначала создайте хотя бы одну валютную пару.", show_alert=True)
         return
@@ -284,7 +286,7 @@ async def select_listing_pair(callback: CallbackQuery, state: FSMContext):
     pair_name = callback.data.split('_', 3)[-1]
     await state.update_data(current_pair=pair_name)
     
-    listings = db.get_p2p_listings(pair_name)
+    listings = await db.get_p2p_listings(pair_name)
     text = f"Управление листингами для пары *{pair_name}*\n\n"
     if not listings:
         text += "Пока нет активных листингов."
@@ -309,7 +311,7 @@ async def select_listing_pair(callback: CallbackQuery, state: FSMContext):
 async def remove_listing_start(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     pair_name = data.get("current_pair")
-    listings = db.get_p2p_listings(pair_name)
+    listings = await db.get_p2p_listings(pair_name)
     
     if not listings:
         await callback.answer("Нет листингов для удаления в этой паре.", show_alert=True)
@@ -331,7 +333,7 @@ async def remove_listing_start(callback: CallbackQuery, state: FSMContext):
 @admin_router.callback_query(IsAdmin(), AdminP2PStates.waiting_for_listing_to_remove, F.data.startswith("confirm_remove_listing_"))
 async def remove_listing_confirm(callback: CallbackQuery, state: FSMContext):
     listing_id = int(callback.data.split('_')[-1])
-    db.remove_p2p_listing(listing_id)
+    await db.remove_p2p_listing(listing_id)
     await callback.answer("Листинг удален.", show_alert=True)
     
     await select_listing_pair(callback, state)
@@ -372,7 +374,7 @@ async def add_listing_finish(callback: CallbackQuery, state: FSMContext):
     await state.update_data(action=action)
     
     data = await state.get_data()
-    db.add_p2p_listing(
+    await db.add_p2p_listing(
         pair_name=data['current_pair'],
         nickname=data['nickname'],
         price=data['price'],
@@ -409,8 +411,13 @@ async def grant_balance_access(message: Message) -> None:
         await message.answer("Неверный формат. ID пользователя и длительность должны быть числами.")
         return
 
+    # Разрешение ссылается на users, поэтому пользователь должен быть зарегистрирован
+    if not await db.user_exists(target_user_id):
+        await message.answer(f"Пользователь с ID {target_user_id} не найден.")
+        return
+
     # Выдача разрешения через базу данных
-    db.grant_balance_permission(target_user_id, duration_days)
+    await db.grant_balance_permission(target_user_id, duration_days)
 
     # Уведомление администратора
     await message.answer(f"Пользователю с ID {target_user_id} выдано разрешение на пополнение баланса на {duration_days} д.")
@@ -450,7 +457,7 @@ async def revoke_balance_access(message: Message) -> None:
         return
 
     # Отзыв разрешения через базу данных
-    db.revoke_balance_permission(target_user_id)
+    await db.revoke_balance_permission(target_user_id)
 
     # Уведомление администратора
     await message.answer(f"У пользователя с ID {target_user_id} отозвано разрешение на пополнение баланса.")
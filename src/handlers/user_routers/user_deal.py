@@ -1,96 +1,62 @@
 import re
 import datetime
+from typing import List
 
 from aiogram import F, Router
-from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 
 from src.locales import translator
-from src.database import db
+from src.database import db, User, OutboxMessage, DealDecision
 from src.states import *
-from src.utils.formatters import format_ton_wallet
-from src.config import ADMIN_GROUPS, PHOTO_PATH
+from src.utils.formatters import format_money, format_ton_wallet
+from src.utils.money import parse_money
+from src.config import PHOTO_PATH
+from src.utils.media import media
+from src.utils.fanout import admin_fanout
+from src.utils.outbox import outbox
+from src.screens import screens
 
 router = Router()
 
 @router.callback_query(F.data.in_({'create_deal'}))
-async def handle_wallet_required_action(callback: CallbackQuery, state: FSMContext) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-
+async def handle_wallet_required_action(callback: CallbackQuery, state: FSMContext, user: User, lang: str) -> None:
     # Проверка наличия TON-кошелька
-    if not user_data.get('ton_wallet'):
+    if not user.ton_wallet:
         builder = InlineKeyboardBuilder()
         builder.button(text=translator.get_button(lang, 'add_wallet'), callback_data="add_change_wallet")
         builder.adjust(1)
         await callback.answer(translator.get_message(lang, 'wallet_not_added_warning'), show_alert=True)
         return
     
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'add_ton_wallet'), callback_data="add_recipient_ton_wallet")
-    builder.button(text=translator.get_button(lang, 'add_card'), callback_data="add_recipient_card")
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="back_to_main")
-    builder.adjust(1)
-    
     # Редактируем сообщение, заменяя его на фото с новым текстом
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'p2p_enter_recipient_type')),
-        reply_markup=builder.as_markup()
-    )
+    await screens.show(callback, "deal_recipient_type", lang)
 
     await state.set_state(P2PStates.waiting_for_recipient_type)
     await callback.answer()
 
 
 @router.callback_query(P2PStates.waiting_for_recipient_type, F.data == "add_recipient_ton_wallet")
-async def add_recipient_ton_wallet_handler(callback: CallbackQuery, state: FSMContext) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-
-    # Создаем клавиатуру с кнопкой "Назад", которая возвращает на экран выбора типа получателя
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="create_deal")
-    builder.adjust(1)
-
-    # Редактируем подпись (caption) сообщения
-    await callback.message.edit_caption(
-        caption=translator.get_message(lang, 'p2p_enter_recipient_wallet'),
-        reply_markup=builder.as_markup()
-    )
+async def add_recipient_ton_wallet_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
+    # Кнопка "Назад" возвращает на экран выбора типа получателя
+    await screens.show(callback, "deal_recipient_wallet", lang)
     
     await state.set_state(P2PStates.waiting_for_recipient_wallet)
     await state.update_data(recipient_type='ton_wallet')
     await callback.answer()
 
 @router.callback_query(P2PStates.waiting_for_recipient_type, F.data == "add_recipient_card")
-async def add_recipient_card_handler(callback: CallbackQuery, state: FSMContext) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    
-    # Создаем клавиатуру с кнопкой "Назад", которая возвращает на экран выбора типа получателя
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="create_deal")
-    builder.adjust(1)
-
-    # Редактируем подпись (caption) сообщения
-    await callback.message.edit_caption(
-        caption=translator.get_message(lang, 'p2p_enter_recipient_card'),
-        reply_markup=builder.as_markup()
-    )
+async def add_recipient_card_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
+    # Кнопка "Назад" возвращает на экран выбора типа получателя
+    await screens.show(callback, "deal_recipient_card", lang)
     
     await state.set_state(P2PStates.waiting_for_recipient_card)
     await state.update_data(recipient_type='card')
     await callback.answer()
 
 @router.message(P2PStates.waiting_for_recipient_wallet, F.text)
-async def process_recipient_ton_wallet(message: Message, state: FSMContext) -> None:
-    user_data = db.get_user_data(message.from_user.id)
-    lang = user_data.get('language', 'ru')
+async def process_recipient_ton_wallet(message: Message, state: FSMContext, lang: str) -> None:
     wallet_address = message.text
     
     if not re.match(r'^[a-zA-Z0-9_-]{48}$', wallet_address):
@@ -106,9 +72,7 @@ async def process_recipient_ton_wallet(message: Message, state: FSMContext) -> N
     await state.set_state(P2PStates.waiting_for_amount)
 
 @router.message(P2PStates.waiting_for_recipient_card, F.text)
-async def process_recipient_card(message: Message, state: FSMContext) -> None:
-    user_data = db.get_user_data(message.from_user.id)
-    lang = user_data.get('language', 'ru')
+async def process_recipient_card(message: Message, state: FSMContext, lang: str) -> None:
     card_number = message.text.replace(' ', '')
     
     if not re.match(r'^\d{16}$', card_number):
@@ -125,25 +89,24 @@ async def process_recipient_card(message: Message, state: FSMContext) -> None:
 
 
 @router.message(P2PStates.waiting_for_amount, F.text)
-async def process_deal_amount(message: Message, state: FSMContext) -> None:
-    user_data = db.get_user_data(message.from_user.id)
-    lang = user_data.get('language', 'ru')
-    
+async def process_deal_amount(message: Message, state: FSMContext, lang: str) -> None:
     try:
-        amount = float(message.text)
+        amount = parse_money(message.text)
         if amount <= 0:
             raise ValueError
     except ValueError:
         await message.answer(translator.get_message(lang, 'p2p_invalid_amount'))
         return
     
-    # Проверка баланса
-    user_balance = float(user_data.get('balance', 0))
+    # Проверка баланса (читаем из БД, а не из кеша)
+    user_balance = await db.get_user_balance(message.from_user.id)
     if amount > user_balance:
         await message.answer(translator.get_message(lang, 'p2p_insufficient_balance'))
         return
 
-    await state.update_data(amount=amount)
+    # Сумма в минимальных единицах; отдельный ключ, чтобы не принять
+    # за них дробную сумму из состояния, сохраненного до перехода
+    await state.update_data(amount_minor=amount)
     data = await state.get_data()
 
     # Определяем валюту для отображения
@@ -153,16 +116,15 @@ async def process_deal_amount(message: Message, state: FSMContext) -> None:
     confirmation_text = translator.get_message(lang, 'p2p_confirm_deal_header') + "\n\n"
     confirmation_text += f"**{translator.get_message(lang, 'p2p_recipient_type')}:** {data['recipient_type'].replace('ton_wallet', translator.get_button(lang, 'add_ton_wallet')).replace('card', translator.get_button(lang, 'add_card'))}\n"
     confirmation_text += f"**{translator.get_message(lang, 'p2p_recipient_address')}:** `{data['recipient_address']}`\n"
-    confirmation_text += f"**{translator.get_message(lang, 'p2p_transfer_amount')}:** {data['amount']} {currency_symbol}"
+    confirmation_text += f"**{translator.get_message(lang, 'p2p_transfer_amount')}:** {format_money(data['amount_minor'])} {currency_symbol}"
     
     builder = InlineKeyboardBuilder()
     builder.button(text=translator.get_button(lang, 'p2p_confirm'), callback_data="confirm_deal")
     builder.button(text=translator.get_button(lang, 'p2p_decline'), callback_data="decline_deal")
     builder.adjust(2)
     
-    photo = FSInputFile(PHOTO_PATH)
-    await message.answer_photo(
-        photo=photo,
+    await media.answer_photo(
+        message, PHOTO_PATH,
         caption=confirmation_text,
         reply_markup=builder.as_markup(),
         parse_mode="Markdown"
@@ -171,40 +133,36 @@ async def process_deal_amount(message: Message, state: FSMContext) -> None:
     await state.set_state(P2PStates.waiting_for_confirmation)
 
 @router.callback_query(P2PStates.waiting_for_confirmation, F.data == "confirm_deal")
-async def confirm_deal_handler(callback: CallbackQuery, state: FSMContext) -> None:
+async def confirm_deal_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
     """
     Обработчик, который срабатывает после того, как пользователь подтвердил сделку.
     Списывает средства, создает заявку и отправляет ее администраторам.
     """
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
     data = await state.get_data()
-    
-    current_balance = float(user_data.get('balance', 0))
-    amount_to_deduct = data.get('amount')
-    
-    if amount_to_deduct is None or current_balance < amount_to_deduct:
+    amount_to_deduct = data.get('amount_minor')
+
+    # Определяем валюту
+    currency = 'TON' if data.get('recipient_type') == 'ton_wallet' else 'RUB'
+
+    # 1-2. Списываем средства (они "замораживаются") и создаем сделку со статусом
+    # 'pending' одной транзакцией; списание не пройдет, если средств уже не хватает
+    debit = None
+    if amount_to_deduct is not None:
+        debit = await db.create_deal_with_debit(
+            sender_id=callback.from_user.id,
+            recipient_address=data['recipient_address'],
+            recipient_type=data['recipient_type'],
+            amount=amount_to_deduct,
+            currency=currency
+        )
+
+    if debit is None or not debit.ok:
         # --- ИЗМЕНЕНИЕ: Используем edit_caption для обновления фото-сообщения ---
         await callback.message.edit_caption(caption=translator.get_message(lang, 'p2p_insufficient_balance'))
         await state.clear()
         await callback.answer()
         return
-
-    # 1. Списываем средства с баланса пользователя (они "замораживаются")
-    new_balance = current_balance - amount_to_deduct
-    db.update_user_data(callback.from_user.id, {'balance': new_balance})
-
-    # Определяем валюту
-    currency = 'TON' if data['recipient_type'] == 'ton_wallet' else 'RUB'
-
-    # 2. Создаем запись о сделке в БД со статусом 'pending'
-    deal_id = db.create_deal(
-        sender_id=callback.from_user.id,
-        recipient_address=data['recipient_address'],
-        recipient_type=data['recipient_type'],
-        amount=amount_to_deduct,
-        currency=currency
-    )
+    deal_id = debit.deal_id
 
     # 3. Формируем и отправляем заявку администраторам
     admin_builder = InlineKeyboardBuilder()
@@ -215,21 +173,13 @@ async def confirm_deal_handler(callback: CallbackQuery, state: FSMContext) -> No
     admin_text = translator.get_message('ru', 'admin_new_withdrawal_request',
         username=callback.from_user.username or 'N/A',
         user_id=callback.from_user.id,
-        amount=amount_to_deduct,
+        amount=format_money(amount_to_deduct),
         currency=currency,
         recipient_type=data['recipient_type'],
         recipient_address=data['recipient_address']
     )
 
-    for group_id in ADMIN_GROUPS:
-        try:
-            await callback.bot.send_message(
-                chat_id=group_id,
-                text=admin_text,
-                reply_markup=admin_builder.as_markup(),
-            )
-        except Exception as e:
-            print(translator.get_message('ru', 'admin_send_message_error', group_id=group_id, error=e))
+    admin_fanout.send_message(callback.bot, text=admin_text, reply_markup=admin_builder.as_markup())
 
     # 4. Отправляем подтверждение пользователю
     # --- ИЗМЕНЕНИЕ: Используем edit_caption для обновления фото-сообщения ---
@@ -240,135 +190,126 @@ async def confirm_deal_handler(callback: CallbackQuery, state: FSMContext) -> No
     await state.clear()
     await callback.answer()
 
+def confirmed_deal_notifications(decision: DealDecision) -> List[OutboxMessage]:
+    """Уведомления отправителю и получателю о подтвержденной сделке."""
+    deal_data = decision.deal
+
+    # Уведомление отправителю
+    notifications = [OutboxMessage(
+        chat_id=deal_data['sender_id'],
+        text=translator.get_message('ru', 'user_request_confirmed',
+            amount=format_money(deal_data['amount']),
+            currency=deal_data['currency'],
+            recipient_address=deal_data['recipient_address']
+        ),
+        parse_mode="Markdown"
+    )]
+
+    # Уведомление получателю, если он есть в нашей БД
+    if decision.recipient:
+        # Ник отправителя для сообщения получателю
+        sender_username = (decision.sender or {}).get('username') or translator.get_message('ru', 'anonymous_user')
+        # Экранируем символы подчеркивания для корректного отображения в Markdown
+        escaped_username = sender_username.replace('_', '\\_')
+
+        # Получаем текущую дату и форматируем кошелек
+        current_date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+        formatted_wallet = format_ton_wallet(deal_data.get('recipient_address', 'N/A'), 'N/A')
+
+        notifications.append(OutboxMessage(
+            chat_id=decision.recipient['user_id'],
+            text=translator.get_message('ru', 'user_transfer_received',
+                sender_username=escaped_username,
+                amount=format_money(deal_data['amount']),
+                currency=deal_data['currency'],
+                date=current_date,
+                recipient_address=formatted_wallet,
+                deal_id=deal_data['id']
+            ),
+            parse_mode="Markdown"
+        ))
+    return notifications
+
+
+def declined_deal_notifications(decision: DealDecision) -> List[OutboxMessage]:
+    """Уведомление отправителю об отклоненной сделке с балансом после возврата."""
+    deal_data = decision.deal
+    return [OutboxMessage(
+        chat_id=deal_data['sender_id'],
+        text=translator.get_message('ru', 'user_request_declined',
+            amount=format_money(deal_data['amount']),
+            currency=deal_data['currency'],
+            current_balance=format_money(decision.sender_balance)
+        )
+    )]
+
+
 # --- НОВЫЕ ХЭНДЛЕРЫ ДЛЯ АДМИНОВ ---
 @router.callback_query(F.data.startswith("admin_confirm_deal:"))
 async def admin_confirm_deal_handler(callback: CallbackQuery) -> None:
     """
     Обработчик для кнопки 'Подтвердить перевод' в чате администратора.
+    Смена статуса, зачисление получателю и уведомления в outbox выполняются
+    одной транзакцией; если сделку уже обработал другой администратор,
+    он получает ответ "уже обработано" без дополнительных запросов.
     """
     deal_id = int(callback.data.split(':')[1])
-    deal_data = db.get_deal_by_id(deal_id)
 
-    if not deal_data or deal_data['status'] != 'pending':
+    # 1. Подтверждаем сделку, если она еще ожидает решения
+    decision = await db.decide_deal(deal_id, 'confirmed', confirmed_deal_notifications)
+    if decision is None:
         await callback.answer(translator.get_message('ru', 'admin_request_already_processed'), show_alert=True)
         return
+    await callback.answer(translator.get_message('ru', 'admin_request_confirmed_alert'))
 
-    # 1. Обновляем статус сделки в БД
-    db.update_deal_status(deal_id, 'confirmed')
-    
-    # Обновляем счетчик сделок у пользователя
-    sender_data = db.get_user_data(deal_data['sender_id'])
-    new_deals_count = sender_data.get('deals_count', 0) + 1
-    db.update_user_data(deal_data['sender_id'], {'deals_count': new_deals_count})
-
+    # 2. Запускаем отправку уведомлений
+    outbox.wake()
 
-    # 2. Уведомляем администратора
+    # 3. Уведомляем администратора
+    deal_data = decision.deal
     await callback.message.edit_text(
         translator.get_message('ru', 'admin_request_confirmed',
             sender_id=deal_data['sender_id'],
-            amount=deal_data['amount'],
+            amount=format_money(deal_data['amount']),
             currency=deal_data['currency'],
             username=callback.from_user.username or 'N/A'
         )
     )
-    await callback.answer(translator.get_message('ru', 'admin_request_confirmed_alert'))
-
-    # 3. Уведомляем отправителя
-    try:
-        await callback.bot.send_message(
-            chat_id=deal_data['sender_id'],
-            text=translator.get_message('ru', 'user_request_confirmed',
-                amount=deal_data['amount'],
-                currency=deal_data['currency'],
-                recipient_address=deal_data['recipient_address']
-            ),
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        print(translator.get_message('ru', 'admin_notify_sender_error', user_id=deal_data['sender_id'], error=e))
-
-    # 4. Пытаемся уведомить получателя, если он есть в нашей БД
-    recipient_user = db.find_user_by_wallet_or_card(deal_data['recipient_address'])
-    if recipient_user:
-        try:
-            # Увеличиваем баланс получателя на сумму сделки
-            db.update_user_balance(recipient_user['user_id'], deal_data['amount'])
-            
-            # Получаем данные отправителя, чтобы указать его ник в сообщении получателю
-            sender_username = sender_data.get('username', translator.get_message('ru', 'anonymous_user'))
-            # Экранируем символы подчеркивания для корректного отображения в Markdown
-            escaped_username = sender_username.replace('_', '\\_')
-            
-            # Получаем текущую дату и форматируем кошелек
-            current_date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
-            formatted_wallet = format_ton_wallet(deal_data.get('recipient_address', 'N/A'), 'N/A')
-
-            await callback.bot.send_message(
-                chat_id=recipient_user['user_id'],
-                text=translator.get_message('ru', 'user_transfer_received',
-                    sender_username=escaped_username,
-                    amount=deal_data['amount'],
-                    currency=deal_data['currency'],
-                    date=current_date,
-                    recipient_address=formatted_wallet,
-                    deal_id=deal_id
-                ),
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            print(translator.get_message('ru', 'admin_notify_recipient_error', user_id=recipient_user['user_id'], error=e))
 
 
 @router.callback_query(F.data.startswith("admin_decline_deal:"))
 async def admin_decline_deal_handler(callback: CallbackQuery) -> None:
     """
     Обработчик для кнопки 'Отклонить' в чате администратора.
-    Возвращает средства на баланс отправителя.
+    Смена статуса, возврат средств отправителю и уведомление в outbox
+    выполняются одной транзакцией.
     """
     deal_id = int(callback.data.split(':')[1])
-    deal_data = db.get_deal_by_id(deal_id)
 
-    if not deal_data or deal_data['status'] != 'pending':
+    # 1. Отклоняем сделку и возвращаем средства, если она еще ожидает решения
+    decision = await db.decide_deal(deal_id, 'declined', declined_deal_notifications)
+    if decision is None:
         await callback.answer(translator.get_message('ru', 'admin_request_already_processed'), show_alert=True)
         return
+    await callback.answer(translator.get_message('ru', 'admin_request_declined_alert'))
 
-    # 1. Обновляем статус сделки в БД
-    db.update_deal_status(deal_id, 'declined')
-
-    # 2. ВОЗВРАЩАЕМ СРЕДСТВА НА БАЛАНС ОТПРАВИТЕЛЯ
-    db.update_user_balance(deal_data['sender_id'], deal_data['amount'])
+    # 2. Запускаем отправку уведомления
+    outbox.wake()
 
     # 3. Уведомляем администратора
+    deal_data = decision.deal
     await callback.message.edit_text(
         translator.get_message('ru', 'admin_request_declined',
             sender_id=deal_data['sender_id'],
-            amount=deal_data['amount'],
+            amount=format_money(deal_data['amount']),
             currency=deal_data['currency'],
             username=callback.from_user.username or 'N/A'
         )
     )
-    await callback.answer(translator.get_message('ru', 'admin_request_declined_alert'))
-
-    # 4. Уведомляем отправителя
-    try:
-        current_balance = db.get_user_balance(deal_data['sender_id'])
-        await callback.bot.send_message(
-            chat_id=deal_data['sender_id'],
-            text=translator.get_message('ru', 'user_request_declined',
-                amount=deal_data['amount'],
-                currency=deal_data['currency'],
-                current_balance=current_balance
-            )
-        )
-    except Exception as e:
-        print(translator.get_message('ru', 'admin_notify_sender_error', user_id=deal_data['sender_id'], error=e))
 
 
 @router.callback_query(P2PStates.waiting_for_confirmation, F.data == "decline_deal")
-async def decline_deal_handler(callback: CallbackQuery, state: FSMContext) -> None:
-    # --- ИЗМЕНЕНИЕ: Используем edit_caption для обновления фото-сообщения ---
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    await callback.message.edit_caption(caption=translator.get_message(lang, 'p2p_deal_canceled'))
+async def decline_deal_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
+    await screens.show(callback, "deal_canceled", lang)
     await state.clear()
     await callback.answer()
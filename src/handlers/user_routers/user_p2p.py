@@ -2,61 +2,49 @@ import re
 import html 
 from aiogram import F, Router
 from aiogram.filters import Command, CommandStart
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram import types
 
 from src.locales import translator
-from src.database import db
+from src.database import db, User
 from src.states import *
 from src.handlers.user_routers.user_main import command_start_handler
 from src.config import * # Импортируем все переменные из модуля config
+from src.utils.media import media
+from src.screens import screens
 
 router = Router()
 
 # --- P2P Обмен ---
 # Обработчик для кнопки "P2P Обмен"
 @router.callback_query(F.data == 'p2p')
-async def p2p_menu_handler(callback: CallbackQuery) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    if not user_data.get('ton_wallet'):
+async def p2p_menu_handler(callback: CallbackQuery, user: User, lang: str) -> None:
+    if not user.ton_wallet:
         builder = InlineKeyboardBuilder()
         builder.button(text=translator.get_button(lang, 'add_wallet'), callback_data="add_change_wallet")
         builder.adjust(1)
         await callback.answer(translator.get_message(lang, 'wallet_not_added_warning'), show_alert=True)
         return
     
-    p2p_pairs = db.get_all_p2p_pairs() # Получаем пары из БД
+    p2p_pairs = await db.get_all_p2p_pairs() # Получаем пары из БД
     
-    builder = InlineKeyboardBuilder()
-    if p2p_pairs:
-        for pair in p2p_pairs:
-            # Создаем кнопки динамически
-            builder.button(text=pair.replace('_', ' <> '), callback_data=f"p2p_{pair}")
-    
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="back_to_main")
-    builder.adjust(1)
-    
-    # Используем путь к файлу, импортированный напрямую
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'p2p_description'), parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
+    # Кнопки валютных пар создаются динамически, перед кнопкой "Назад"
+    pair_buttons = [
+        InlineKeyboardButton(text=pair.replace('_', ' <> '), callback_data=f"p2p_{pair}")
+        for pair in p2p_pairs or ()
+    ]
+    await screens.show(callback, "p2p_menu", lang, extra_buttons=pair_buttons)
     await callback.answer()
 
 # Обработчик для выбора валютной пары в P2P
 @router.callback_query(F.data.startswith('p2p_') & ~F.data.startswith('p2p_trader_select:'))
-async def p2p_select_currency_handler(callback: CallbackQuery) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    
+async def p2p_select_currency_handler(callback: CallbackQuery, lang: str) -> None:
     currency_pair = callback.data.split('_', 1)[1] # Например, 'TON_RUB'
     
     # Получаем листинги из БД
-    traders_list = db.get_p2p_listings(currency_pair)
+    traders_list = await db.get_p2p_listings(currency_pair)
 
     builder = InlineKeyboardBuilder()
 
@@ -89,43 +77,27 @@ async def p2p_select_currency_handler(callback: CallbackQuery) -> None:
     builder.adjust(1)
     
     # Используем путь к файлу, импортированный напрямую
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=traders_text, parse_mode="HTML"),
+    await media.edit_photo(
+        callback.message, PHOTO_PATH,
+        caption=traders_text, parse_mode="HTML",
         reply_markup=builder.as_markup()
     )
     await callback.answer()
 
 # Новый обработчик для выбора конкретного трейдера
 @router.callback_query(F.data.startswith('p2p_trader_select:'))
-async def p2p_select_trader_handler(callback: CallbackQuery) -> None:
-    user_id = callback.from_user.id
-    user_data = db.get_user_data(user_id)
-    lang = user_data.get('language', 'ru')
-    
-    response_text = translator.get_message(lang, 'not_enough_balance')
-    
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back_to_main'), callback_data="back_to_main")
-    
-    # Используем путь к файлу, импортированный напрямую
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=response_text, parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
-    await callback.answer(response_text, parse_mode="HTML", show_alert=True)
+async def p2p_select_trader_handler(callback: CallbackQuery, lang: str) -> None:
+    await screens.show(callback, "p2p_not_enough_balance", lang)
+    await callback.answer(screens.caption("p2p_not_enough_balance", lang), parse_mode="HTML", show_alert=True)
 
 
 # Обработчик для подтверждения продажи
 @router.callback_query(F.data.startswith('p2p_sell:'))
-async def p2p_sell_handler(callback: CallbackQuery, state: FSMContext) -> None:
+async def p2p_sell_handler(callback: CallbackQuery, state: FSMContext, user: User, lang: str) -> None:
     user_id = callback.from_user.id
-    user_data = db.get_user_data(user_id)
-    lang = user_data.get('language', 'ru')
 
     trader_id = int(callback.data.split(':')[1])
-    trader_listing = db.get_p2p_listing_by_id(trader_id)
+    trader_listing = await db.get_p2p_listing_by_id(trader_id)
     
     if not trader_listing:
         await callback.message.edit_text(translator.get_message(lang, 'trader_not_found'))
@@ -133,23 +105,23 @@ async def p2p_sell_handler(callback: CallbackQuery, state: FSMContext) -> None:
         return
 
     currency_to_sell = trader_listing['currency_pair'].split('_')[0]
-    amount_to_sell = min(user_data.get(currency_to_sell, 0), trader_listing['limit'])
+    amount_to_sell = min(getattr(user, currency_to_sell, 0), trader_listing['limit'])
     
-    if user_data.get(currency_to_sell, 0) < amount_to_sell:
+    if getattr(user, currency_to_sell, 0) < amount_to_sell:
         response_text = translator.get_message(lang, 'not_enough_balance')
         builder = InlineKeyboardBuilder()
         builder.button(text=translator.get_button(lang, 'back'), callback_data="back_to_main")
         
         # Используем путь к файлу, импортированный напрямую
-        photo = FSInputFile(PHOTO_PATH)
-        await callback.message.edit_media(
-            media=InputMediaPhoto(media=photo, caption=response_text, parse_mode="HTML"),
+        await media.edit_photo(
+            callback.message, PHOTO_PATH,
+            caption=response_text, parse_mode="HTML",
             reply_markup=builder.as_markup()
         )
         await callback.answer()
         return
 
-    db.update_balance(user_id, currency_to_sell, user_data[currency_to_sell] - amount_to_sell)
+    await db.update_balance(user_id, currency_to_sell, getattr(user, currency_to_sell) - amount_to_sell)
 
     response_text = translator.get_message(lang, 'funds_transfer_notice')
     
@@ -157,9 +129,9 @@ async def p2p_sell_handler(callback: CallbackQuery, state: FSMContext) -> None:
     builder.button(text=translator.get_button(lang, 'back_to_main'), callback_data="back_to_main")
     
     # Используем путь к файлу, импортированный напрямую
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=response_text, parse_mode="HTML"),
+    await media.edit_photo(
+        callback.message, PHOTO_PATH,
+        caption=response_text, parse_mode="HTML",
         reply_markup=builder.as_markup()
     )
     await callback.answer()
@@ -1,211 +1,134 @@
 import re
+from typing import Optional
 from aiogram import F, Router, html
-from aiogram.types import Message, CallbackQuery, InputMediaPhoto, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 
 from src.locales import translator
-from src.database import db
+from src.database import db, User
 from src.states import *
-from src.utils.formatters import format_ton_wallet, format_card_number
+from src.utils.formatters import format_ton_wallet, format_card_number, format_money
+from src.utils.money import parse_money
 from src.handlers.user_routers.user_main import command_start_handler
 
-from src.config import ADMIN_GROUPS, PHOTO_PATH
+from src.config import PHOTO_PATH
+from src.utils.media import media
+from src.utils.fanout import admin_fanout
+from src.screens import screens
 
 router = Router()
 
 # --- Мой профиль ---
 @router.callback_query(F.data == 'profile')
-async def profile_handler(callback: CallbackQuery) -> None:
-    
-    user_data = db.get_user_data(callback.from_user.id)
-
-    lang = user_data.get('language', 'ru')
-
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'add_wallet'), callback_data="add_change_wallet")
-    builder.button(text=translator.get_button(lang, 'top_up_wallet'), callback_data="top_up_wallet")
-    builder.button(text=translator.get_button(lang, 'ref_link'), callback_data="ref_link")
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="back_to_main")
-    builder.adjust(1)
-    
+async def profile_handler(callback: CallbackQuery, user: User, lang: str) -> None:
     # Получаем плейсхолдер 'не добавлен' для текущего языка
     not_added_text = translator.get_message(lang, 'not_added')
 
     # Форматируем адрес кошелька и номер карты с помощью новых функций
     formatted_ton_wallet = format_ton_wallet(
-        user_data.get('ton_wallet', not_added_text),
+        user.ton_wallet,
         placeholder=not_added_text
     )
     formatted_card_number = format_card_number(
-        user_data.get('card_number', not_added_text),
+        user.card_number,
         placeholder=not_added_text
     )
 
-    profile_text = translator.get_message(
-        lang, 
-        'profile_text',
-        balance=user_data.get('balance', '0'),
+    await screens.show(
+        callback, "profile", lang,
+        balance=format_money(user.balance),
         ton_wallet=formatted_ton_wallet,
         card_number=formatted_card_number,
-        deals_count=user_data.get('deals_count', 0)
-    )
-    
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=profile_text, parse_mode="HTML"),
-        reply_markup=builder.as_markup()
+        deals_count=user.deals_count
     )
     await callback.answer()
 
 
 # --- Добавление/изменение кошельков и карт ---
 @router.callback_query(F.data == 'add_change_wallet')
-async def add_wallet_card_handler(callback: CallbackQuery) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'add_ton_wallet'), callback_data="add_ton_wallet")
-    builder.button(text=translator.get_button(lang, 'add_card'), callback_data="add_card")
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="profile")
-    builder.adjust(1)
-    
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'select_add_type'), parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
+async def add_wallet_card_handler(callback: CallbackQuery, lang: str) -> None:
+    await screens.show(callback, "add_change_wallet", lang)
     await callback.answer()
 
 
 @router.callback_query(F.data == 'add_ton_wallet')
-async def add_ton_wallet_handler(callback: CallbackQuery, state: FSMContext) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    
-    # Создаем клавиатуру с кнопкой "Назад"
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="add_change_wallet")
-    builder.adjust(1)
-
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'add_ton_wallet'), parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
+async def add_ton_wallet_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
+    await screens.show(callback, "add_ton_wallet", lang)
     await state.set_state(WalletStates.waiting_for_wallet)
     await callback.answer()
 
 
 @router.message(WalletStates.waiting_for_wallet, F.text)
-async def process_ton_wallet(message: Message, state: FSMContext) -> None:
-    user_data = db.get_user_data(message.from_user.id)
-    lang = user_data.get('language', 'ru')
+async def process_ton_wallet(message: Message, state: FSMContext, user: User, lang: str) -> None:
     wallet_address = message.text
     
     if not re.match(r'^[a-zA-Z0-9_-]{48}$', wallet_address):
         await message.answer(translator.get_message(lang, 'wallet_validation_error'))
         return
     
-    db.update_ton_wallet(message.from_user.id, wallet_address)
+    await db.update_ton_wallet(message.from_user.id, wallet_address)
+    user.ton_wallet = wallet_address
     await state.clear()
     
-    photo = FSInputFile(PHOTO_PATH)
-    await message.bot.send_photo(
-        chat_id=message.chat.id,
-        photo=photo,
-        caption=translator.get_message(lang, 'wallet_added_success')
-    )
+    await screens.show(message, "wallet_added", lang)
     # The original call to command_start_handler did not pass the state, so it's been updated.
-    await command_start_handler(message, state)
+    await command_start_handler(message, state, user)
 
 
 @router.callback_query(F.data == 'add_card')
-async def add_card_handler(callback: CallbackQuery, state: FSMContext) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-
-    # Создаем клавиатуру с кнопкой "Назад"
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="add_change_wallet")
-    builder.adjust(1)
-
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'add_card'), parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
+async def add_card_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
+    await screens.show(callback, "add_card", lang)
     await state.set_state(CardStates.waiting_for_card)
     await callback.answer()
 
 
 @router.message(CardStates.waiting_for_card, F.text)
-async def process_card_number(message: Message, state: FSMContext) -> None:
-    user_data = db.get_user_data(message.from_user.id)
-    lang = user_data.get('language', 'ru')
+async def process_card_number(message: Message, state: FSMContext, user: User, lang: str) -> None:
     card_number = message.text.replace(' ', '')
     
     if not re.match(r'^\d{16}$', card_number):
         await message.answer(translator.get_message(lang, 'card_validation_error'))
         return
 
-    db.update_card_number(message.from_user.id, card_number)
+    await db.update_card_number(message.from_user.id, card_number)
+    user.card_number = card_number
     await state.clear()
     
-    photo = FSInputFile(PHOTO_PATH)
-    await message.bot.send_photo(
-        chat_id=message.chat.id,
-        photo=photo,
-        caption=translator.get_message(lang, 'card_added_success')
-    )
+    await screens.show(message, "card_added", lang)
     # The original call to command_start_handler did not pass the state, so it's been updated.
-    await command_start_handler(message, state)
+    await command_start_handler(message, state, user)
 
 # --- Логика пополнения кошелька ---
 @router.callback_query(F.data == 'top_up_wallet')
-async def top_up_wallet_handler(callback: CallbackQuery, state: FSMContext) -> None:
+async def top_up_wallet_handler(callback: CallbackQuery, state: FSMContext, user: User, lang: str) -> None:
     """
     Обработчик, который срабатывает при нажатии на 'Пополнить кошелек'.
     Сразу просит пользователя ввести сумму пополнения.
     """
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
 
-    if not user_data.get('ton_wallet'):
+    if not user.ton_wallet:
         builder = InlineKeyboardBuilder()
         builder.button(text=translator.get_button(lang, 'add_wallet'), callback_data="add_change_wallet")
         builder.adjust(1)
         await callback.answer(translator.get_message(lang, 'wallet_not_added_warning'), show_alert=True)
         return
     
-    # Создаем клавиатуру с кнопкой "Отмена"
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'cancel_top_up'), callback_data="cancel_top_up")
-    
-    text = translator.get_message(lang, 'top_up_enter_amount')
-    
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=text, parse_mode="HTML"), # ИСПРАВЛЕНИЕ: Используем HTML
-        reply_markup=builder.as_markup()
-    )
+    await screens.show(callback, "top_up_amount", lang)
     
     # Устанавливаем состояние, ожидающее ввода суммы
     await state.set_state(TopUpStates.waiting_for_amount)
     await callback.answer()
 
 @router.message(TopUpStates.waiting_for_amount, F.text)
-async def process_top_up_amount(message: Message, state: FSMContext) -> None:
+async def process_top_up_amount(message: Message, state: FSMContext, lang: str) -> None:
     """
     Обработчик для получения суммы пополнения.
     Проверяет введенную сумму и отправляет пользователю адрес для перевода.
     """
-    user_data = db.get_user_data(message.from_user.id)
-    lang = user_data.get('language', 'ru')
     
     try:
-        amount = float(message.text)
+        amount = parse_money(message.text)
         if amount <= 0:
             raise ValueError
     except ValueError:
@@ -213,8 +136,8 @@ async def process_top_up_amount(message: Message, state: FSMContext) -> None:
         await message.answer(text, parse_mode="HTML")
         return
     
-    # Сохраняем сумму в контекст состояния
-    await state.update_data(amount=amount)
+    # Сохраняем сумму в минимальных единицах в контекст состояния
+    await state.update_data(amount_minor=amount)
     
     # Адрес кошелька, на который нужно перевести средства
     ton_wallet_address = "UQDoDzbmTF6UO6x9dAoKn_KvbINKptV6kHrCMqv3G4csblFh"
@@ -232,13 +155,12 @@ async def process_top_up_amount(message: Message, state: FSMContext) -> None:
         'top_up_wallet_text', 
         # ИСПРАВЛЕНИЕ: Используем html.code() для корректного отображения адреса
         ton_wallet_address=html.code(ton_wallet_address), 
-        amount=amount
+        amount=format_money(amount)
     ).replace('<br>', '\n')
     
-    photo = FSInputFile(PHOTO_PATH)
-    await message.bot.send_photo(
+    await media.send_photo(
+        message.bot, PHOTO_PATH,
         chat_id=message.chat.id,
-        photo=photo,
         caption=text,
         reply_markup=builder.as_markup(),
         parse_mode="HTML" # ИСПРАВЛЕНИЕ: Используем HTML
@@ -255,7 +177,7 @@ async def confirm_transfer_handler(callback: CallbackQuery, state: FSMContext) -
     """
     lang = "ru"
     state_data = await state.get_data()
-    amount = state_data.get('amount')
+    amount = state_data.get('amount_minor')
 
     if amount is None:
         # Используем локализованное сообщение об ошибке
@@ -263,65 +185,89 @@ async def confirm_transfer_handler(callback: CallbackQuery, state: FSMContext) -
         await state.clear()
         return
 
-    # Создаем клавиатуру для администратора с локализованными кнопками
-    admin_builder = InlineKeyboardBuilder()
-    admin_builder.button(
-        text=translator.get_button(lang, "p2p_confirm"),
-        callback_data=f"admin_confirm_top_up:{callback.from_user.id}:{amount}"
-    )
-    admin_builder.button(
-        text=translator.get_button(lang, "p2p_decline"),
-        callback_data=f"admin_decline_top_up:{callback.from_user.id}:{amount}"
-    )
-    admin_builder.adjust(2)
-    
-    # Формируем текст заявки для администратора, используя локализацию
-    admin_text = translator.get_message(
-        lang,
-        "admin_new_top_up_request",
-        username=callback.from_user.username or 'N/A',
-        user_id=callback.from_user.id,
-        amount=amount,
+    # Сохраняем заявку. Ключ - сообщение, на котором нажато подтверждение:
+    # повторное нажатие или повтор апдейта не создаст вторую заявку
+    request_id, created = await db.create_top_up_request(
+        callback.from_user.id, amount,
+        idempotency_key=f"{callback.from_user.id}:{callback.message.message_id}",
         currency="TON"
     )
 
-    # Отправляем заявку в чат поддержки
-    for group in ADMIN_GROUPS:
-        await callback.bot.send_message(
-            chat_id=group,
-            text=admin_text,
-            reply_markup=admin_builder.as_markup()
+    if created:
+        # Создаем клавиатуру для администратора с локализованными кнопками
+        admin_builder = InlineKeyboardBuilder()
+        admin_builder.button(
+            text=translator.get_button(lang, "p2p_confirm"),
+            callback_data=f"admin_confirm_top_up:{request_id}"
         )
+        admin_builder.button(
+            text=translator.get_button(lang, "p2p_decline"),
+            callback_data=f"admin_decline_top_up:{request_id}"
+        )
+        admin_builder.adjust(2)
+        
+        # Формируем текст заявки для администратора, используя локализацию
+        admin_text = translator.get_message(
+            lang,
+            "admin_new_top_up_request",
+            username=callback.from_user.username or 'N/A',
+            user_id=callback.from_user.id,
+            amount=format_money(amount),
+            currency="TON"
+        )
+
+        # Отправляем заявку в чат поддержки
+        admin_fanout.send_message(callback.bot, text=admin_text, reply_markup=admin_builder.as_markup())
     
     # Отправляем подтверждение пользователю с локализованным текстом
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, "top_up_request_sent_to_admins")),
-        reply_markup=None
-    )
+    await screens.show(callback, "top_up_request_sent", lang)
     
     # Очищаем состояние пользователя
     await state.clear()
     await callback.answer()
 
 
+def top_up_request_id(callback: CallbackQuery) -> Optional[int]:
+    """
+    Возвращает ID заявки на пополнение из callback_data.
+    Кнопки, отправленные до появления таблицы заявок, содержат только user_id
+    и сумму: по ним не отличить копии одной заявки в разных группах от двух
+    заявок на одинаковую сумму. Для них возвращается None - такие заявки
+    администратор проверяет и зачисляет вручную.
+    """
+    parts = callback.data.split(':')
+    if len(parts) == 2:
+        return int(parts[1])
+    return None
+
+
+async def refuse_legacy_top_up(callback: CallbackQuery, lang: str) -> None:
+    """Отвечает на старую кнопку заявки просьбой обработать её вручную."""
+    _prefix, user_id, amount = callback.data.split(':')
+    await callback.answer(
+        translator.get_message(lang, 'admin_legacy_top_up_request', user_id=user_id, amount=amount),
+        show_alert=True
+    )
+
+
 @router.callback_query(F.data.startswith("admin_confirm_top_up"))
 async def admin_confirm_top_up(callback: CallbackQuery) -> None:
     """
     Обработчик для кнопки 'Подтвердить' в чате администратора.
-    Обновляет баланс пользователя и уведомляет обе стороны.
+    Подтверждает заявку и зачисляет сумму одной транзакцией, затем уведомляет обе стороны.
+    Повторное нажатие (в том числе в другой группе) получает ответ "уже обработано".
     """
-    # Разбираем callback_data для получения ID пользователя и суммы
-    _prefix, user_id_str, amount_str = callback.data.split(':')
-    user_id = int(user_id_str)
-    amount = float(amount_str)
     lang = "ru"
-
-    # Получаем данные пользователя и обновляем баланс
-    user_data = db.get_user_data(user_id)
-    current_balance = user_data.get('balance', 0)
-    new_balance = current_balance + amount
-    db.update_user_data(user_id, {'balance': new_balance})
+    request_id = top_up_request_id(callback)
+    if request_id is None:
+        await refuse_legacy_top_up(callback, lang)
+        return
+    decision = await db.decide_top_up(request_id, 'confirmed')
+    if decision is None:
+        await callback.answer(translator.get_message(lang, 'admin_request_already_processed'), show_alert=True)
+        return
+    user_id = decision.request['user_id']
+    amount = format_money(decision.request['amount'])
 
     # Уведомляем администратора, что заявка подтверждена, используя локализацию
     await callback.message.edit_text(
@@ -330,24 +276,17 @@ async def admin_confirm_top_up(callback: CallbackQuery) -> None:
             "admin_request_confirmed_top_up",
             user_id=user_id,
             amount=amount,
-            currency="TON"
+            currency=decision.request['currency']
         )
     )
     await callback.answer(translator.get_message(lang, "admin_request_confirmed_alert"))
 
     # Уведомляем пользователя о пополнении
-    user_text = translator.get_message(
-        lang,
-        "user_top_up_confirmed",
+    await screens.send(
+        callback.bot, user_id, "top_up_confirmed", lang,
         amount=amount,
-        currency="TON",
-        new_balance=new_balance
-    )
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.bot.send_photo(
-        chat_id=user_id,
-        photo=photo,
-        caption=user_text
+        currency=decision.request['currency'],
+        new_balance=format_money(decision.balance)
     )
 
 
@@ -357,11 +296,17 @@ async def admin_decline_top_up(callback: CallbackQuery) -> None:
     Обработчик для кнопки 'Отклонить' в чате администратора.
     Уведомляет пользователя об отказе.
     """
-    # Разбираем callback_data для получения ID пользователя и суммы
-    _prefix, user_id_str, amount_str = callback.data.split(':')
-    user_id = int(user_id_str)
-    amount = float(amount_str)
     lang = "ru"
+    request_id = top_up_request_id(callback)
+    if request_id is None:
+        await refuse_legacy_top_up(callback, lang)
+        return
+    decision = await db.decide_top_up(request_id, 'declined')
+    if decision is None:
+        await callback.answer(translator.get_message(lang, 'admin_request_already_processed'), show_alert=True)
+        return
+    user_id = decision.request['user_id']
+    amount = format_money(decision.request['amount'])
 
     # Уведомляем администратора об отказе, используя локализацию
     await callback.message.edit_text(
@@ -370,62 +315,35 @@ async def admin_decline_top_up(callback: CallbackQuery) -> None:
             "admin_request_declined_top_up",
             user_id=user_id,
             amount=amount,
-            currency="TON"
+            currency=decision.request['currency']
         )
     )
     await callback.answer(translator.get_message(lang, "admin_request_declined_alert"))
 
     # Уведомляем пользователя об отказе, используя локализацию
-    user_text = translator.get_message(
-        lang,
-        "user_top_up_declined",
+    await screens.send(
+        callback.bot, user_id, "top_up_declined", lang,
         amount=amount,
-        currency="TON"
-    )
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.bot.send_photo(
-        chat_id=user_id,
-        photo=photo,
-        caption=user_text
+        currency=decision.request['currency']
     )
 
 
 @router.callback_query(F.data == "cancel_top_up")
-async def cancel_top_up_handler(callback: CallbackQuery, state: FSMContext) -> None:
+async def cancel_top_up_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
     """
     Обработчик отмены пополнения на любом этапе.
     """
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back_to_main'), callback_data="back_to_main")
-    builder.adjust(1)
-    
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'top_up_canceled'), parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
+    await screens.show(callback, "top_up_canceled", lang)
     await state.clear()
     await callback.answer()
 
 
 # --- Обработчики, требующие привязанного кошелька ---
 @router.callback_query(F.data.in_({'ref_link'}))
-async def handle_wallet_required_action(callback: CallbackQuery, state: FSMContext) -> None:
-    user_data = db.get_user_data(callback.from_user.id)
-    lang = user_data.get('language', 'ru')
-
+async def handle_wallet_required_action(callback: CallbackQuery, state: FSMContext, user: User, lang: str) -> None:
     # Проверка наличия TON-кошелька
-    if not user_data.get('ton_wallet'):
-        builder = InlineKeyboardBuilder()
-        builder.button(text=translator.get_button(lang, 'add_wallet'), callback_data="add_change_wallet")
-        builder.adjust(1)
-        photo = FSInputFile(PHOTO_PATH)
-        await callback.message.edit_media(
-            media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'wallet_not_added_warning'), parse_mode="HTML"),
-            reply_markup=builder.as_markup()
-        )
+    if not user.ton_wallet:
+        await screens.show(callback, "wallet_required", lang)
         await callback.answer()
         return
 
@@ -434,13 +352,5 @@ async def handle_wallet_required_action(callback: CallbackQuery, state: FSMConte
     user_id = callback.from_user.id
     referral_link = f"https://t.me/{bot_username}?start=ref_{user_id}"
 
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="back_to_main")
-    builder.adjust(1)
-    
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=translator.get_message(lang, 'ref_link_text', referral_link=html.code(referral_link)), parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
+    await screens.show(callback, "ref_link", lang, referral_link=html.code(referral_link))
     await callback.answer()
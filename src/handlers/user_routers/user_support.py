@@ -1,171 +1,151 @@
+from typing import Any, Dict, List, Optional, Sequence, Union
+
 from aiogram import F, Router
-from aiogram.types import Message, CallbackQuery, FSInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
-import asyncio
 
 # Предполагается, что эти модули доступны
-from src.database import db
 from src.locales import translator
 from src.config import *
+from src.database import db
+from src.screens import screens
+from src.utils.fanout import admin_fanout
 from src.states import *
 
 router = Router()
 
+# Максимальная длина подписи к медиа в Telegram
+CAPTION_LIMIT = 1024
+
 @router.callback_query(F.data == 'support')
-async def support_handler(callback: CallbackQuery, state: FSMContext) -> None:
+async def support_handler(callback: CallbackQuery, state: FSMContext, lang: str) -> None:
     """
     Обработчик, который срабатывает при нажатии на кнопку 'Поддержка'.
     Инициирует диалог с пользователем для сбора информации.
     """
-    try:
-        user_data = db.get_user_data(callback.from_user.id)
-        lang = user_data.get('language', 'ru')
-    except NameError:
-        lang = 'ru'
     
     await state.set_state(SupportState.waiting_for_message)
     await state.set_data({}) # Очищаем данные FSM для нового диалога
 
-    builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button(lang, 'back'), callback_data="back_to_main")
-    builder.adjust(1)
-    
-    text = translator.get_message(
-        lang,
-        "support_instructions",
+    await screens.show(
+        callback, "support", lang,
         user_id=callback.from_user.id,
         username=callback.from_user.username
     )
-    
-    photo = FSInputFile(PHOTO_PATH)
-    await callback.message.edit_media(
-        media=InputMediaPhoto(media=photo, caption=text, parse_mode="HTML"),
-        reply_markup=builder.as_markup()
-    )
     await callback.answer()
 
-async def send_support_request(message: Message, state: FSMContext):
+async def send_support_request(message: Message, lang: str, text: str, message_ids: Sequence[int] = ()):
     """
     Отправляет заявку в поддержку. Отдельная функция для чистоты кода.
+    message_ids - сообщения пользователя с вложениями, которые копируются
+    в группы администраторов вслед за заголовком заявки.
     """
-    data = await state.get_data()
-    user_info = data.get('user_info')
-    media_group = data.get('media_group')
-    user_message_text = data.get('user_message_text', "")
+    user = message.from_user
     
     # Формируем текст заявки для операторов
     support_request_text = translator.get_message(
         'ru',
         "support_request_admin",
-        username=user_info['username'],
-        user_id=user_info['id'],
-        text=user_message_text
+        username=f"@{user.username}" if user.username else "No",
+        user_id=user.id,
+        text=text
     )
 
     # Создаем кнопку "Ответить"
     builder = InlineKeyboardBuilder()
-    builder.button(text=translator.get_button('ru', "reply_admin"), callback_data=f"reply_to_support:{user_info['id']}")
+    builder.button(text=translator.get_button('ru', "reply_admin"), callback_data=f"reply_to_support:{user.id}")
     builder.adjust(1)
-    
-    for group in ADMIN_GROUPS:
-        try:
-            # Отправляем заявку
-            if media_group:
-                # Отправляем сначала текст с кнопкой
-                await message.bot.send_message(
-                    chat_id=group,
-                    text=support_request_text,
-                    reply_markup=builder.as_markup()
-                )
-                # Затем отправляем медиагруппу (без текста)
-                await message.bot.send_media_group(
-                    chat_id=group,
-                    media=media_group,
-                )
-            elif data.get('single_photo_id'):
-                # Если одиночное фото, отправляем его с текстом и кнопкой
-                await message.bot.send_photo(
-                    chat_id=group,
-                    photo=data['single_photo_id'],
-                    caption=support_request_text,
-                    reply_markup=builder.as_markup()
-                )
-            else:
-                # Если только текст, отправляем сообщение
-                await message.bot.send_message(
+    reply_markup = builder.as_markup()
+
+    # Одиночное фото копируем сразу с текстом заявки в подписи
+    caption_on_copy = (
+        len(message_ids) == 1 and message.photo is not None
+        and len(support_request_text) <= CAPTION_LIMIT
+    )
+
+    async def forward_to_group(group: int):
+        if caption_on_copy:
+            copied = await message.bot.copy_message(
+                chat_id=group,
+                from_chat_id=message.chat.id,
+                message_id=message_ids[0],
+                caption=support_request_text,
+                reply_markup=reply_markup
+            )
+            group_message_ids = [copied.message_id]
+        else:
+            # Заголовок заявки с кнопкой, затем все вложения одним запросом
+            header = await message.bot.send_message(chat_id=group, text=support_request_text, reply_markup=reply_markup)
+            group_message_ids = [header.message_id]
+            if message_ids:
+                copied = await message.bot.copy_messages(
                     chat_id=group,
-                    text=support_request_text,
-                    reply_markup=builder.as_markup()
+                    from_chat_id=message.chat.id,
+                    message_ids=list(message_ids)
                 )
-        except Exception as e:
-            print(f"Failed to send support request to group {group}: {e}")
-            
-    # Отправляем подтверждение пользователю и сбрасываем состояние
-    try:
-        user_data = db.get_user_data(message.from_user.id)
-        lang = user_data.get('language', 'ru')
-    except NameError:
-        lang = 'ru'
-    
+                group_message_ids += [copy.message_id for copy in copied]
+        # Ответ администратора на любое из этих сообщений уйдет пользователю
+        await db.save_support_messages(group, group_message_ids, user.id)
+
+    # Рассылка идет в фоне, пользователь не ждет отправки во все группы
+    admin_fanout.broadcast(forward_to_group)
+
+    # Отправляем подтверждение пользователю
     await message.answer(translator.get_message(lang, "support_request_sent_user"))
-    await state.clear()
 
 
 @router.message(SupportState.waiting_for_message)
-async def process_support_message(message: Message, state: FSMContext) -> None:
+async def process_support_message(message: Message, state: FSMContext, lang: str,
+                                  album: Optional[List[Message]] = None) -> None:
     """
     Единый обработчик для всех типов сообщений в состоянии поддержки.
+    Альбом приходит целиком одним вызовом (см. AlbumMiddleware).
     """
-    # Сохраняем информацию о пользователе
-    await state.update_data(user_info={
-        'id': message.from_user.id,
-        'username': f"@{message.from_user.username}" if message.from_user.username else "No",
-    })
-    
-    data = await state.get_data()
-    # Отменяем предыдущую задачу, если она есть
-    if 'media_group_task' in data and data['media_group_task']:
-        data['media_group_task'].cancel()
-        
-    # Если это часть медиагруппы
-    if message.media_group_id:
-        current_media_group = data.get('media_group', [])
-        # Добавляем фото в медиагруппу
-        if message.photo:
-            current_media_group.append(InputMediaPhoto(media=message.photo[-1].file_id))
-        
-        # Обновляем данные в FSM
-        await state.update_data(
-            media_group=current_media_group,
-            user_message_text=message.caption or data.get('user_message_text', "")
-        )
-        
-        # Создаем новую задачу с таймером
-        new_task = asyncio.create_task(
-            asyncio.sleep(1.5) # Ждем 1.5 секунды
-        )
-        await state.update_data(media_group_task=new_task)
-        
-        try:
-            await new_task
-            await send_support_request(message, state)
-        except asyncio.CancelledError:
-            pass # Игнорируем отмененные задачи
-            
-    # Если это обычное сообщение (не часть медиагруппы)
+    if album:
+        # Текст заявки - первая подпись в альбоме
+        text = next((part.caption for part in album if part.caption), "")
+        await send_support_request(message, lang, text, [part.message_id for part in album])
+    elif message.text:
+        await send_support_request(message, lang, message.text)
     else:
-        # Сохраняем информацию о фото или тексте
-        if message.photo:
-            await state.update_data(
-                single_photo_id=message.photo[-1].file_id,
-                user_message_text=message.caption or ""
+        # Фото, документ, голосовое и т.п. - копируем само сообщение
+        await send_support_request(message, lang, message.caption or "", [message.message_id])
+
+    await state.clear()
+
+
+async def support_ticket_reply(message: Message) -> Union[bool, Dict[str, Any]]:
+    """
+    Фильтр: ответ в группе администраторов на заголовок заявки или
+    скопированное сообщение пользователя. Передает в хэндлер support_user_id.
+    """
+    reply = message.reply_to_message
+    if reply is None or message.chat.id not in ADMIN_GROUPS:
+        return False
+    user_id = await db.get_support_user(message.chat.id, reply.message_id)
+    if user_id is None:
+        return False
+    return {"support_user_id": user_id}
+
+
+@router.message(support_ticket_reply)
+async def reply_to_ticket_message(message: Message, support_user_id: int) -> None:
+    """
+    Ответ администратора на сообщение заявки пересылается ее автору.
+    """
+    try:
+        if message.text:
+            await message.bot.send_message(
+                chat_id=support_user_id,
+                text=translator.get_message('ru', "support_reply_to_user", text=message.text)
             )
         else:
-            await state.update_data(user_message_text=message.text)
-        
-        # Отправляем заявку немедленно
-        await send_support_request(message, state)
+            # Фото, документ и т.п. копируем пользователю как есть
+            await message.copy_to(chat_id=support_user_id)
+        await message.reply(translator.get_message('ru', "admin_reply_sent_success"))
+    except Exception as e:
+        await message.reply(translator.get_message('ru', "admin_reply_sent_error", error=e))
 
 
 # Обработчик для кнопки "Ответить" в административной группе
@@ -1,26 +1,211 @@
+import asyncio
 import json
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Any
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class Template:
+    """
+    Шаблон сообщения, разобранный один раз при загрузке локали.
+    Простые подстановки вида {name} компилируются в функцию с f-строкой:
+    рендер не разбирает строку заново и не ищет поля по формату.
+    Шаблоны с форматом или индексами ({amount:.2f}, {user.id})
+    форматируются обычным str.format.
+    """
+    __slots__ = ("source", "render")
+
+    def __init__(self, source: str):
+        self.source = source
+        literals = []
+        fields = []
+        literal = ""
+        simple = True
+        for text, field_name, format_spec, conversion in Formatter().parse(source):
+            literal += text
+            if field_name is None:
+                continue
+            if format_spec or conversion or not field_name.isidentifier():
+                simple = False
+            literals.append(literal)
+            fields.append(field_name)
+            literal = ""
+        literals.append(literal)
+
+        if not fields:
+            # Без подстановок: строка уже без экранирования {{ }}
+            self.render = lambda kwargs, text=literal: text
+        elif not simple:
+            self.render = lambda kwargs: source.format(**kwargs)
+        else:
+            self.render = self._compile(literals, fields)
+
+    @staticmethod
+    def _compile(literals, fields) -> Callable[[Dict[str, Any]], str]:
+        # Литералы попадают в функцию через замыкание, в код - только имена
+        # полей (проверены isidentifier), поэтому текст локали не исполняется
+        names = [f"_l{i}" for i in range(len(literals))]
+        body = "".join(f"{{{names[i]}}}{{kwargs[{name!r}]}}" for i, name in enumerate(fields))
+        code = f"lambda {', '.join(names)}: lambda kwargs: f\"{body}{{{names[-1]}}}\""
+        return eval(code, {"__builtins__": {}})(*literals)
+
+
+@dataclass(frozen=True)
+class LocaleBundle:
+    """Проверенная и скомпилированная локаль одного языка."""
+    lang: str
+    source: Dict[str, Any]
+    messages: Dict[str, Template]
+    buttons: Dict[str, str]
+    # Версия файла, из которого загружена локаль: (mtime_ns, size)
+    version: Tuple[int, int]
+
+
+def _file_version(file: Path) -> Tuple[int, int]:
+    stat = file.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_bundle(file: Path) -> LocaleBundle:
+    """
+    Читает, проверяет и компилирует файл локали.
+    Выбрасывает ValueError, если файл нельзя использовать.
+    """
+    version = _file_version(file)
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            source = json.load(f)
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"{file.name}: {e}") from e
+    if not isinstance(source, dict):
+        raise ValueError(f"{file.name}: root must be an object")
+    sections = {}
+    for section in ('messages', 'buttons'):
+        values = source.get(section, {})
+        if not isinstance(values, dict):
+            raise ValueError(f"{file.name}: '{section}' must be an object")
+        for key, text in values.items():
+            if not isinstance(text, str):
+                raise ValueError(f"{file.name}: {section}.{key} must be a string")
+        sections[section] = values
+    messages = {}
+    for key, text in sections['messages'].items():
+        try:
+            messages[key] = Template(text)
+        except ValueError as e:
+            # Незакрытые фигурные скобки и т.п.
+            raise ValueError(f"{file.name}: messages.{key}: {e}") from e
+    return LocaleBundle(file.stem, source, messages, dict(sections['buttons']), version)
+
 
 class Translator:
-    def __init__(self):
-        self.locales: Dict[str, Dict[str, Any]] = {}
+    """
+    Переводы из src/locales/*.json.
+    Все локали хранятся в одном словаре, который при перезагрузке заменяется
+    целиком одним присваиванием: рендер всегда видит согласованный набор.
+    watch() следит за файлами локалей и подхватывает изменения без
+    перезапуска бота; чтение и проверка идут в отдельном потоке, а файл
+    с ошибкой не применяется - остается предыдущая версия языка.
+    """
+    def __init__(self, locales_dir: Optional[Path] = None):
+        self.locales_dir = locales_dir or Path(__file__).parent
+        self._bundles: Dict[str, LocaleBundle] = {}
+        # Версии файлов, которые не прошли проверку (чтобы не повторять ошибку)
+        self._rejected: Dict[str, Tuple[int, int]] = {}
+        self._reload_callbacks: List[Callable[[], None]] = []
+        self._watch_task: Optional[asyncio.Task] = None
         self.load_locales()
+
+    @property
+    def locales(self) -> Dict[str, Dict[str, Any]]:
+        return {lang: bundle.source for lang, bundle in self._bundles.items()}
     
     def load_locales(self):
-        locales_dir = Path(__file__).parent
-        for file in locales_dir.glob("*.json"):
+        """Загружает все локали; ошибка в любом файле прерывает загрузку."""
+        bundles = {}
+        for file in self.locales_dir.glob("*.json"):
+            bundle = load_bundle(file)
+            bundles[bundle.lang] = bundle
+        self._swap(bundles)
+
+    # --- Перезагрузка ---
+
+    def on_reload(self, callback: Callable[[], None]):
+        """Регистрирует сброс кеша, построенного из переводов."""
+        self._reload_callbacks.append(callback)
+
+    def _swap(self, bundles: Dict[str, LocaleBundle]):
+        self._bundles = bundles
+        for callback in self._reload_callbacks:
+            callback()
+
+    def _load_changed(self) -> Dict[str, LocaleBundle]:
+        """Загружает изменившиеся файлы локалей (выполняется в потоке)."""
+        changed = {}
+        for file in self.locales_dir.glob("*.json"):
             lang = file.stem
-            with open(file, 'r', encoding='utf-8') as f:
-                self.locales[lang] = json.load(f)
-    
+            try:
+                version = _file_version(file)
+            except OSError:
+                continue
+            current = self._bundles.get(lang)
+            if (current is not None and current.version == version) or self._rejected.get(lang) == version:
+                continue
+            try:
+                changed[lang] = load_bundle(file)
+            except (OSError, ValueError) as e:
+                self._rejected[lang] = version
+                print(f"Locale {lang} was not reloaded, keeping the previous version: {e}")
+        return changed
+
+    def reload(self) -> List[str]:
+        """Применяет изменения файлов локалей и возвращает обновленные языки."""
+        return self._apply(self._load_changed())
+
+    def _apply(self, changed: Dict[str, LocaleBundle]) -> List[str]:
+        if not changed:
+            return []
+        for lang in changed:
+            self._rejected.pop(lang, None)
+        self._swap({**self._bundles, **changed})
+        print(f"Locales reloaded: {', '.join(sorted(changed))}")
+        return sorted(changed)
+
+    def watch(self, interval: float):
+        """Запускает фоновую проверку файлов локалей раз в interval секунд."""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Применяем в цикле событий: замена и сброс кешей не разделяются
+                self._apply(await asyncio.to_thread(self._load_changed))
+            except Exception as e:
+                print(f"Locale watcher error: {e}")
+
+    async def close(self):
+        """Останавливает слежение за файлами локалей."""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+    # --- Рендер ---
+
     def get_message(self, lang: str, key: str, **kwargs) -> str:
         """Получает сообщение с подстановкой переменных"""
-        message = self.locales.get(lang, {}).get('messages', {}).get(key, key)
-        return message.format(**kwargs)
+        bundle = self._bundles.get(lang)
+        template = bundle.messages.get(key) if bundle is not None else None
+        if template is None:
+            return key.format(**kwargs)
+        return template.render(kwargs)
     
     def get_button(self, lang: str, key: str) -> str:
         """Получает текст для кнопки"""
-        return self.locales.get(lang, {}).get('buttons', {}).get(key, key)
+        bundle = self._bundles.get(lang)
+        return bundle.buttons.get(key, key) if bundle is not None else key
 
 translator = Translator()
\ No newline at end of file
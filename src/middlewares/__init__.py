@@ -0,0 +1,5 @@
+from .user_context import DbUserMiddleware
+from .outbound import OutboundRateLimiter, rate_limiter, send_priority, PRIORITY_INTERACTIVE, PRIORITY_NOTIFICATION
+from .update_lanes import UpdateLaneMiddleware, update_scheduler
+from .album import AlbumMiddleware, album_collector
+from .render_cache import RenderCache, render_cache
@@ -0,0 +1,94 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject, Update
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class _Album:
+    """Части одного альбома, собранные до отправки в хэндлер."""
+    messages: List[Message] = field(default_factory=list)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    last_part_at: float = 0.0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class AlbumMiddleware(BaseMiddleware):
+    """
+    Внешний middleware апдейтов, который собирает части альбома
+    (сообщения с одним media_group_id) и передает дальше один апдейт.
+    Хэндлер получает первое сообщение как событие, а все части по порядку -
+    в аргументе album. Альбом считается собранным, когда latency секунд не
+    приходило новых частей или набралось max_parts частей (лимит Telegram - 10).
+    На каждый альбом заводится один таймер, который при новых частях
+    переносится, а не пересоздается.
+    Регистрируется раньше UpdateLaneMiddleware: апдейт первой части сразу
+    встает в очередь пользователя, а остальные части в нее не попадают.
+    После UpdateLaneMiddleware регистрируется wait_ready: уже в очереди
+    апдейт ждет, пока альбом соберется, поэтому следующие апдейты
+    пользователя обрабатываются после альбома, а не раньше него. Пока
+    альбом собирается, его апдейт занимает одно место в пуле обработчиков.
+    """
+    def __init__(self, latency: float = 1.0, max_parts: int = 10):
+        self.latency = latency
+        self.max_parts = max_parts
+        self._albums: Dict[str, _Album] = {}
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        message = event.message if isinstance(event, Update) else None
+        if message is None or message.media_group_id is None:
+            return await handler(event, data)
+
+        loop = asyncio.get_running_loop()
+        album = self._albums.get(message.media_group_id)
+        first = album is None
+        if first:
+            album = _Album()
+            self._albums[message.media_group_id] = album
+            album.timer = loop.call_later(self.latency, self._on_timer, message.media_group_id)
+        album.messages.append(message)
+        album.last_part_at = loop.time()
+
+        if len(album.messages) >= self.max_parts:
+            self._flush(message.media_group_id)
+        if first:
+            # Дальше по цепочке идет апдейт первой части со своими данными
+            data["album"] = album.messages
+            data["album_ready"] = album.ready
+            return await handler(event, data)
+
+    async def wait_ready(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        """Middleware для регистрации после UpdateLaneMiddleware: ждет сборки альбома."""
+        ready: Optional[asyncio.Event] = data.get("album_ready")
+        if ready is not None:
+            await ready.wait()
+        return await handler(event, data)
+
+    def _on_timer(self, media_group_id: str):
+        album = self._albums.get(media_group_id)
+        if album is None:
+            return
+        remaining = album.last_part_at + self.latency - asyncio.get_running_loop().time()
+        if remaining > 0:
+            album.timer = asyncio.get_running_loop().call_later(remaining, self._on_timer, media_group_id)
+            return
+        self._flush(media_group_id)
+
+    def _flush(self, media_group_id: str):
+        # Альбом удаляется из буфера - повторно он не будет передан
+        album = self._albums.pop(media_group_id)
+        album.timer.cancel()
+        album.messages.sort(key=lambda part: part.message_id)
+        album.ready.set()
+
+    async def close(self):
+        """Отправляет недособранные альбомы в очереди их пользователей."""
+        for media_group_id in list(self._albums):
+            self._flush(media_group_id)
+
+
+album_collector = AlbumMiddleware()
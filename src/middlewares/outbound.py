@@ -0,0 +1,246 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from src.config import RATE_LIMIT_GLOBAL, RATE_LIMIT_CHAT, RATE_LIMIT_GROUP
+
+# Приоритеты исходящих запросов: чем меньше число, тем раньше запрос получит токен
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NOTIFICATION = 10
+
+# Приоритет запросов текущего контекста. По умолчанию запросы считаются ответами
+# пользователю; фоновые рассылки выставляют PRIORITY_NOTIFICATION.
+send_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до появления токена (0 - токен есть)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class PriorityTokenBucket(TokenBucket):
+    """
+    Общее ведро токенов с очередью ожидающих.
+    Освободившийся токен получает ожидающий с наименьшим приоритетом,
+    при равных приоритетах - пришедший раньше.
+    """
+    def __init__(self, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, priority: int):
+        if not self._waiters and self.delay() == 0:
+            self.consume()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._timer is None:
+            self._dispatch()
+        await future
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # Ожидающий был отменен
+                heapq.heappop(self._waiters)
+                continue
+            delay = self.delay()
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            heapq.heappop(self._waiters)
+            self.consume()
+            future.set_result(None)
+
+
+class _ChatState:
+    """Очередь и лимиты одного чата."""
+    def __init__(self, chat_rate: float, chat_burst: float, group_rate: Optional[float], group_burst: float):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.parked_until = 0.0
+        self.buckets = [TokenBucket(chat_rate, chat_burst)]
+        if group_rate is not None:
+            self.buckets.append(TokenBucket(group_rate, group_burst))
+
+    def delay(self) -> float:
+        delays = [bucket.delay() for bucket in self.buckets]
+        delays.append(self.parked_until - time.monotonic())
+        return max(delays)
+
+    def consume(self):
+        for bucket in self.buckets:
+            bucket.consume()
+
+    @property
+    def idle(self) -> bool:
+        return (not self.pending and self.parked_until <= time.monotonic()
+                and all(bucket.full for bucket in self.buckets))
+
+
+@dataclass
+class LimiterStats:
+    """Метрики ограничителя: глубина очереди и время ожидания запросов."""
+    requests: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    retries: int = 0
+    total_wait: float = 0.0
+    last_wait: float = 0.0
+    max_wait: float = 0.0
+    queued_by_priority: Dict[int, int] = field(default_factory=dict)
+
+    def enter(self, priority: int):
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        self.queued_by_priority[priority] = self.queued_by_priority.get(priority, 0) + 1
+
+    def leave(self, priority: int):
+        self.queued -= 1
+        self.queued_by_priority[priority] -= 1
+
+    def record_wait(self, wait: float):
+        self.requests += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        self.max_wait = max(self.max_wait, wait)
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.requests if self.requests else 0.0
+
+
+def _is_group(chat_id: Union[int, str]) -> bool:
+    # У групп и каналов отрицательный id, каналы также адресуются через @username
+    return isinstance(chat_id, str) or chat_id < 0
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """
+    Middleware сессии бота, ограничивающий исходящие запросы к Telegram.
+    - общий лимит на все чаты (global_rate запросов в секунду);
+    - лимит на один чат (chat_rate в секунду);
+    - лимит на группу (group_rate_per_minute в минуту).
+    Запросы в один чат выполняются по очереди. На TelegramRetryAfter
+    приостанавливается только очередь этого чата, после паузы запрос
+    повторяется. Общие токены в первую очередь получают ответы
+    пользователям, затем уведомления (см. send_priority).
+    Запросы без chat_id (answer_callback_query, get_me и т.п.) не ограничиваются.
+    """
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0,
+                 group_rate_per_minute: float = 20.0, chat_burst: float = 3.0,
+                 group_burst: float = 3.0, max_retries: int = 3,
+                 max_retry_after: float = 60.0, max_chats: int = 10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_minute / 60
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.max_chats = max_chats
+        self.stats = LimiterStats()
+        self._global = PriorityTokenBucket(global_rate, global_rate)
+        self._chats: Dict[Union[int, str], _ChatState] = {}
+
+    @property
+    def parked_chats(self) -> int:
+        """Число чатов, очередь которых сейчас приостановлена из-за retry_after."""
+        now = time.monotonic()
+        return sum(1 for chat in self._chats.values() if chat.parked_until > now)
+
+    def _chat(self, chat_id: Union[int, str]) -> _ChatState:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= self.max_chats:
+                # Забываем чаты без очереди и с полными ведрами: их состояние
+                # ничем не отличается от нового
+                for key in [key for key, state in self._chats.items() if state.idle]:
+                    del self._chats[key]
+            group_rate = self.group_rate if _is_group(chat_id) else None
+            chat = _ChatState(self.chat_rate, self.chat_burst, group_rate, self.group_burst)
+            self._chats[chat_id] = chat
+        return chat
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority = send_priority.get()
+        chat = self._chat(chat_id)
+        chat.pending += 1
+        self.stats.enter(priority)
+        started = time.monotonic()
+        try:
+            async with chat.lock:
+                for attempt in range(self.max_retries + 1):
+                    delay = chat.delay()
+                    while delay > 0:
+                        await asyncio.sleep(delay)
+                        delay = chat.delay()
+                    chat.consume()
+                    await self._global.acquire(priority)
+                    if attempt == 0:
+                        self.stats.record_wait(time.monotonic() - started)
+                    try:
+                        return await make_request(bot, method)
+                    except TelegramRetryAfter as e:
+                        chat.parked_until = time.monotonic() + e.retry_after
+                        self.stats.retries += 1
+                        if attempt == self.max_retries or e.retry_after > self.max_retry_after:
+                            raise
+        finally:
+            chat.pending -= 1
+            self.stats.leave(priority)
+
+
+rate_limiter = OutboundRateLimiter(
+    global_rate=RATE_LIMIT_GLOBAL,
+    chat_rate=RATE_LIMIT_CHAT,
+    group_rate_per_minute=RATE_LIMIT_GROUP,
+)
@@ -0,0 +1,115 @@
+import hashlib
+from typing import Hashable, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import (
+    DeleteMessage, DeleteMessages, EditMessageCaption, EditMessageMedia,
+    EditMessageReplyMarkup, EditMessageText, Response, TelegramMethod
+)
+from aiogram.methods.base import TelegramType
+from aiogram.types import InputFile
+
+from src.config import EDIT_CACHE_SIZE
+from src.utils.lru_cache import TTLCache
+
+EDIT_METHODS = (EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, EditMessageText)
+# Поля, которые определяют сообщение, а не его содержимое
+ADDRESS_FIELDS = {"business_connection_id", "chat_id", "message_id", "inline_message_id"}
+
+
+def _message_key(method: TelegramMethod) -> Optional[Hashable]:
+    inline_message_id = getattr(method, "inline_message_id", None)
+    if inline_message_id is not None:
+        return "inline", inline_message_id
+    chat_id = getattr(method, "chat_id", None)
+    message_id = getattr(method, "message_id", None)
+    if chat_id is None or message_id is None:
+        return None
+    return chat_id, message_id
+
+
+def _uploads_file(method: TelegramMethod) -> bool:
+    # Хеш видит только объект InputFile (путь, адрес в памяти), а не содержимое файла
+    media = getattr(method, "media", None)
+    return any(isinstance(getattr(media, field, None), InputFile) for field in ("media", "thumbnail", "cover"))
+
+
+def _is_not_modified(error: TelegramBadRequest) -> bool:
+    return "message is not modified" in str(error).lower()
+
+
+class RenderCache(BaseRequestMiddleware):
+    """
+    Middleware сессии бота, пропускающий повторное редактирование сообщения
+    тем же содержимым (двойное нажатие "Назад", повтор кнопки меню).
+    Для каждого сообщения хранится хеш последнего отправленного
+    редактирования: метод, подпись/текст, медиа и клавиатура. Совпадающее
+    редактирование не отправляется в Telegram и сразу возвращает True.
+    Редактирование с загрузкой файла (InputFile) всегда отправляется
+    и сбрасывает запись сообщения.
+    Запись удаляется при удалении сообщения и при ошибке редактирования,
+    после которой содержимое сообщения неизвестно.
+    Кеш видит только запросы своего процесса, поэтому при нескольких
+    процессах (FSM_STORAGE=redis) по умолчанию отключен.
+    """
+    def __init__(self, maxsize: int = 10000, ttl: float = 24 * 3600):
+        self.enabled = maxsize > 0
+        self._renders: TTLCache[bytes] = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self.skipped = 0
+
+    @staticmethod
+    def fingerprint(method: TelegramMethod) -> bytes:
+        content = (type(method).__name__, method.model_dump(exclude=ADDRESS_FIELDS))
+        return hashlib.blake2b(repr(content).encode(), digest_size=16).digest()
+
+    def forget(self, key: Hashable):
+        self._renders.invalidate(key)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not self.enabled:
+            return await make_request(bot, method)
+
+        if isinstance(method, DeleteMessage):
+            self.forget((method.chat_id, method.message_id))
+            return await make_request(bot, method)
+        if isinstance(method, DeleteMessages):
+            for message_id in method.message_ids:
+                self.forget((method.chat_id, message_id))
+            return await make_request(bot, method)
+        if not isinstance(method, EDIT_METHODS):
+            return await make_request(bot, method)
+
+        key = _message_key(method)
+        if key is None:
+            return await make_request(bot, method)
+        if _uploads_file(method):
+            self.forget(key)
+            return await make_request(bot, method)
+        fingerprint = self.fingerprint(method)
+        if self._renders.get(key) == fingerprint:
+            self.skipped += 1
+            return True
+
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if not _is_not_modified(e):
+                self.forget(key)
+                raise
+            # Сообщение уже выглядит так (например, кеш пуст после перезапуска)
+            result = True
+        except Exception:
+            self.forget(key)
+            raise
+        self._renders.set(key, fingerprint)
+        return result
+
+
+render_cache = RenderCache(maxsize=EDIT_CACHE_SIZE)
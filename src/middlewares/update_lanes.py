@@ -0,0 +1,76 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, loggers
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseEventIsolation
+from aiogram.types import Chat, TelegramObject, Update, User as TelegramUser
+
+from src.config import UPDATE_CONCURRENCY, UPDATE_QUEUE_LIMIT
+from src.utils.lanes import LaneScheduler
+
+
+class UpdateLaneMiddleware(BaseMiddleware):
+    """
+    Внешний middleware апдейтов, который передает обработку в LaneScheduler.
+    Апдейты одного пользователя (или чата, если пользователя нет)
+    обрабатываются строго по порядку, апдейты разных пользователей - параллельно.
+    Middleware возвращает управление сразу после постановки в очередь, поэтому
+    диспетчер должен получать апдейты последовательно (handle_as_tasks=False):
+    тогда переполнение очередей замедляет получение новых апдейтов.
+    Должен быть зарегистрирован раньше middleware, читающих данные пользователя.
+    Если передан isolation, обработка апдейта дополнительно выполняется под
+    его блокировкой ключа FSM - это упорядочивает апдейты между процессами.
+    Обработка идет уже после выхода из ErrorsMiddleware диспетчера, поэтому
+    исключения передаются в обработчики dp.errors здесь же, а необработанные
+    логируются так же, как это делает диспетчер.
+    """
+    def __init__(self, scheduler: LaneScheduler, isolation: Optional[BaseEventIsolation] = None):
+        self.scheduler = scheduler
+        self.isolation = isolation
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user: Optional[TelegramUser] = data.get("event_from_user")
+        chat: Optional[Chat] = data.get("event_chat")
+        if from_user is not None:
+            key = ("user", from_user.id)
+        elif chat is not None:
+            key = ("chat", chat.id)
+        else:
+            # Апдейты без пользователя и чата (опросы и т.п.) упорядочивать не нужно
+            key = ("update", event.update_id if isinstance(event, Update) else id(event))
+
+        async def run(event: TelegramObject, data: Dict[str, Any]) -> Any:
+            # FSMContextMiddleware прочитал состояние до постановки в очередь;
+            # предыдущий апдейт пользователя мог его изменить, поэтому перечитываем
+            state: Optional[FSMContext] = data.get("state")
+            if state is None:
+                return await handler(event, data)
+            if self.isolation is None:
+                data["raw_state"] = await state.get_state()
+                return await handler(event, data)
+            async with self.isolation.lock(state.key):
+                data["raw_state"] = await state.get_state()
+                return await handler(event, data)
+
+        async def process():
+            dispatcher = data.get("dispatcher")
+            try:
+                if dispatcher is None:
+                    return await run(event, data)
+                return await ErrorsMiddleware(dispatcher)(run, event, data)
+            except Exception as e:
+                loggers.event.exception(
+                    "Cause exception while process update id=%d by bot id=%d\n%s: %s",
+                    getattr(event, "update_id", 0), data["bot"].id, e.__class__.__name__, e,
+                )
+
+        await self.scheduler.submit(key, process)
+
+
+update_scheduler = LaneScheduler(max_concurrency=UPDATE_CONCURRENCY, max_pending=UPDATE_QUEUE_LIMIT)
@@ -0,0 +1,28 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TelegramUser
+
+from src.database import db, User
+
+
+class DbUserMiddleware(BaseMiddleware):
+    """
+    Внешний middleware, который один раз за апдейт читает строку пользователя
+    и передает ее в хэндлеры:
+    - user: объект User или None, если пользователь не зарегистрирован;
+    - lang: язык пользователя ('ru' для незарегистрированных).
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user: Optional[TelegramUser] = data.get("event_from_user")
+        user: Optional[User] = None
+        if from_user is not None:
+            user = await db.get_user(from_user.id)
+        data["user"] = user
+        data["lang"] = user.language if user else 'ru'
+        return await handler(event, data)
@@ -0,0 +1,368 @@
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, List
+
+from src.utils.money import MONEY_SCALE
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Один шаг миграции схемы."""
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+    # Шаг пересоздает таблицы (12-шаговая процедура ALTER TABLE в SQLite):
+    # внешние ключи отключаются на время шага и проверяются перед фиксацией
+    rebuilds_tables: bool = False
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str, rebuilds_tables: bool = False):
+    """Регистрирует функцию как шаг миграции с указанным номером версии."""
+    def decorator(func: Callable[[sqlite3.Connection], None]):
+        MIGRATIONS.append(Migration(version, description, func, rebuilds_tables))
+        return func
+    return decorator
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Возвращает текущую версию схемы (0 для пустой базы)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at REAL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Применяет все недостающие миграции по порядку и возвращает итоговую версию.
+    Каждый шаг выполняется в своей транзакции BEGIN IMMEDIATE, поэтому
+    несколько процессов, запущенных одновременно, не применят шаг дважды,
+    а читатели в режиме WAL продолжают работать во время обновления.
+    Для шагов, пересоздающих таблицы, внешние ключи отключаются до начала
+    транзакции (внутри нее PRAGMA foreign_keys не действует), иначе DROP TABLE
+    выполнил бы каскадные удаления, а перенос строк со ссылками на удаленные
+    записи - прервал миграцию.
+    """
+    version = get_schema_version(conn)
+    for step in sorted(MIGRATIONS, key=lambda m: m.version):
+        if step.version <= version:
+            continue
+        foreign_keys = None
+        if step.rebuilds_tables:
+            foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+            conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Версию перечитываем под блокировкой: ее мог поднять другой процесс
+                if get_schema_version(conn) >= step.version:
+                    conn.execute("ROLLBACK")
+                    continue
+                step.apply(conn)
+                if step.rebuilds_tables:
+                    _report_foreign_key_violations(conn, step)
+                conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                             (step.version, step.description))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            if foreign_keys is not None:
+                conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+        version = step.version
+    return version
+
+
+def _report_foreign_key_violations(conn: sqlite3.Connection, step: Migration):
+    """
+    Выводит строки, ссылающиеся на несуществующие записи (PRAGMA foreign_key_check).
+    Такие строки были в базе и до шага, поэтому переносятся как есть.
+    """
+    for table, rowid, parent, _fk_id in conn.execute("PRAGMA foreign_key_check").fetchall():
+        print(f"Migration {step.version}: {table} row {rowid} references a missing row in {parent}")
+
+
+# --- Шаги миграции ---
+
+@migration(1, "Базовые таблицы пользователей, P2P, разрешений и сделок")
+def _create_base_tables(conn: sqlite3.Connection):
+    # IF NOT EXISTS: в рабочих базах эти таблицы уже созданы старым кодом
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            full_name TEXT,
+            ton_wallet TEXT,
+            card_number TEXT,
+            language TEXT DEFAULT 'ru',
+            balance REAL DEFAULT 0,
+            deals_count INTEGER DEFAULT 0,
+            ref_count INTEGER DEFAULT 0
+        )
+    """)
+    # Таблица для валютных пар
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS p2p_pairs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+    # Таблица для листингов (предложений)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS p2p_listings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pair_id INTEGER NOT NULL,
+            nickname TEXT NOT NULL,
+            price TEXT NOT NULL,
+            "limit" TEXT NOT NULL,
+            action TEXT NOT NULL,
+            FOREIGN KEY (pair_id) REFERENCES p2p_pairs (id) ON DELETE CASCADE
+        )
+    """)
+    # Таблица для разрешений на пополнение баланса
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS balance_permissions (
+            user_id INTEGER PRIMARY KEY,
+            end_time REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+    """)
+    # Таблица для хранения информации о P2P сделках
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS p2p_deals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER NOT NULL,
+            recipient_address TEXT NOT NULL,
+            recipient_type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            currency TEXT NOT NULL,
+            status TEXT DEFAULT 'pending', -- pending, confirmed, declined
+            created_at REAL DEFAULT (strftime('%s', 'now')),
+            FOREIGN KEY (sender_id) REFERENCES users (user_id)
+        )
+    """)
+
+
+@migration(2, "Индексы для поиска по кошельку/карте, сделок и листингов")
+def _add_hot_query_indexes(conn: sqlite3.Connection):
+    # find_user_by_wallet_or_card
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_ton_wallet ON users (ton_wallet)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_card_number ON users (card_number)")
+    # История сделок пользователя и выборка ожидающих заявок
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_p2p_deals_sender_created ON p2p_deals (sender_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_p2p_deals_status ON p2p_deals (status)")
+    # JOIN листингов с парами
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_p2p_listings_pair_id ON p2p_listings (pair_id)")
+
+
+@migration(3, "Таблица file_id загруженных в Telegram медиафайлов")
+def _create_media_files(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media_files (
+            content_hash TEXT PRIMARY KEY, -- sha256 содержимого файла
+            file_id TEXT NOT NULL,
+            updated_at REAL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+
+
+@migration(4, "Очередь исходящих уведомлений (outbox)")
+def _create_outbox(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            parse_mode TEXT,
+            status TEXT DEFAULT 'pending', -- pending, sent, failed
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT (strftime('%s', 'now')),
+            last_error TEXT,
+            created_at REAL DEFAULT (strftime('%s', 'now')),
+            sent_at REAL
+        )
+    """)
+    # Выборка уведомлений, которые пора отправить
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at)")
+
+
+@migration(5, "Связь сообщений заявок в группах администраторов с пользователями")
+def _create_support_messages(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS support_messages (
+            chat_id INTEGER NOT NULL, -- группа администраторов
+            message_id INTEGER NOT NULL, -- заголовок заявки или скопированное сообщение
+            user_id INTEGER NOT NULL, -- автор заявки
+            created_at REAL DEFAULT (strftime('%s', 'now')),
+            PRIMARY KEY (chat_id, message_id)
+        ) WITHOUT ROWID
+    """)
+
+
+@migration(6, "Заявки на пополнение баланса с ключами идемпотентности")
+def _create_top_up_requests(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS top_up_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE, -- повтор заявки с тем же ключом не создает новую
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            currency TEXT NOT NULL DEFAULT 'TON',
+            status TEXT DEFAULT 'pending', -- pending, confirmed, declined
+            created_at REAL DEFAULT (strftime('%s', 'now')),
+            decided_at REAL
+        )
+    """)
+
+
+@migration(7, "Журнал операций с балансом и контрольные точки сверки")
+def _create_balance_ledger(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS balance_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL, -- зачисление > 0, списание < 0
+            balance_after REAL NOT NULL, -- users.balance после операции
+            reason TEXT NOT NULL, -- opening, deal_debit, deal_refund, top_up, admin_set и т.д.
+            ref_id INTEGER, -- ID сделки или заявки на пополнение
+            created_at REAL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+    # История операций пользователя
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_balance_ledger_user ON balance_ledger (user_id, id)")
+    # Баланс каждого пользователя по журналу на момент последней сверки
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS balance_checkpoints (
+            user_id INTEGER PRIMARY KEY,
+            balance REAL NOT NULL,
+            ledger_id INTEGER NOT NULL, -- последняя учтенная запись журнала
+            checked_at REAL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+    # Запуски сверки: следующая начинается после ledger_id последней
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ledger_id INTEGER NOT NULL,
+            entries INTEGER NOT NULL,
+            mismatches INTEGER NOT NULL,
+            created_at REAL DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+    # Текущие балансы становятся начальными записями журнала
+    conn.execute("""
+        INSERT INTO balance_ledger (user_id, amount, balance_after, reason)
+        SELECT user_id, COALESCE(balance, 0), COALESCE(balance, 0), 'opening'
+        FROM users WHERE COALESCE(balance, 0) != 0
+    """)
+
+
+def _to_minor(column: str) -> str:
+    """SQL-выражение, переводящее старую REAL-сумму в минимальные единицы."""
+    return f"CAST(ROUND(COALESCE({column}, 0) * {MONEY_SCALE}) AS INTEGER)"
+
+
+def _rebuild_table(conn: sqlite3.Connection, table: str, schema: str, select: str):
+    """
+    Пересоздает таблицу с новой схемой: строки переносятся запросом select
+    из старой таблицы, которая затем удаляется. Индексы нужно создать заново.
+    Вызывается только из шагов с rebuilds_tables=True: при включенных
+    внешних ключах DROP TABLE удалил бы ссылающиеся строки других таблиц.
+    """
+    conn.execute(f"CREATE TABLE {table}_new ({schema})")
+    conn.execute(f"INSERT INTO {table}_new {select} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+@migration(8, "Денежные суммы в целых минимальных единицах (INTEGER вместо REAL)", rebuilds_tables=True)
+def _store_money_as_integers(conn: sqlite3.Connection):
+    _rebuild_table(conn, "users", """
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        ton_wallet TEXT,
+        card_number TEXT,
+        language TEXT DEFAULT 'ru',
+        balance INTEGER NOT NULL DEFAULT 0,
+        deals_count INTEGER DEFAULT 0,
+        ref_count INTEGER DEFAULT 0
+    """, f"""
+        SELECT user_id, username, full_name, ton_wallet, card_number, language,
+               {_to_minor('balance')}, deals_count, ref_count
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_ton_wallet ON users (ton_wallet)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_card_number ON users (card_number)")
+
+    _rebuild_table(conn, "p2p_deals", """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender_id INTEGER NOT NULL,
+        recipient_address TEXT NOT NULL,
+        recipient_type TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        currency TEXT NOT NULL,
+        status TEXT DEFAULT 'pending', -- pending, confirmed, declined
+        created_at REAL DEFAULT (strftime('%s', 'now')),
+        FOREIGN KEY (sender_id) REFERENCES users (user_id)
+    """, f"""
+        SELECT id, sender_id, recipient_address, recipient_type, {_to_minor('amount')},
+               currency, status, created_at
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_p2p_deals_sender_created ON p2p_deals (sender_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_p2p_deals_status ON p2p_deals (status)")
+
+    _rebuild_table(conn, "top_up_requests", """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'TON',
+        status TEXT DEFAULT 'pending', -- pending, confirmed, declined
+        created_at REAL DEFAULT (strftime('%s', 'now')),
+        decided_at REAL
+    """, f"""
+        SELECT id, idempotency_key, user_id, {_to_minor('amount')}, currency, status, created_at, decided_at
+    """)
+
+    _rebuild_table(conn, "balance_ledger", """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        balance_after INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        ref_id INTEGER,
+        created_at REAL DEFAULT (strftime('%s', 'now'))
+    """, f"""
+        SELECT id, user_id, {_to_minor('amount')}, {_to_minor('balance_after')}, reason, ref_id, created_at
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_balance_ledger_user ON balance_ledger (user_id, id)")
+
+    _rebuild_table(conn, "balance_checkpoints", """
+        user_id INTEGER PRIMARY KEY,
+        balance INTEGER NOT NULL,
+        ledger_id INTEGER NOT NULL,
+        checked_at REAL DEFAULT (strftime('%s', 'now'))
+    """, f"""
+        SELECT user_id, {_to_minor('balance')}, ledger_id, checked_at
+    """)
+    # Округленная сумма журнала может не совпасть с округленным балансом:
+    # следующая сверка начинается с точных балансов
+    conn.execute("""
+        INSERT OR REPLACE INTO balance_checkpoints (user_id, balance, ledger_id)
+        SELECT u.user_id, u.balance, COALESCE(MAX(l.id), 0)
+        FROM users u LEFT JOIN balance_ledger l ON l.user_id = u.user_id
+        GROUP BY u.user_id
+    """)
+    conn.execute("""
+        INSERT INTO ledger_checkpoints (ledger_id, entries, mismatches)
+        SELECT COALESCE(MAX(id), 0), 0, 0 FROM balance_ledger
+    """)
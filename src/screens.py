@@ -0,0 +1,87 @@
+from src.utils.screens import Button, Screen, screens
+
+# Список доступных языков, который легко расширять
+# Ключ - это код языка, значение - название языка
+AVAILABLE_LANGUAGES = {
+    'en': 'English',
+    'ru': 'Русский',
+    'cn': '中文',
+}
+
+BACK_TO_MAIN = Button("back_to_main", key='back')
+
+# --- Главное меню и регистрация ---
+screens.register(
+    Screen("main_menu", 'welcome', (
+        Button("profile", key='profile'),
+        Button("create_deal", key='create_deal'),
+        Button("p2p", key='p2p'),
+        Button("support", key='support'),
+        Button("about_us", key='about_us'),
+        Button("change_language", key='change_language'),
+    )),
+    Screen("register", 'first_message', (Button("register", key='start_registration'),)),
+    Screen("choose_language", 'choose_language', (
+        *(Button(f"set_lang:{code}", text=name) for code, name in AVAILABLE_LANGUAGES.items()),
+        BACK_TO_MAIN,
+    ), adjust=(2, 1)),
+)
+
+# --- О нас ---
+screens.register(
+    Screen("about_us", 'about_us_text', (
+        Button("guarantees_and_security", key='guarantees_and_security'),
+        Button("how_it_works", key='how_it_works'),
+        Button("service_rules", key='service_rules'),
+        BACK_TO_MAIN,
+    )),
+    Screen("guarantees_and_security", 'guarantees_and_security_text', (Button("about_us", key='back'),)),
+    Screen("how_it_works", 'how_it_works_text', (Button("about_us", key='back'),)),
+    Screen("service_rules", 'service_rules_text', (Button("about_us", key='back'),)),
+)
+
+# --- Профиль, кошельки и пополнение ---
+screens.register(
+    Screen("profile", 'profile_text', (
+        Button("add_change_wallet", key='add_wallet'),
+        Button("top_up_wallet", key='top_up_wallet'),
+        Button("ref_link", key='ref_link'),
+        BACK_TO_MAIN,
+    ), fields=('balance', 'ton_wallet', 'card_number', 'deals_count')),
+    Screen("add_change_wallet", 'select_add_type', (
+        Button("add_ton_wallet", key='add_ton_wallet'),
+        Button("add_card", key='add_card'),
+        Button("profile", key='back'),
+    )),
+    Screen("add_ton_wallet", 'add_ton_wallet', (Button("add_change_wallet", key='back'),)),
+    Screen("add_card", 'add_card', (Button("add_change_wallet", key='back'),)),
+    Screen("wallet_added", 'wallet_added_success'),
+    Screen("card_added", 'card_added_success'),
+    Screen("wallet_required", 'wallet_not_added_warning', (Button("add_change_wallet", key='add_wallet'),)),
+    Screen("ref_link", 'ref_link_text', (BACK_TO_MAIN,), fields=('referral_link',)),
+    Screen("top_up_amount", 'top_up_enter_amount', (Button("cancel_top_up", key='cancel_top_up'),)),
+    Screen("top_up_canceled", 'top_up_canceled', (Button("back_to_main", key='back_to_main'),)),
+    Screen("top_up_request_sent", 'top_up_request_sent_to_admins'),
+    Screen("top_up_confirmed", 'user_top_up_confirmed', fields=('amount', 'currency', 'new_balance')),
+    Screen("top_up_declined", 'user_top_up_declined', fields=('amount', 'currency')),
+)
+
+# --- Сделки ---
+screens.register(
+    Screen("deal_recipient_type", 'p2p_enter_recipient_type', (
+        Button("add_recipient_ton_wallet", key='add_ton_wallet'),
+        Button("add_recipient_card", key='add_card'),
+        BACK_TO_MAIN,
+    )),
+    Screen("deal_recipient_wallet", 'p2p_enter_recipient_wallet', (Button("create_deal", key='back'),)),
+    Screen("deal_recipient_card", 'p2p_enter_recipient_card', (Button("create_deal", key='back'),)),
+    Screen("deal_canceled", 'p2p_deal_canceled'),
+)
+
+# --- P2P и поддержка ---
+screens.register(
+    # Кнопки валютных пар передаются при показе (extra_buttons)
+    Screen("p2p_menu", 'p2p_description', (BACK_TO_MAIN,)),
+    Screen("p2p_not_enough_balance", 'not_enough_balance', (Button("back_to_main", key='back_to_main'),)),
+    Screen("support", 'support_instructions', (BACK_TO_MAIN,), fields=('user_id', 'username')),
+)
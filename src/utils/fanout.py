@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set
+
+from aiogram import Bot
+
+from src.config import ADMIN_GROUPS
+from src.middlewares.outbound import PRIORITY_NOTIFICATION, send_priority
+
+
+class ChatFanout:
+    """
+    Рассылка одного и того же сообщения в набор чатов.
+    Отправка в каждый чат идет отдельной фоновой задачей, поэтому хэндлер
+    не ждет рассылку, а ошибка в одном чате не мешает остальным.
+    Внутри одного чата отправки выполняются в порядке постановки.
+    Лимиты Telegram и повтор на TelegramRetryAfter обеспечивает
+    OutboundRateLimiter сессии бота; рассылки идут с приоритетом уведомлений.
+    """
+    def __init__(self, chat_ids: Iterable[int]):
+        self.chat_ids: List[int] = list(chat_ids)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def broadcast(self, send: Callable[[int], Awaitable[Any]]) -> List[asyncio.Task]:
+        """Запускает send(chat_id) для каждого чата и сразу возвращает управление."""
+        tasks = []
+        for chat_id in self.chat_ids:
+            task = asyncio.create_task(self._deliver(chat_id, send))
+            # Храним ссылку, чтобы задачу не собрал сборщик мусора
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            tasks.append(task)
+        return tasks
+
+    def send_message(self, bot: Bot, **kwargs) -> List[asyncio.Task]:
+        """Рассылает bot.send_message(chat_id=..., **kwargs) во все чаты."""
+        return self.broadcast(lambda chat_id: bot.send_message(chat_id=chat_id, **kwargs))
+
+    async def _deliver(self, chat_id: int, send: Callable[[int], Awaitable[Any]]):
+        # Задача выполняется в копии контекста, приоритет не влияет на хэндлер
+        send_priority.set(PRIORITY_NOTIFICATION)
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            try:
+                await send(chat_id)
+            except Exception as e:
+                print(f"Failed to send to chat {chat_id}: {e}")
+
+    async def wait_closed(self):
+        """Дожидается завершения всех начатых рассылок."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# Рассылка в группы администраторов
+admin_fanout = ChatFanout(ADMIN_GROUPS)
@@ -1,3 +1,5 @@
+from src.utils.money import MONEY_DECIMALS, MONEY_SCALE
+
 # --- Вспомогательные функции для форматирования ---
 def format_ton_wallet(wallet_address: str, placeholder: str) -> str:
     """
@@ -26,3 +28,14 @@ def format_card_number(card_number: str, placeholder: str) -> str:
     if len(card_number) >= 4:
         return f"**** **** **** {card_number[-4:]}"
     return card_number
+
+def format_money(minor: int) -> str:
+    """
+    Форматирует сумму в минимальных единицах без лишних нулей.
+    Например: 1500000000 -> 1.5, 2000000000 -> 2
+    """
+    whole, fraction = divmod(abs(minor), MONEY_SCALE)
+    sign = "-" if minor < 0 else ""
+    if not fraction:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{fraction:0{MONEY_DECIMALS}d}".rstrip("0")
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from src.utils.sqlite_pool import ConnectionPool, StorageProfile
+
+
+@dataclass(frozen=True)
+class _Record:
+    """Состояние и данные одного ключа FSM. Не изменяется, при записи заменяется новым."""
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+    # Данные не сериализуются в JSON: запись живет только в памяти
+    memory_only: bool = False
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+_EMPTY = _Record()
+
+
+def _create_schema(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+    """)
+    # Удаление состояний, к которым давно не обращались
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)")
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в отдельной базе SQLite.
+    - Горячий набор: последние использованные ключи (в том числе пустые)
+      держатся в памяти, чтение из них не обращается к базе.
+    - Запись идет в память сразу, а в базу - пачкой: изменения накапливаются
+      flush_interval секунд и фиксируются одной транзакцией, несколько
+      изменений одного ключа сливаются в одно.
+    - Состояния, которые не менялись дольше ttl, считаются пустыми и
+      периодически удаляются из базы.
+    - После перезапуска ключи подгружаются из базы при первом обращении.
+    """
+    def __init__(self, db_path: str = "fsm.db", ttl: float = 7 * 24 * 3600,
+                 hot_size: int = 10000, flush_interval: float = 0.05,
+                 sweep_interval: float = 600.0, profile: StorageProfile = StorageProfile(),
+                 key_builder: Optional[KeyBuilder] = None):
+        self.ttl = ttl
+        self.hot_size = hot_size
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._pool = ConnectionPool(db_path, size=2, profile=profile)
+        self._pool.run_sync(_create_schema)
+        self._hot: "OrderedDict[str, _Record]" = OrderedDict()
+        # Ключи, записанные в память, но еще не зафиксированные в базе
+        self._dirty: Dict[str, _Record] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    # --- Горячий набор ---
+
+    def _expired(self, record: _Record) -> bool:
+        return not record.empty and record.updated_at < time.time() - self.ttl
+
+    def _remember(self, key: str, record: _Record):
+        self._hot[key] = record
+        self._hot.move_to_end(key)
+        if len(self._hot) <= self.hot_size:
+            return
+        # Вытесняем самые старые записи, которые уже есть в базе
+        for old_key in list(self._hot):
+            if len(self._hot) <= self.hot_size:
+                break
+            if old_key not in self._dirty and not self._hot[old_key].memory_only:
+                del self._hot[old_key]
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, key: str) -> _Record:
+        row = conn.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return _EMPTY
+        return _Record(row["state"], json.loads(row["data"]), row["updated_at"])
+
+    async def _get(self, key: str) -> _Record:
+        record = self._hot.get(key)
+        if record is None:
+            record = await self._pool.run(self._load, key)
+            # Пока шло чтение, ключ мог быть записан - запись в памяти новее
+            if key in self._hot:
+                record = self._hot[key]
+            else:
+                self._remember(key, record)
+        else:
+            self._hot.move_to_end(key)
+        if self._expired(record):
+            self._put(key, _EMPTY)
+            return _EMPTY
+        return record
+
+    def _put(self, key: str, record: _Record):
+        self._remember(key, record)
+        self._dirty[key] = record
+        self._ensure_started()
+        self._wakeup.set()
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        skey = self.key_builder.build(key)
+        record = await self._get(skey)
+        state = state.state if isinstance(state, State) else state
+        self._put(skey, _Record(state, record.data, time.time(), record.memory_only))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(self.key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        skey = self.key_builder.build(key)
+        record = await self._get(skey)
+        self._put(skey, _Record(record.state, data.copy(), time.time()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(self.key_builder.build(key))).data.copy()
+
+    # --- Запись в базу ---
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = self._wakeup or asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        last_sweep = time.monotonic()
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.sweep_interval)
+                # Даем накопиться изменениям, чтобы записать их одной транзакцией
+                await asyncio.sleep(self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - last_sweep >= self.sweep_interval:
+                    last_sweep = time.monotonic()
+                    await self.sweep()
+            except Exception as e:
+                print(f"FSM storage flush error: {e}")
+
+    async def flush(self):
+        """Записывает в базу все изменения, накопленные в памяти."""
+        if not self._dirty:
+            return
+        batch = dict(self._dirty)
+        upserts: List[Tuple[str, Optional[str], str, float]] = []
+        deletes: List[Tuple[str]] = []
+        for key, record in batch.items():
+            if record.empty:
+                deletes.append((key,))
+                continue
+            try:
+                payload = json.dumps(record.data, ensure_ascii=False)
+            except (TypeError, ValueError) as e:
+                # Несериализуемые данные держим только в памяти, а старую
+                # запись удаляем, чтобы после перезапуска не продолжить сценарий
+                # с неполными данными
+                print(f"FSM data for {key} is kept in memory only: {e}")
+                self._hot[key] = _Record(record.state, record.data, record.updated_at, memory_only=True)
+                deletes.append((key,))
+                continue
+            upserts.append((key, record.state, payload, record.updated_at))
+
+        def write(conn: sqlite3.Connection):
+            conn.executemany("""
+                INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+            """, upserts)
+            conn.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+        await self._pool.run(write)
+
+        # Ключи, измененные во время записи, остаются в очереди
+        for key, record in batch.items():
+            if self._dirty.get(key) is record:
+                del self._dirty[key]
+
+    async def sweep(self):
+        """Удаляет состояния, которые не менялись дольше ttl."""
+        deadline = time.time() - self.ttl
+        for key in [key for key, record in self._hot.items()
+                    if key not in self._dirty and self._expired(record)]:
+            del self._hot[key]
+
+        def delete(conn: sqlite3.Connection):
+            conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (deadline,))
+        await self._pool.run(delete)
+
+    async def close(self) -> None:
+        """Записывает накопленные изменения и закрывает базу."""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        self._pool.close()
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Set, Tuple
+
+Job = Callable[[], Awaitable[Any]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LaneStats:
+    """Метрики планировщика: обработанные задачи, ожидание и глубина очередей."""
+    processed: int = 0
+    failed: int = 0
+    backpressure_waits: int = 0
+    max_pending: int = 0
+    max_lane_depth: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record(self, wait: float, ok: bool):
+        self.processed += 1
+        if not ok:
+            self.failed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.processed if self.processed else 0.0
+
+
+class LaneScheduler:
+    """
+    Планировщик задач по ключам (полосам).
+    Задачи с одним ключом выполняются строго по очереди, задачи с разными
+    ключами - параллельно, но одновременно выполняется не больше
+    max_concurrency задач. Если в очередях накопилось max_pending задач,
+    submit() ждет освобождения места, замедляя источник задач.
+    """
+    def __init__(self, max_concurrency: int = 64, max_pending: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.stats = LaneStats()
+        # ключ -> очередь (время постановки, задача); первая задача выполняется
+        self._lanes: Dict[Hashable, Deque[Tuple[float, Job]]] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._workers: Set[asyncio.Task] = set()
+        self._pending = 0
+        self._running = 0
+
+    @property
+    def pending(self) -> int:
+        """Задачи в очередях, включая выполняющиеся."""
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def active_lanes(self) -> int:
+        return len(self._lanes)
+
+    def lane_depths(self, top: int = 10) -> Dict[Hashable, int]:
+        """Самые длинные очереди: ключ -> число задач."""
+        deepest = sorted(self._lanes.items(), key=lambda item: len(item[1]), reverse=True)[:top]
+        return {key: len(lane) for key, lane in deepest}
+
+    async def submit(self, key: Hashable, job: Job):
+        """Ставит задачу в очередь ключа; ждет, только если очереди переполнены."""
+        if self._slots.locked():
+            self.stats.backpressure_waits += 1
+        await self._slots.acquire()
+        self._pending += 1
+        self.stats.max_pending = max(self.stats.max_pending, self._pending)
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            worker = asyncio.create_task(self._work(key, lane))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        lane.append((time.monotonic(), job))
+        self.stats.max_lane_depth = max(self.stats.max_lane_depth, len(lane))
+
+    async def _work(self, key: Hashable, lane: Deque[Tuple[float, Job]]):
+        try:
+            while lane:
+                # Задача остается в очереди до завершения, чтобы новые
+                # задачи этого ключа вставали за ней, а не запускали второй обработчик
+                queued_at, job = lane[0]
+                async with self._semaphore:
+                    wait = time.monotonic() - queued_at
+                    self._running += 1
+                    ok = True
+                    try:
+                        await job()
+                    except Exception:
+                        ok = False
+                        logger.exception("Lane %s job failed", key)
+                    finally:
+                        self._running -= 1
+                self.stats.record(wait, ok)
+                lane.popleft()
+                self._pending -= 1
+                self._slots.release()
+        finally:
+            # Между проверкой пустой очереди и удалением нет await,
+            # поэтому новая задача не может потеряться
+            del self._lanes[key]
+
+    async def wait_closed(self):
+        """Дожидается выполнения всех поставленных задач."""
+        while self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
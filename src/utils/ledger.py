@@ -0,0 +1,49 @@
+import asyncio
+from typing import Optional
+
+from src.database import db, LedgerCheckpoint, UserDatabase
+
+
+class LedgerAuditor:
+    """
+    Периодическая сверка балансов с журналом balance_ledger.
+    Каждый запуск просматривает только записи после предыдущей контрольной
+    точки (см. UserDatabase.checkpoint_ledger) и выводит найденные расхождения.
+    """
+    def __init__(self, database: UserDatabase):
+        self._db = database
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, interval: float):
+        """Запускает фоновую сверку раз в interval секунд."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                print(f"Ledger checkpoint error: {e}")
+
+    async def checkpoint(self) -> LedgerCheckpoint:
+        """Сохраняет контрольную точку и сообщает о расхождениях."""
+        result = await self._db.checkpoint_ledger()
+        for user_id, (expected, actual) in result.mismatches.items():
+            print(f"Ledger mismatch for user {user_id}: ledger {expected}, users.balance {actual}")
+        return result
+
+    async def close(self):
+        """Останавливает фоновую сверку и сохраняет последнюю точку."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.checkpoint()
+
+
+ledger_auditor = LedgerAuditor(db)
@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+# Маркер отсутствия значения в кеше (None тоже может быть закешированным значением)
+MISSING = object()
+
+
+class TTLCache(Generic[V]):
+    """
+    Ограниченный по размеру LRU-кеш с временем жизни записей.
+    Чтобы медленное чтение не положило в кеш устаревшее значение после
+    инвалидации, запись выполняется только с токеном, полученным до чтения:
+    любая инвалидация делает ранее выданные токены недействительными.
+    """
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._epoch = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Возвращает значение или MISSING, если записи нет или она устарела."""
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def token(self) -> int:
+        """Токен, который нужно получить перед чтением из источника."""
+        return self._epoch
+
+    def set(self, key: Hashable, value: V, token: Optional[int] = None):
+        """Кладет значение в кеш, если с момента выдачи token не было инвалидаций."""
+        if token is not None and token != self._epoch:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Удаляет запись и отменяет незавершенные заполнения кеша."""
+        self._epoch += 1
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._epoch += 1
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
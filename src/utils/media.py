@@ -0,0 +1,98 @@
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto, Message
+
+from src.database import db, UserDatabase
+
+
+def _is_bad_file_id(error: TelegramBadRequest) -> bool:
+    """Проверяет, что Telegram отклонил именно file_id (удален, чужой бот и т.п.)."""
+    text = str(error).lower()
+    return "file" in text and ("identifier" in text or "reference" in text or "file_id" in text)
+
+
+class MediaRegistry:
+    """
+    Реестр загруженных в Telegram файлов.
+    Каждый файл загружается один раз, полученный file_id сохраняется в БД
+    по хешу содержимого и затем переиспользуется всеми хэндлерами.
+    Если Telegram перестает принимать file_id, файл загружается заново.
+    """
+    def __init__(self, database: UserDatabase):
+        self._db = database
+        # path -> (mtime_ns, size, sha256)
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        # sha256 -> file_id (None - в БД записи нет)
+        self._file_ids: Dict[str, Optional[str]] = {}
+
+    def digest(self, path: str) -> str:
+        """Возвращает sha256 содержимого файла, пересчитывая его только при изменении файла."""
+        stat = os.stat(path)
+        cached = self._digests.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    async def get_file_id(self, path: str) -> Optional[str]:
+        digest = self.digest(path)
+        if digest not in self._file_ids:
+            self._file_ids[digest] = await self._db.get_media_file_id(digest)
+        return self._file_ids[digest]
+
+    async def remember(self, path: str, file_id: str):
+        digest = self.digest(path)
+        if self._file_ids.get(digest) != file_id:
+            self._file_ids[digest] = file_id
+            await self._db.save_media_file_id(digest, file_id)
+
+    async def forget(self, path: str):
+        digest = self.digest(path)
+        self._file_ids[digest] = None
+        await self._db.delete_media_file_id(digest)
+
+    async def deliver(self, path: str, send: Callable[[Union[str, FSInputFile]], Awaitable[Any]]) -> Any:
+        """
+        Вызывает send() с сохраненным file_id, а если его нет или он устарел -
+        с загрузкой файла, после чего запоминает file_id из ответа Telegram.
+        """
+        file_id = await self.get_file_id(path)
+        if file_id:
+            try:
+                return await send(file_id)
+            except TelegramBadRequest as e:
+                if not _is_bad_file_id(e):
+                    raise
+                await self.forget(path)
+
+        result = await send(FSInputFile(path))
+        if isinstance(result, Message) and result.photo:
+            await self.remember(path, result.photo[-1].file_id)
+        return result
+
+    async def answer_photo(self, message: Message, path: str, **kwargs) -> Message:
+        """Аналог message.answer_photo() с переиспользованием file_id."""
+        return await self.deliver(path, lambda photo: message.answer_photo(photo=photo, **kwargs))
+
+    async def send_photo(self, bot: Bot, path: str, **kwargs) -> Message:
+        """Аналог bot.send_photo() с переиспользованием file_id."""
+        return await self.deliver(path, lambda photo: bot.send_photo(photo=photo, **kwargs))
+
+    async def edit_photo(self, message: Message, path: str, reply_markup=None, **kwargs) -> Union[Message, bool]:
+        """
+        Аналог message.edit_media(InputMediaPhoto(...)) с переиспользованием file_id.
+        Остальные аргументы (caption, parse_mode) передаются в InputMediaPhoto.
+        """
+        return await self.deliver(path, lambda photo: message.edit_media(
+            media=InputMediaPhoto(media=photo, **kwargs),
+            reply_markup=reply_markup,
+        ))
+
+
+media = MediaRegistry(db)
@@ -0,0 +1,38 @@
+from decimal import Decimal, InvalidOperation
+from typing import Union
+
+# Суммы хранятся целым числом минимальных единиц: 1 единица = 10^-9 (как nanoTON).
+# Баланс, суммы сделок и заявок, журнал баланса - везде INTEGER, поэтому
+# SQLite складывает и сравнивает их точно.
+MONEY_DECIMALS = 9
+MONEY_SCALE = 10 ** MONEY_DECIMALS
+# Предел INTEGER в SQLite (int64)
+MAX_MINOR = 2 ** 63 - 1
+
+
+def parse_money(text: Union[str, int, Decimal]) -> int:
+    """
+    Переводит сумму из записи пользователя ("1.5", "100") в минимальные единицы.
+    ValueError - не число, бесконечность, больше MONEY_DECIMALS знаков
+    после запятой или сумма вне диапазона INTEGER.
+    """
+    try:
+        value = Decimal(text.strip() if isinstance(text, str) else text)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {text!r}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {text!r}")
+    minor = value.scaleb(MONEY_DECIMALS)
+    if minor != minor.to_integral_value():
+        raise ValueError(f"Amount has more than {MONEY_DECIMALS} decimal places: {text!r}")
+    if abs(minor) > MAX_MINOR:
+        raise ValueError(f"Amount is out of range: {text!r}")
+    return int(minor)
+
+
+
+def check_minor(amount: int) -> int:
+    """Проверяет, что сумма передана целым числом минимальных единиц, а не float."""
+    if isinstance(amount, bool) or not isinstance(amount, int):
+        raise TypeError(f"Amount must be an int in minor units, got {amount!r}")
+    return amount
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from src.database import db, UserDatabase
+from src.middlewares.outbound import PRIORITY_NOTIFICATION, send_priority
+
+
+class OutboxDispatcher:
+    """
+    Фоновая отправка уведомлений из таблицы outbox.
+    Уведомления записываются в БД вместе с изменением, которое их вызвало,
+    поэтому переживают перезапуск бота. Диспетчер забирает их пачками,
+    отправляет и отмечает результат; при временной ошибке попытка
+    повторяется с экспоненциальной задержкой. Если Telegram отклонил
+    сообщение окончательно (бот заблокирован, неверный текст), оно
+    помечается как failed.
+    Доставка "хотя бы один раз", а не "ровно один раз": если процесс упал
+    между отправкой и отметкой sent, отправка заняла дольше lease или
+    Telegram доставил сообщение, но ответ не дошел, уведомление будет
+    отправлено повторно и пользователь может получить его дважды.
+    """
+    def __init__(self, database: UserDatabase, batch_size: int = 50,
+                 poll_interval: float = 5.0, lease: float = 60.0,
+                 max_attempts: int = 8, base_delay: float = 2.0, max_delay: float = 600.0):
+        self._db = database
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._bot: Optional[Bot] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self, bot: Bot):
+        """Запускает фоновую задачу отправки."""
+        self._bot = bot
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Сообщает, что в outbox появились новые уведомления."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        send_priority.set(PRIORITY_NOTIFICATION)
+        while not self._stopping:
+            try:
+                count = await self.dispatch_once()
+            except Exception as e:
+                print(f"Outbox dispatch error: {e}")
+                count = 0
+            if count >= self.batch_size and not self._stopping:
+                # Пачка заполнена целиком - скорее всего, есть еще
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """Отправляет одну пачку уведомлений и возвращает ее размер."""
+        messages = await self._db.claim_outbox(self.batch_size, self.lease)
+        await asyncio.gather(*(self._send(message) for message in messages))
+        return len(messages)
+
+    async def _send(self, message: Dict):
+        kwargs = {}
+        if message['parse_mode']:
+            kwargs['parse_mode'] = message['parse_mode']
+        try:
+            # Без parse_mode используется режим бота по умолчанию
+            await self._bot.send_message(chat_id=message['chat_id'], text=message['text'], **kwargs)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            print(f"Outbox message {message['id']} to {message['chat_id']} rejected: {e}")
+            await self._db.mark_outbox_failed(message['id'], str(e))
+            return
+        except Exception as e:
+            attempts = message['attempts'] + 1
+            if attempts >= self.max_attempts:
+                print(f"Outbox message {message['id']} to {message['chat_id']} dropped: {e}")
+                await self._db.mark_outbox_failed(message['id'], str(e))
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                await self._db.mark_outbox_retry(message['id'], time.time() + delay, str(e))
+            return
+        await self._db.mark_outbox_sent(message['id'])
+
+    async def close(self):
+        """
+        Останавливает фоновую задачу после текущей пачки, чтобы отправленные
+        уведомления успели отметиться; неотправленное остается в outbox.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self.wake()
+            await self._task
+            self._task = None
+
+
+outbox = OutboxDispatcher(db)
@@ -0,0 +1,86 @@
+import json
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from redis.asyncio import Redis
+
+
+class RedisFSMStorage(BaseStorage):
+    """
+    Хранилище FSM в Redis (или совместимом по протоколу сервере) для запуска
+    бота в нескольких процессах.
+    Состояние хранится строкой, данные - хешем, где каждое поле сериализовано
+    в JSON. Связанные команды отправляются одним конвейером (pipeline):
+    смена состояния продлевает и время жизни данных, а update_data
+    записывает поля и читает результат за один запрос к серверу.
+    Ключи включают ID бота: один сервер Redis могут делить несколько ботов.
+    """
+    def __init__(self, redis: Redis, ttl: Optional[int] = None, key_builder: Optional[KeyBuilder] = None):
+        self.redis = redis
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisFSMStorage":
+        return cls(Redis.from_url(url), **kwargs)
+
+    def _expire(self, pipe, *keys: str):
+        if self.ttl:
+            for key in keys:
+                pipe.expire(key, self.ttl)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state_key = self.key_builder.build(key, "state")
+        data_key = self.key_builder.build(key, "data")
+        state = state.state if isinstance(state, State) else state
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if state is None:
+                pipe.delete(state_key)
+            else:
+                pipe.set(state_key, state, ex=self.ttl)
+            self._expire(pipe, data_key)
+            await pipe.execute()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        value = await self.redis.get(self.key_builder.build(key, "state"))
+        return value.decode() if isinstance(value, bytes) else value
+
+    @staticmethod
+    def _encode(data: Mapping[str, Any]) -> Dict[str, str]:
+        return {field: json.dumps(value, ensure_ascii=False) for field, value in data.items()}
+
+    @staticmethod
+    def _decode(raw: Mapping[Any, Any]) -> Dict[str, Any]:
+        return {
+            (field.decode() if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in raw.items()
+        }
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        data_key = self.key_builder.build(key, "data")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(data_key)
+            if data:
+                pipe.hset(data_key, mapping=self._encode(data))
+                self._expire(pipe, data_key)
+            await pipe.execute()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._decode(await self.redis.hgetall(self.key_builder.build(key, "data")))
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        if not data:
+            return await self.get_data(key)
+        data_key = self.key_builder.build(key, "data")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(data_key, mapping=self._encode(data))
+            self._expire(pipe, data_key)
+            pipe.hgetall(data_key)
+            results = await pipe.execute()
+        return self._decode(results[-1])
+
+    async def close(self) -> None:
+        await self.redis.aclose()
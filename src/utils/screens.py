@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from aiogram import Bot
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.config import PHOTO_PATH
+from src.locales import Translator, translator
+from src.utils.media import MediaRegistry, media
+
+
+@dataclass(frozen=True)
+class Button:
+    """Кнопка экрана: текст берется из локали по key или задается как есть в text."""
+    callback_data: str
+    key: Optional[str] = None
+    text: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Screen:
+    """
+    Описание экрана "фото + подпись + клавиатура".
+    caption - ключ сообщения в локали, fields - подстановки, которые
+    передаются при показе; экран без fields рендерится один раз на язык.
+    """
+    name: str
+    caption: str
+    buttons: Tuple[Button, ...] = ()
+    adjust: Tuple[int, ...] = (1,)
+    fields: Tuple[str, ...] = ()
+    # None - режим разметки бота по умолчанию
+    parse_mode: Optional[str] = None
+    photo: str = PHOTO_PATH
+
+
+class ScreenRegistry:
+    """
+    Реестр экранов бота.
+    Статические части (подписи без подстановок, кнопки и клавиатуры)
+    собираются один раз на пару (экран, язык) и сбрасываются при
+    перезагрузке переводов. show() - единый путь показа: для нажатия
+    кнопки сообщение редактируется, для сообщения пользователя
+    отправляется новое.
+    """
+    def __init__(self, translator: Translator, media: MediaRegistry):
+        self._translator = translator
+        self._media = media
+        self._screens: Dict[str, Screen] = {}
+        self._captions: Dict[Tuple[str, str], str] = {}
+        self._buttons: Dict[Tuple[str, str], Tuple[InlineKeyboardButton, ...]] = {}
+        self._keyboards: Dict[Tuple[str, str], Optional[InlineKeyboardMarkup]] = {}
+        translator.on_reload(self.clear_cache)
+
+    def register(self, *screens: Screen):
+        for screen in screens:
+            if screen.name in self._screens:
+                raise ValueError(f"Screen {screen.name} is already registered")
+            self._screens[screen.name] = screen
+
+    def clear_cache(self):
+        self._captions.clear()
+        self._buttons.clear()
+        self._keyboards.clear()
+
+    def __getitem__(self, name: str) -> Screen:
+        return self._screens[name]
+
+    # --- Рендер ---
+
+    def caption(self, name: str, lang: str, **fields: Any) -> str:
+        screen = self._screens[name]
+        if screen.fields:
+            return self._translator.get_message(lang, screen.caption, **fields)
+        caption = self._captions.get((name, lang))
+        if caption is None:
+            caption = self._captions[(name, lang)] = self._translator.get_message(lang, screen.caption)
+        return caption
+
+    def _static_buttons(self, name: str, lang: str) -> Tuple[InlineKeyboardButton, ...]:
+        buttons = self._buttons.get((name, lang))
+        if buttons is None:
+            buttons = self._buttons[(name, lang)] = tuple(
+                InlineKeyboardButton(
+                    text=button.text if button.key is None else self._translator.get_button(lang, button.key),
+                    callback_data=button.callback_data
+                )
+                for button in self._screens[name].buttons
+            )
+        return buttons
+
+    def _build_keyboard(self, name: str, lang: str,
+                        extra_buttons: Sequence[InlineKeyboardButton]) -> Optional[InlineKeyboardMarkup]:
+        buttons = (*extra_buttons, *self._static_buttons(name, lang))
+        if not buttons:
+            return None
+        builder = InlineKeyboardBuilder()
+        builder.add(*buttons)
+        builder.adjust(*self._screens[name].adjust)
+        return builder.as_markup()
+
+    def keyboard(self, name: str, lang: str,
+                 extra_buttons: Sequence[InlineKeyboardButton] = ()) -> Optional[InlineKeyboardMarkup]:
+        """
+        Клавиатура экрана. extra_buttons (например, список из БД) ставятся
+        перед кнопками экрана; без них клавиатура берется из кеша.
+        Готовую разметку нельзя изменять на месте.
+        """
+        if extra_buttons:
+            return self._build_keyboard(name, lang, extra_buttons)
+        key = (name, lang)
+        if key not in self._keyboards:
+            self._keyboards[key] = self._build_keyboard(name, lang, ())
+        return self._keyboards[key]
+
+    def _render(self, name: str, lang: str, extra_buttons: Sequence[InlineKeyboardButton],
+                fields: Dict[str, Any]) -> Dict[str, Any]:
+        screen = self._screens[name]
+        kwargs = {
+            'caption': self.caption(name, lang, **fields),
+            'reply_markup': self.keyboard(name, lang, extra_buttons),
+        }
+        if screen.parse_mode is not None:
+            kwargs['parse_mode'] = screen.parse_mode
+        return kwargs
+
+    # --- Показ ---
+
+    async def show(self, target: Union[Message, CallbackQuery], name: str, lang: str,
+                   extra_buttons: Sequence[InlineKeyboardButton] = (), **fields: Any) -> Union[Message, bool]:
+        """
+        Показывает экран: по нажатию кнопки редактирует сообщение с ней,
+        в ответ на сообщение пользователя отправляет новое.
+        Ответ на callback (callback.answer) остается за хэндлером.
+        """
+        kwargs = self._render(name, lang, extra_buttons, fields)
+        photo = self._screens[name].photo
+        if isinstance(target, CallbackQuery):
+            return await self._media.edit_photo(target.message, photo, **kwargs)
+        return await self._media.answer_photo(target, photo, **kwargs)
+
+    async def send(self, bot: Bot, chat_id: int, name: str, lang: str,
+                   extra_buttons: Sequence[InlineKeyboardButton] = (), **fields: Any) -> Message:
+        """Отправляет экран в произвольный чат (уведомления пользователю)."""
+        kwargs = self._render(name, lang, extra_buttons, fields)
+        return await self._media.send_photo(bot, self._screens[name].photo, chat_id=chat_id, **kwargs)
+
+
+screens = ScreenRegistry(translator, media)
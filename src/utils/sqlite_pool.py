@@ -0,0 +1,99 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """
+    Набор PRAGMA, который применяется к каждому соединению с базой.
+    cache_size в отрицательном виде задается в КиБ, mmap_size - в байтах.
+    """
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -16000
+    mmap_size: int = 128 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    foreign_keys: bool = True
+
+    def apply(self, conn: sqlite3.Connection):
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if self.foreign_keys else 'OFF'}")
+
+
+# Готовые профили. Выбираются через SQLITE_PROFILE в окружении.
+STORAGE_PROFILES: Dict[str, StorageProfile] = {
+    # Настройки SQLite по умолчанию: журнал отката и fsync на каждый коммит
+    "legacy": StorageProfile(journal_mode="DELETE", synchronous="FULL", cache_size=-2000,
+                             mmap_size=0, temp_store="DEFAULT", foreign_keys=False),
+    # WAL с полной синхронизацией: коммит переживает отключение питания
+    "durable": StorageProfile(synchronous="FULL"),
+    # WAL с synchronous=NORMAL: коммит переживает падение процесса, fsync только при checkpoint
+    "wal": StorageProfile(),
+    # Большой кеш и mmap для машин с запасом памяти
+    "wal_large": StorageProfile(cache_size=-64000, mmap_size=512 * 1024 * 1024),
+}
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений SQLite.
+    Каждый поток исполнителя держит собственное соединение, поэтому запросы
+    не блокируют цикл событий aiogram и не платят за connect() на каждый вызов.
+    """
+    def __init__(self, db_path: str, size: int = 4, profile: StorageProfile = StorageProfile()):
+        self.db_path = db_path
+        self.profile = profile
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """Открывает новое соединение с базой данных."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self.profile.apply(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        """Возвращает соединение текущего потока, создавая его при первом обращении."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+        return conn
+
+    def _call(self, func: Callable[..., T], args: tuple) -> T:
+        conn = self._connection()
+        # Контекстный менеджер соединения делает commit, а при ошибке - rollback
+        with conn:
+            return func(conn, *args)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Выполняет func(conn, *args) в потоке пула и возвращает результат."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args)
+
+    def run_sync(self, func: Callable[..., T], *args: Any) -> T:
+        """Синхронный вариант run() для кода, который выполняется вне цикла событий."""
+        return self._executor.submit(self._call, func, args).result()
+
+    def close(self):
+        """Останавливает исполнитель и закрывает все соединения."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
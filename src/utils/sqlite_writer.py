@@ -0,0 +1,154 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Маркер остановки писателя в очереди
+_STOP = object()
+
+
+@dataclass
+class WriterStats:
+    """Метрики группового коммита: размеры пачек и время фиксации."""
+    batches: int = 0
+    operations: int = 0
+    last_batch_size: int = 0
+    max_batch_size: int = 0
+    total_commit_time: float = 0.0
+    last_commit_time: float = 0.0
+    max_commit_time: float = 0.0
+
+    def record(self, batch_size: int, commit_time: float):
+        self.batches += 1
+        self.operations += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.total_commit_time += commit_time
+        self.last_commit_time = commit_time
+        self.max_commit_time = max(self.max_commit_time, commit_time)
+
+    @property
+    def avg_batch_size(self) -> float:
+        return self.operations / self.batches if self.batches else 0.0
+
+    @property
+    def avg_commit_time(self) -> float:
+        return self.total_commit_time / self.batches if self.batches else 0.0
+
+
+class SQLiteWriter:
+    """
+    Единственный писатель в базу данных.
+    Изменения попадают в очередь, а фоновая задача собирает их в пачки
+    и фиксирует одной транзакцией. Каждая операция выполняется в своей
+    точке сохранения, поэтому ошибка одной не откатывает остальные.
+    Вызывающий получает результат только после COMMIT.
+    """
+    def __init__(self, connect: Callable[[], sqlite3.Connection],
+                 max_batch: int = 64, max_delay: float = 0.005):
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = WriterStats()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, func: Callable[..., T], *args: Any) -> T:
+        """Ставит func(conn, *args) в очередь и ждет фиксации транзакции."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, future))
+        return await future
+
+    async def _collect(self) -> Tuple[List[tuple], bool]:
+        """
+        Собирает пачку: первая операция плюс все, что придет за окно max_delay.
+        Второе значение сообщает, что в очереди встретился маркер остановки.
+        """
+        loop = asyncio.get_running_loop()
+        batch: List[tuple] = []
+        item = await self._queue.get()
+        deadline = loop.time() + self.max_delay
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch, False
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                return batch, False
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return batch, False
+        return batch, True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if not batch:
+                continue
+            results = await loop.run_in_executor(self._executor, self._commit_batch, batch)
+            for (_func, _args, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = self._connect()
+            # Транзакциями управляем сами
+            self._conn.isolation_level = None
+        return self._conn
+
+    def _commit_batch(self, batch: List[tuple]) -> List[Tuple[bool, Any]]:
+        conn = self._connection()
+        results: List[Tuple[bool, Any]] = []
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, _future in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    results.append((True, func(conn, *args)))
+                    conn.execute("RELEASE op")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((False, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return [(False, e)] * len(batch)
+        self.stats.record(len(batch), time.perf_counter() - started)
+        return results
+
+    async def close(self):
+        """Дожидается записи оставшихся операций и останавливает писателя."""
+        if self._task is not None and not self._task.done():
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+        self._executor.shutdown(wait=True)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
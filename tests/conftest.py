@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# src.config читает эти переменные при импорте
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("ADMINS_LIST", "0")
+os.environ.setdefault("ADMIN_GROUPS", "0")
+
+# src.database и src.config создают users.db и fsm.db в текущем каталоге при импорте
+os.chdir(tempfile.mkdtemp(prefix="tg_wallet_tests_"))
+
+
+@pytest.fixture
+def run_db(tmp_path):
+    """Выполняет async-сценарий с чистой UserDatabase во временном каталоге."""
+    def run(scenario):
+        async def main():
+            from src.database import UserDatabase
+            database = UserDatabase(str(tmp_path / "users.db"))
+            try:
+                return await scenario(database)
+            finally:
+                await database.close()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from src.database import OutboxMessage
+from src.utils.money import MONEY_SCALE
+
+TON = MONEY_SCALE
+
+
+async def make_user(db, user_id: int, balance: int = 0, card_number: str = None):
+    await db.register_new_user(user_id, f"user{user_id}", f"User {user_id}")
+    if balance:
+        await db.update_user_balance(user_id, balance)
+    if card_number:
+        await db.update_card_number(user_id, card_number)
+
+
+def test_concurrent_debits_cannot_overdraw(run_db):
+    async def scenario(db):
+        await make_user(db, 1, balance=10 * TON)
+        debits = await asyncio.gather(*(
+            db.create_deal_with_debit(1, "addr", "card", 7 * TON, "TON") for _ in range(2)
+        ))
+        assert sorted(debit.ok for debit in debits) == [False, True]
+        # Отказ ничего не меняет и возвращает текущий баланс
+        assert [debit.balance for debit in debits] == [3 * TON, 3 * TON]
+        assert await db.get_user_balance(1) == 3 * TON
+        assert len(await db._fetchall("SELECT * FROM p2p_deals")) == 1
+        assert [entry['reason'] for entry in await db.get_ledger_entries(1)] == ['deal_debit', 'adjustment']
+
+        with pytest.raises(ValueError):
+            await db.create_deal_with_debit(1, "addr", "card", 0, "TON")
+    run_db(scenario)
+
+
+def test_deal_is_decided_once(run_db):
+    async def scenario(db):
+        await make_user(db, 1, balance=10 * TON)
+        await make_user(db, 2, card_number="2200")
+        deal_id = (await db.create_deal_with_debit(1, "2200", "card", 4 * TON, "TON")).deal_id
+
+        def notify(decision):
+            return [OutboxMessage(decision.deal['sender_id'], decision.deal['status'])]
+
+        # Двойное нажатие и одновременное решение в другой группе администраторов
+        decisions = await asyncio.gather(
+            db.decide_deal(deal_id, 'confirmed', notify),
+            db.decide_deal(deal_id, 'confirmed', notify),
+            db.decide_deal(deal_id, 'declined', notify),
+        )
+        won = [decision for decision in decisions if decision is not None]
+        assert len(won) == 1
+        status = won[0].deal['status']
+        assert (await db.get_deal_by_id(deal_id))['status'] == status
+
+        if status == 'confirmed':
+            assert (await db.get_user_balance(1), await db.get_user_balance(2)) == (6 * TON, 4 * TON)
+        else:
+            assert (await db.get_user_balance(1), await db.get_user_balance(2)) == (10 * TON, 0)
+        assert [row['text'] for row in await db._fetchall("SELECT * FROM outbox")] == [status]
+
+        assert await db.decide_deal(deal_id, 'declined') is None
+        assert await db.decide_deal(deal_id + 1, 'confirmed') is None
+    run_db(scenario)
+
+
+def test_top_up_is_decided_once(run_db):
+    async def scenario(db):
+        await make_user(db, 1)
+        request_id, _created = await db.create_top_up_request(1, 5 * TON, "key")
+        decisions = await asyncio.gather(
+            db.decide_top_up(request_id, 'confirmed'),
+            db.decide_top_up(request_id, 'confirmed'),
+        )
+        won = [decision for decision in decisions if decision is not None]
+        assert [decision.balance for decision in won] == [5 * TON]
+        assert await db.decide_top_up(request_id, 'declined') is None
+        assert await db.get_user_balance(1) == 5 * TON
+    run_db(scenario)
+
+
+def test_repeated_top_up_key_credits_once(run_db):
+    async def scenario(db):
+        await make_user(db, 1)
+        # Повторная отправка той же заявки (двойное нажатие, повтор апдейта)
+        first, second = await asyncio.gather(
+            db.create_top_up_request(1, 5 * TON, "user1:msg10"),
+            db.create_top_up_request(1, 5 * TON, "user1:msg10"),
+        )
+        assert first[0] == second[0]
+        assert sorted([first[1], second[1]]) == [False, True]
+        request_id = first[0]
+        assert await db.create_top_up_request(1, 5 * TON, "user1:msg10") == (request_id, False)
+
+        assert (await db.decide_top_up(request_id, 'confirmed')).balance == 5 * TON
+        # После решения тот же ключ не создает новую заявку
+        assert await db.create_top_up_request(1, 5 * TON, "user1:msg10") == (request_id, False)
+        assert await db.decide_top_up(request_id, 'confirmed') is None
+        assert await db.get_user_balance(1) == 5 * TON
+
+        # Другая заявка на ту же сумму - отдельная
+        other_id, created = await db.create_top_up_request(1, 5 * TON, "user1:msg11")
+        assert created and other_id != request_id
+        assert (await db.decide_top_up(other_id, 'confirmed')).balance == 10 * TON
+    run_db(scenario)
+
+
+def test_ledger_matches_checkpoint(run_db):
+    async def ledger_sums(db):
+        rows = await db._fetchall("SELECT user_id, SUM(amount) AS total FROM balance_ledger GROUP BY user_id")
+        return {row['user_id']: row['total'] for row in rows}
+
+    async def scenario(db):
+        await make_user(db, 1, balance=10 * TON)
+        await make_user(db, 2, card_number="2200")
+        deal_id = (await db.create_deal_with_debit(1, "2200", "card", 3 * TON, "TON")).deal_id
+        await db.decide_deal(deal_id, 'confirmed')
+        request_id, _created = await db.create_top_up_request(2, TON // 2, "key")
+        await db.decide_top_up(request_id, 'confirmed')
+        await db.update_user_data(1, {'balance': 8 * TON})
+
+        checkpoint = await db.checkpoint_ledger()
+        assert checkpoint.mismatches == {}
+        assert checkpoint.entries == 5
+        balances = {1: await db.get_user_balance(1), 2: await db.get_user_balance(2)}
+        assert balances == {1: 8 * TON, 2: 3 * TON + TON // 2}
+        assert await ledger_sums(db) == balances
+        rows = await db._fetchall("SELECT user_id, balance FROM balance_checkpoints")
+        assert {row['user_id']: row['balance'] for row in rows} == balances
+
+        # Без новых записей сверка ничего не просматривает
+        assert (await db.checkpoint_ledger()).entries == 0
+
+        # Изменение баланса в обход журнала находится при следующей операции
+        await db._execute("UPDATE users SET balance = balance + 1 WHERE user_id = 1")
+        await db.update_user_balance(1, TON)
+        checkpoint = await db.checkpoint_ledger()
+        assert checkpoint.entries == 1
+        assert checkpoint.mismatches == {1: (9 * TON, 9 * TON + 1)}
+    run_db(scenario)
@@ -0,0 +1,108 @@
+import sqlite3
+
+from src.migrations import MIGRATIONS, get_schema_version, migrate
+from src.utils.money import MONEY_SCALE
+from src.utils.sqlite_pool import STORAGE_PROFILES
+
+# Схема, которую создавал UserDatabase до появления миграций
+BASELINE_SCHEMA = """
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        ton_wallet TEXT,
+        card_number TEXT,
+        language TEXT DEFAULT 'ru',
+        balance REAL DEFAULT 0,
+        deals_count INTEGER DEFAULT 0,
+        ref_count INTEGER DEFAULT 0
+    );
+    CREATE TABLE balance_permissions (
+        user_id INTEGER PRIMARY KEY,
+        end_time REAL NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+    );
+    CREATE TABLE p2p_deals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender_id INTEGER NOT NULL,
+        recipient_address TEXT NOT NULL,
+        recipient_type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        currency TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        created_at REAL DEFAULT (strftime('%s', 'now')),
+        FOREIGN KEY (sender_id) REFERENCES users (user_id)
+    );
+"""
+
+
+def connect(path) -> sqlite3.Connection:
+    """Соединение как в ConnectionPool: профиль wal включает внешние ключи."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    STORAGE_PROFILES["wal"].apply(conn)
+    return conn
+
+
+def create_baseline(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO users (user_id, balance) VALUES (1, 0.1), (2, 2.5)")
+    conn.execute("INSERT INTO balance_permissions (user_id, end_time) VALUES (1, 1e12)")
+    conn.execute("""
+        INSERT INTO p2p_deals (sender_id, recipient_address, recipient_type, amount, currency)
+        VALUES (1, 'a', 'card', 0.2, 'RUB'), (404, 'b', 'card', 1.5, 'TON')
+    """)
+    # Строка со ссылкой на удаленного пользователя (записана без проверки ключей)
+    conn.execute("INSERT INTO balance_permissions (user_id, end_time) VALUES (405, 1e12)")
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_baseline_with_orphan_rows(tmp_path, capsys):
+    path = tmp_path / "users.db"
+    create_baseline(path)
+    conn = connect(path)
+
+    assert migrate(conn) == max(step.version for step in MIGRATIONS)
+
+    # Строки-сироты перенесены и перечислены в выводе
+    deals = conn.execute("SELECT sender_id, amount FROM p2p_deals ORDER BY id").fetchall()
+    assert [tuple(row) for row in deals] == [(1, MONEY_SCALE // 5), (404, 3 * MONEY_SCALE // 2)]
+    output = capsys.readouterr().out
+    assert "p2p_deals row 2 references a missing row in users" in output
+    assert "balance_permissions row 405 references a missing row in users" in output
+
+    # Пересоздание users не удалило каскадом разрешения
+    permissions = conn.execute("SELECT user_id FROM balance_permissions ORDER BY user_id").fetchall()
+    assert [row[0] for row in permissions] == [1, 405]
+
+    # Внешние ключи снова включены после шага
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
+def test_users_balance_is_integer(tmp_path):
+    path = tmp_path / "users.db"
+    create_baseline(path)
+    conn = connect(path)
+    migrate(conn)
+
+    columns = {row['name']: row['type'] for row in conn.execute("PRAGMA table_info(users)")}
+    assert columns['balance'] == 'INTEGER'
+    assert 'balance_real' not in columns
+    balances = conn.execute("SELECT balance, typeof(balance) FROM users ORDER BY user_id").fetchall()
+    assert [tuple(row) for row in balances] == [(MONEY_SCALE // 10, 'integer'), (5 * MONEY_SCALE // 2, 'integer')]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'users'")}
+    assert {'idx_users_ton_wallet', 'idx_users_card_number'} <= indexes
+
+
+def test_fresh_database(tmp_path):
+    conn = connect(tmp_path / "users.db")
+    version = migrate(conn)
+
+    assert get_schema_version(conn) == version
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+    assert 'balance_real' not in columns
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    # Повторный запуск ничего не делает
+    assert migrate(conn) == version
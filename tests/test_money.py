@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+import pytest
+
+from src.utils.formatters import format_money
+from src.utils.money import MAX_MINOR, MONEY_SCALE, check_minor, parse_money
+
+
+@pytest.mark.parametrize("text, minor", [
+    ("1", MONEY_SCALE),
+    ("1.5", 3 * MONEY_SCALE // 2),
+    (" 0.1 ", MONEY_SCALE // 10),
+    ("0.000000001", 1),
+    ("-2.25", -9 * MONEY_SCALE // 4),
+    ("1e3", 1000 * MONEY_SCALE),
+    ("1.500000000", 3 * MONEY_SCALE // 2),
+    (Decimal("0.3"), 3 * MONEY_SCALE // 10),
+    (7, 7 * MONEY_SCALE),
+])
+def test_parse_money(text, minor):
+    assert parse_money(text) == minor
+
+
+def test_parse_money_is_exact():
+    # В float 0.1 + 0.2 != 0.3
+    assert parse_money("0.1") + parse_money("0.2") == parse_money("0.3")
+
+
+@pytest.mark.parametrize("text", [
+    "", "abc", "1,5", "nan", "inf", "-inf",
+    # Больше 9 знаков после запятой не округляется, а отклоняется
+    "0.0000000001", "1.0000000005",
+    # Вне диапазона INTEGER SQLite
+    "1e30", str(MAX_MINOR // MONEY_SCALE + 1),
+])
+def test_parse_money_rejects(text):
+    with pytest.raises(ValueError):
+        parse_money(text)
+
+
+@pytest.mark.parametrize("minor, text", [
+    (0, "0"), (MONEY_SCALE, "1"), (3 * MONEY_SCALE // 2, "1.5"), (1, "0.000000001"), (-MONEY_SCALE // 4, "-0.25"),
+])
+def test_format_money(minor, text):
+    assert format_money(minor) == text
+    assert parse_money(text) == minor
+
+
+@pytest.mark.parametrize("value", [1.0, 1.7, "1", True, None, Decimal(1)])
+def test_check_minor_rejects_non_int(value):
+    with pytest.raises(TypeError):
+        check_minor(value)
+
+
+def test_balance_entry_points_reject_floats(run_db):
+    async def scenario(db):
+        await db.register_new_user(1, "u", "U")
+        for call in (
+            lambda: db.update_user_data(1, {'balance': 1.7}),
+            lambda: db.update_user_balance(1, 1.5),
+            lambda: db.create_deal_with_debit(1, "addr", "card", 0.5, "RUB"),
+            lambda: db.create_top_up_request(1, 2.5, "key"),
+        ):
+            with pytest.raises(TypeError):
+                await call()
+        # Ничего не записано
+        assert await db.get_user_balance(1) == 0
+        assert await db.get_ledger_entries(1) == []
+        assert await db._fetchall("SELECT * FROM top_up_requests") == []
+
+        # Целое значение и None (ноль) принимаются
+        await db.update_user_data(1, {'balance': 1_700_000_000})
+        assert await db.get_user_balance(1) == 1_700_000_000
+        await db.update_user_data(1, {'balance': None})
+        assert await db.get_user_balance(1) == 0
+        assert [entry['amount'] for entry in reversed(await db.get_ledger_entries(1))] == [1_700_000_000, -1_700_000_000]
+    run_db(scenario)
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from src.utils.redis_storage import RedisFSMStorage
+
+
+class Form(StatesGroup):
+    amount = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=100)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_storage(server=None, **kwargs) -> RedisFSMStorage:
+    redis = fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer())
+    return RedisFSMStorage(redis, **kwargs)
+
+
+def test_state_roundtrip():
+    async def scenario():
+        storage = make_storage()
+        assert await storage.get_state(KEY) is None
+        await storage.set_state(KEY, Form.amount)
+        assert await storage.get_state(KEY) == Form.amount.state
+        await storage.set_state(KEY, "raw:state")
+        assert await storage.get_state(KEY) == "raw:state"
+        await storage.set_state(KEY, None)
+        assert await storage.get_state(KEY) is None
+        await storage.close()
+    run(scenario())
+
+
+def test_data_roundtrip():
+    async def scenario():
+        storage = make_storage()
+        assert await storage.get_data(KEY) == {}
+        data = {"amount": 150, "address": "UQ…кошелек", "nested": {"a": [1, 2]}, "none": None}
+        await storage.set_data(KEY, data)
+        assert await storage.get_data(KEY) == data
+
+        # update_data дописывает поля и возвращает итог
+        assert await storage.update_data(KEY, {"amount": 200, "extra": True}) == {**data, "amount": 200, "extra": True}
+        assert await storage.update_data(KEY, {}) == {**data, "amount": 200, "extra": True}
+
+        # set_data заменяет данные целиком, пустой словарь их удаляет
+        await storage.set_data(KEY, {"only": 1})
+        assert await storage.get_data(KEY) == {"only": 1}
+        await storage.set_data(KEY, {})
+        assert await storage.get_data(KEY) == {}
+
+        with pytest.raises(TypeError):
+            await storage.set_data(KEY, [("a", 1)])
+        await storage.close()
+    run(scenario())
+
+
+@pytest.mark.parametrize("other", [
+    StorageKey(bot_id=2, chat_id=10, user_id=100),
+    StorageKey(bot_id=1, chat_id=11, user_id=100),
+    StorageKey(bot_id=1, chat_id=10, user_id=101),
+    StorageKey(bot_id=1, chat_id=10, user_id=100, thread_id=5),
+    StorageKey(bot_id=1, chat_id=10, user_id=100, destiny="other"),
+])
+def test_keys_are_isolated(other):
+    async def scenario():
+        storage = make_storage()
+        await storage.set_state(KEY, Form.amount)
+        await storage.set_data(KEY, {"amount": 1})
+
+        assert await storage.get_state(other) is None
+        assert await storage.get_data(other) == {}
+
+        await storage.set_state(other, "other:state")
+        await storage.update_data(other, {"amount": 2})
+        assert await storage.get_state(KEY) == Form.amount.state
+        assert await storage.get_data(KEY) == {"amount": 1}
+        await storage.close()
+    run(scenario())
+
+
+def test_ttl_is_set_and_refreshed():
+    async def scenario():
+        storage = make_storage(ttl=100)
+        state_key = storage.key_builder.build(KEY, "state")
+        data_key = storage.key_builder.build(KEY, "data")
+
+        await storage.set_data(KEY, {"amount": 1})
+        assert 0 < await storage.redis.ttl(data_key) <= 100
+        await storage.redis.expire(data_key, 10)
+        # Смена состояния продлевает и время жизни данных
+        await storage.set_state(KEY, Form.amount)
+        assert 10 < await storage.redis.ttl(data_key) <= 100
+        assert 0 < await storage.redis.ttl(state_key) <= 100
+
+        await storage.redis.expire(data_key, 10)
+        await storage.update_data(KEY, {"more": 2})
+        assert 10 < await storage.redis.ttl(data_key) <= 100
+        await storage.close()
+    run(scenario())
+
+
+def test_without_ttl_keys_do_not_expire():
+    async def scenario():
+        storage = make_storage()
+        await storage.set_state(KEY, Form.amount)
+        await storage.set_data(KEY, {"amount": 1})
+        assert await storage.redis.ttl(storage.key_builder.build(KEY, "state")) == -1
+        assert await storage.redis.ttl(storage.key_builder.build(KEY, "data")) == -1
+        await storage.close()
+    run(scenario())
+
+
+def test_ttl_expiry():
+    async def scenario():
+        storage = make_storage(ttl=1)
+        await storage.set_state(KEY, Form.amount)
+        await storage.set_data(KEY, {"amount": 1})
+        time.sleep(1.1)
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+        await storage.close()
+    run(scenario())
+
+
+def test_close_keeps_data_on_server():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        storage = make_storage(server)
+        await storage.set_state(KEY, Form.amount)
+        await storage.set_data(KEY, {"amount": 1})
+
+        aclose = AsyncMock(wraps=storage.redis.aclose)
+        storage.redis.aclose = aclose
+        await storage.close()
+        aclose.assert_awaited_once()
+
+        # Другой процесс с тем же сервером видит состояние
+        reopened = make_storage(server)
+        assert await reopened.get_state(KEY) == Form.amount.state
+        assert await reopened.get_data(KEY) == {"amount": 1}
+        await reopened.close()
+    run(scenario())
+
+
+def test_from_url():
+    storage = RedisFSMStorage.from_url("redis://localhost:6379/0", ttl=5)
+    assert storage.ttl == 5
+    assert storage.redis.connection_pool.connection_kwargs["port"] == 6379
+    run(storage.close())
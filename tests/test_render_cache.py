@@ -0,0 +1,47 @@
+import asyncio
+
+from aiogram import Bot
+from aiogram.methods import EditMessageMedia, EditMessageText
+from aiogram.types import FSInputFile, InputMediaPhoto
+
+from src.middlewares.render_cache import RenderCache
+
+
+def run_edits(*methods):
+    cache = RenderCache(maxsize=10)
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method)
+        return True
+
+    async def main():
+        bot = Bot('42:TEST')
+        for method in methods:
+            assert await cache(make_request, bot, method) is True
+
+    asyncio.run(main())
+    return sent, cache.skipped
+
+
+def test_repeated_edit_is_skipped():
+    edit = EditMessageText(chat_id=1, message_id=2, text='menu')
+    sent, skipped = run_edits(edit, edit.model_copy(), EditMessageText(chat_id=1, message_id=2, text='other'))
+    assert [method.text for method in sent] == ['menu', 'other']
+    assert skipped == 1
+
+
+def test_file_upload_is_never_skipped(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(b'old')
+
+    photo = FSInputFile(path)
+
+    def upload():
+        return EditMessageMedia(chat_id=1, message_id=2, media=InputMediaPhoto(media=photo))
+
+    by_file_id = EditMessageMedia(chat_id=1, message_id=2, media=InputMediaPhoto(media='file-id'))
+    # Тот же путь с новым содержимым, затем возврат к file_id, который был до загрузки
+    sent, skipped = run_edits(by_file_id, upload(), upload(), by_file_id)
+    assert len(sent) == 4
+    assert skipped == 0
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from typing import List, Optional
+
+from aiogram.types import ErrorEvent, Message, Update
+
+from src.middlewares.album import AlbumMiddleware
+from src.middlewares.update_lanes import UpdateLaneMiddleware
+from src.utils.lanes import LaneScheduler
+
+
+def make_update(update_id: int, text: str, media_group_id: Optional[str] = None) -> dict:
+    message = {
+        'message_id': update_id, 'date': 0, 'text': text,
+        'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'U'},
+    }
+    if media_group_id is not None:
+        message['media_group_id'] = media_group_id
+    return {'update_id': update_id, 'message': message}
+
+
+async def feed(dp: Dispatcher, bot: Bot, scheduler: LaneScheduler, *updates: dict):
+    for payload in updates:
+        await dp.feed_update(bot, Update.model_validate(payload, context={'bot': bot}))
+    await scheduler.wait_closed()
+
+
+def make_dispatcher():
+    scheduler = LaneScheduler(max_concurrency=4, max_pending=10)
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateLaneMiddleware(scheduler))
+    handled = []
+
+    @dp.message()
+    async def handler(message: Message):
+        if message.text == 'fail':
+            raise RuntimeError('handler failed')
+        handled.append(message.text)
+
+    return dp, scheduler, handled
+
+
+def test_handler_errors_reach_error_handlers():
+    dp, scheduler, handled = make_dispatcher()
+    errors = []
+
+    @dp.errors()
+    async def on_error(event: ErrorEvent):
+        errors.append((event.update.update_id, event.exception))
+        return True
+
+    bot = Bot('42:TEST')
+    asyncio.run(feed(dp, bot, scheduler, make_update(1, 'fail'), make_update(2, 'ok')))
+
+    assert [(update_id, str(e)) for update_id, e in errors] == [(1, 'handler failed')]
+    # Ошибка не останавливает очередь пользователя
+    assert handled == ['ok']
+    assert scheduler.stats.failed == 0
+
+
+def test_unhandled_errors_are_logged(caplog):
+    dp, scheduler, handled = make_dispatcher()
+    bot = Bot('42:TEST')
+
+    with caplog.at_level(logging.ERROR, logger='aiogram.event'):
+        asyncio.run(feed(dp, bot, scheduler, make_update(1, 'fail'), make_update(2, 'ok')))
+
+    records = [record for record in caplog.records if record.name == 'aiogram.event']
+    assert len(records) == 1
+    assert 'update id=1' in records[0].getMessage()
+    assert records[0].exc_info[0] is RuntimeError
+    assert handled == ['ok']
+
+
+def test_failed_job_is_logged(caplog):
+    async def scenario():
+        scheduler = LaneScheduler()
+
+        async def job():
+            raise ValueError('boom')
+
+        await scheduler.submit('key', job)
+        await scheduler.wait_closed()
+        return scheduler
+
+    with caplog.at_level(logging.ERROR, logger='src.utils.lanes'):
+        scheduler = asyncio.run(scenario())
+
+    assert scheduler.stats.failed == 1
+    assert [record.exc_info[0] for record in caplog.records if record.name == 'src.utils.lanes'] == [ValueError]
+
+
+def test_album_is_handled_before_next_update():
+    scheduler = LaneScheduler(max_concurrency=4, max_pending=10)
+    albums = AlbumMiddleware(latency=0.05)
+    dp = Dispatcher()
+    dp.update.outer_middleware(albums)
+    dp.update.outer_middleware(UpdateLaneMiddleware(scheduler))
+    dp.update.outer_middleware(albums.wait_ready)
+    handled = []
+
+    @dp.message()
+    async def handler(message: Message, album: Optional[List[Message]] = None):
+        handled.append([part.text for part in album] if album else message.text)
+
+    bot = Bot('42:TEST')
+    # Следующее сообщение пользователя приходит раньше, чем альбом соберется
+    asyncio.run(feed(
+        dp, bot, scheduler,
+        make_update(2, 'part 2', 'g'), make_update(1, 'part 1', 'g'), make_update(3, 'after'),
+    ))
+
+    assert handled == [['part 1', 'part 2'], 'after']